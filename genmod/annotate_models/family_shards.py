@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+family_shards.py
+
+Split the families of a cohort between the workers.
+
+With many families the genetic models of a batch are checked for one family
+at a time, so the time for a batch grows with the number of families. With
+family shards each worker gets every batch but only checks the families of
+its own shard, and only parses the genotypes of their individuals.
+
+The workers send back the model annotations of their families for each
+variant, see FamilyShardAnnotator, and the main process merges them in the
+order of the families before the INFO fields are printed.
+"""
+
+from __future__ import print_function
+
+import logging
+
+from genmod.utils import pack_lines, unpack_lines
+
+from .fix_variant import add_family_annotations
+
+logger = logging.getLogger(__name__)
+
+
+def split_families(families, nr_of_shards):
+    """Split the families in shards with about the same number of individuals
+
+    The shards hold families that follow each other, so that the annotations
+    can be merged in the order of the families.
+
+    Args:
+        families (dict): The families with family ids as keys
+        nr_of_shards (int): The largest number of shards
+
+    Returns:
+        shards (list): Dictionaries with the families of each shard
+    """
+    nr_of_shards = max(1, min(nr_of_shards, len(families)))
+    family_sizes = [(family_id, len(families[family_id].individuals)) for family_id in families]
+    nr_of_individuals = sum(size for _, size in family_sizes)
+
+    shards = [{}]
+    individuals = 0
+    for index, (family_id, size) in enumerate(family_sizes):
+        # Start a new shard when this one is full, as long as every shard left
+        # gets at least one family
+        families_left = len(family_sizes) - index
+        shards_left = nr_of_shards - len(shards)
+        shard_size = nr_of_individuals * len(shards) / nr_of_shards
+        if (
+            shards[-1]
+            and shards_left
+            and (individuals >= shard_size or families_left <= shards_left)
+        ):
+            shards.append({})
+        shards[-1][family_id] = families[family_id]
+        individuals += size
+
+    return shards
+
+
+def pack_family_annotations(compound_strings, model_strings, model_score_strings):
+    """Pack the model annotations of a variant, see get_family_annotations
+
+    Returns:
+        annotations (str): The annotations separated by tabs
+    """
+    return "\t".join(
+        ",".join(strings) for strings in (compound_strings, model_strings, model_score_strings)
+    )
+
+
+def merge_family_annotations(info, shard_annotations):
+    """Add the model annotations of all shards to an INFO field
+
+    Args:
+        info (str): The INFO field of a variant
+        shard_annotations (list): The packed annotations of each shard, in
+                                  the order of the shards
+
+    Returns:
+        info (str): The INFO field with the annotations
+    """
+    fields = [[], [], []]
+    for annotations in shard_annotations:
+        for strings, field in zip(fields, annotations.split("\t")):
+            if field:
+                strings.append(field)
+    return add_family_annotations(info, *fields)
+
+
+class FamilyShardPrinter(object):
+    """
+    Merge the results of the family shards of each batch before printing.
+
+    A batch is printed when all shards have sent their annotations. The
+    original variant lines are kept by the batch printer.
+
+    Args:
+        batch_printer (BatchPrinter): The printer of the batches
+        nr_of_shards (int): The number of family shards
+    """
+
+    def __init__(self, batch_printer, nr_of_shards):
+        super(FamilyShardPrinter, self).__init__()
+        self.batch_printer = batch_printer
+        self.nr_of_shards = nr_of_shards
+        # The blocks of the shards that are finished, for each batch number
+        self.shard_blocks = {}
+
+    def add_batch(self, variant_lines):
+        """Store the variant lines of a batch, see BatchPrinter.add_batch"""
+        return self.batch_printer.add_batch(variant_lines)
+
+    def add_result(self, batch_number, block, shard_number):
+        """Add the block of one shard and print the batch if all shards are done
+
+        Args:
+            batch_number (int): The number of the batch
+            block (bytes): The packed annotations of the variants of the batch
+            shard_number (int): The number of the family shard
+        """
+        shard_blocks = self.shard_blocks.setdefault(batch_number, [None] * self.nr_of_shards)
+        shard_blocks[shard_number] = block
+        # The blocks count against the memory budget until the batch is merged
+        self.batch_printer.nr_of_bytes += len(block)
+        if None in shard_blocks:
+            return
+
+        del self.shard_blocks[batch_number]
+        self.batch_printer.nr_of_bytes -= sum(map(len, shard_blocks))
+        variant_lines = self.batch_printer.pending[batch_number]
+        shard_annotations = zip(*[unpack_lines(shard_block) for shard_block in shard_blocks])
+        info_fields = [
+            merge_family_annotations(variant_line.split("\t", 8)[7], annotations)
+            for variant_line, annotations in zip(variant_lines, shard_annotations)
+        ]
+        self.batch_printer.add_result(batch_number, pack_lines(info_fields))
+
+    @property
+    def nr_waiting(self):
+        """The number of batches that are not printed"""
+        return self.batch_printer.nr_waiting
+
+    @property
+    def is_full(self):
+        """If the batches that are not printed are over the memory budget"""
+        return self.batch_printer.is_full
+
+    @property
+    def nr_printed(self):
+        """The number of variants that are printed"""
+        return self.batch_printer.nr_printed
@@ -1,20 +1,29 @@
+from genmod.vcf_tools import set_vcf_info
+
 from .model_score import get_model_score
 
 
-def make_print_version(variant, families):
+def get_family_annotations(variant, families, variant_ids=None):
     """
-    Get the variants ready for printing
+    Get the model annotations of the families of a variant
 
-    This function collects the annotations added and merge them in the INFO
-    dict.
+    Families are only annotated if the INFO field does not already hold the
+    annotation.
 
     Arguments:
         variant (dict): A variant dictionary
-
+        families (dict): The families that are annotated
+        variant_ids (list): The variant id of each handle in the batch, if the
+                            compounds are handles. The compounds are then
+                            written in the order of the batch.
+
+    Returns:
+        compound_strings (list): family_id:compounds strings
+        model_strings (list): family_id:models strings
+        model_score_strings (list): family_id:model_score strings
     """
 
     variant_id = variant["variant_id"]
-    vcf_info = variant["INFO"].split(";")
 
     # variant[compounds] is a dictionary with family id as keys and a set of compounds as values
     compounds = variant.get("compounds", dict())
@@ -29,22 +38,23 @@ def make_print_version(variant, families):
             if genetic_models[family_id].get("AR_comp") or genetic_models[family_id].get(
                 "AR_comp_dn"
             ):
-                compound_string = ""
-                compound_set = compounds[family_id]
+                compound_ids = compounds[family_id]
+                if variant_ids is not None:
+                    compound_ids = [variant_ids[handle] for handle in sorted(compound_ids)]
                 # We do not want reference to itself as a compound:
-                compound_set.discard(variant_id)
+                compound_ids = [
+                    compound_id for compound_id in compound_ids if compound_id != variant_id
+                ]
                 # If there are any compounds for the family:
-                if compounds[family_id]:
-                    compound_string = "|".join(compound_set)
+                if compound_ids:
+                    compound_string = "|".join(compound_ids)
                     family_compound_strings.append(":".join([family_id, compound_string]))
 
-                if len(family_compound_strings) > 0:
-                    vcf_info.append("Compounds=" + ",".join(family_compound_strings))
-
+    # Here we store the model strings that should be added to the variant:
+    family_model_strings = []
+    model_score_list = []
     # Check if any genetic models are followed
     if "GeneticModels" not in variant["info_dict"]:
-        # Here we store the compound strings that should be added to the variant:
-        family_model_strings = []
         model_scores = {}
         for family_id in genetic_models:
             model_string = ""
@@ -60,17 +70,67 @@ def make_print_version(variant, families):
                     get_model_score(families[family_id].individuals, variant)
                 )
 
-        if len(family_model_strings) > 0:
-            vcf_info.append("GeneticModels={0}".format(",".join(family_model_strings)))
+        for family_id in model_scores:
+            if model_scores[family_id]:
+                if float(model_scores[family_id]) > 0:
+                    model_score_list.append(":".join([family_id, model_scores[family_id]]))
+
+    return family_compound_strings, family_model_strings, model_score_list
+
+
+def add_family_annotations(info, compound_strings, model_strings, model_score_strings):
+    """
+    Add the model annotations of the families to an INFO field
+
+    Arguments:
+        info (str): The INFO field of a variant
+        compound_strings (list): family_id:compounds strings
+        model_strings (list): family_id:models strings
+        model_score_strings (list): family_id:model_score strings
+
+    Returns:
+        info (str): The INFO field with the annotations
+    """
+    vcf_info = info.split(";")
+
+    if len(compound_strings) > 0:
+        vcf_info.append("Compounds=" + ",".join(compound_strings))
+
+    if len(model_strings) > 0:
+        vcf_info.append("GeneticModels={0}".format(",".join(model_strings)))
+
+        if len(model_score_strings) > 0:
+            vcf_info.append("ModelScore=" + ",".join(model_score_strings))
+
+    return ";".join(vcf_info)
+
+
+def make_print_version(variant, families, variant_ids=None):
+    """
+    Get the variants ready for printing
+
+    This function collects the annotations added and sets them in the
+    info_dict, see set_vcf_info. The INFO field is written with
+    update_vcf_info.
+
+    Arguments:
+        variant (VariantRecord): A variant record, or a variant dictionary
+        families (dict): The families that are annotated
+        variant_ids (list): The variant id of each handle in the batch, see
+                            get_family_annotations
+
+    """
+    compound_strings, model_strings, model_score_strings = get_family_annotations(
+        variant, families, variant_ids
+    )
+
+    if len(compound_strings) > 0:
+        set_vcf_info("Compounds", ",".join(compound_strings), variant)
 
-            model_score_list = []
-            for family_id in model_scores:
-                if model_scores[family_id]:
-                    if float(model_scores[family_id]) > 0:
-                        model_score_list.append(":".join([family_id, model_scores[family_id]]))
-            if len(model_score_list) > 0:
-                vcf_info.append("ModelScore=" + ",".join(model_score_list))
+    if len(model_strings) > 0:
+        set_vcf_info("GeneticModels", ",".join(model_strings), variant)
 
-    variant["INFO"] = ";".join(vcf_info)
+        if len(model_score_strings) > 0:
+            set_vcf_info("ModelScore", ",".join(model_score_strings), variant)
 
     return variant
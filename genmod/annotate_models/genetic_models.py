@@ -63,8 +63,6 @@ from __future__ import absolute_import, print_function
 
 import logging
 
-from genmod.utils import generate_pairs
-
 from .models import (
     check_dominant,
     check_recessive,
@@ -74,7 +72,7 @@ from .models import (
 from .models.compound_model import check_compounds
 
 
-def check_genetic_models(variant_batch, families, phased=False, strict=False):
+def check_genetic_models(variant_batch, families, phased=False, strict=False, model_cache=None):
     """
     Check and annotate which genetic models that are followed for the variants
     in a batch
@@ -89,17 +87,24 @@ def check_genetic_models(variant_batch, families, phased=False, strict=False):
         phased (bool): If the variants are phased
         strict (bool): If the strict mode should be used when checking the
                        genetic models
+        model_cache (ModelCache): Cache with the results of the genotype
+                                  patterns that are seen, see model_cache.py
 
+    Returns:
+        compound_counts (dict): The number of compound candidates, the number
+                                of candidate pairs that were checked and the
+                                number of compound pairs, summed over the
+                                families, see get_compound_counts
     """
     # A variant batch is a dictionary on the form
     # {variant_id:variant_dict, variant_2_id:variant_dict_2, ...}
     logger = logging.getLogger(__name__)
 
+    compound_counts = get_compound_counts()
     # We check the genetic models for one family at a time
     for family_id in families:
         logger.debug("Checking genetic models for family {0}".format(family_id))
         family = families[family_id]
-        individuals = family.individuals
 
         compound_candidates = []
 
@@ -130,96 +135,290 @@ def check_genetic_models(variant_batch, families, phased=False, strict=False):
             else:
                 variant["inheritance_models"] = {family_id: inheritance_models}
 
+            if model_cache is not None:
+                # The models and the candidate check are looked up on the
+                # genotype pattern of the family
+                compound_candidate = model_cache.check_variant(variant, family, strict)
+                if variant.get("compound_candidate", True) and compound_candidate:
+                    compound_candidates.append(variant_id)
+                continue
+
             # If the variant is in a genetic region we check for compound
             # candidates
             if variant.get("compound_candidate", True):
                 if check_compound_candidate(variant, family, strict):
                     compound_candidates.append(variant_id)
 
-            # Only check X-linked for the variants in the X-chromosome:
-            # For X-linked we do not need to check the other models
-            if variant["CHROM"] in ["X", "chrX"]:
-                if check_X_recessive(variant, family, strict):
-                    variant["inheritance_models"][family_id]["XR"] = True
-                    for individual_id in individuals:
-                        individual = individuals[individual_id]
-                        if individual.has_parents:
-                            check_parents(
-                                "X_recessive", individual_id, family, variant, strict=strict
-                            )
-
-                if check_X_dominant(variant, family, strict):
-                    variant["inheritance_models"][family_id]["XD"] = True
-                    for individual_id in family.individuals:
-                        individual = individuals[individual_id]
-                        if individual.has_parents:
-                            check_parents(
-                                "X_dominant", individual_id, family, variant, strict=strict
-                            )
-            # If variant is not on X:
-            else:
-                # Check the dominant model:
-                if check_dominant(variant, family, strict):
-                    variant["inheritance_models"][family_id]["AD"] = True
-                    for individual_id in individuals:
-                        individual = individuals[individual_id]
-                        if individual.has_parents:
-                            check_parents("dominant", individual_id, family, variant, strict=strict)
-
-                # Check the recessive model:
-                if check_recessive(variant, family, strict):
-                    variant["inheritance_models"][family_id]["AR_hom"] = True
-                    for individual_id in individuals:
-                        individual = individuals[individual_id]
-                        if individual.has_parents:
-                            check_parents(
-                                "recessive", individual_id, family, variant, strict=strict
-                            )
+            check_variant_models(variant, family, strict)
 
         # Now check the compound models:
+        compound_counts["candidates"] += len(compound_candidates)
+        nr_of_checked, nr_of_pairs = check_compound_pairs(
+            variant_batch, family, compound_candidates, phased, strict
+        )
+        compound_counts["checked"] += nr_of_checked
+        compound_counts["pairs"] += nr_of_pairs
+
+    return compound_counts
+
+
+def get_compound_counts():
+    """Get the counts of the compound work of a batch, all zero
+
+    The candidates are the compound candidates of each family, checked are the
+    pairs of candidates that share a feature and pairs are the pairs that were
+    found to be compounds.
+    """
+    return {"candidates": 0, "checked": 0, "pairs": 0}
+
+
+def count_pairs(indexes_1, indexes_2):
+    """Count the pairs of candidates between two buckets, or within one bucket"""
+    if indexes_1 is indexes_2:
+        return len(indexes_1) * (len(indexes_1) - 1) // 2
+    return len(indexes_1) * len(indexes_2)
+
+
+def check_variant_models(variant, family, strict=False):
+    """
+    Check and annotate the dominant, recessive and X linked models, with the
+    de novo models, that a variant follows in a family
+
+    The inheritance_models of the family must already be added to the
+    variant, see check_genetic_models.
+
+    Arguments:
+        variant (dict): A variant dictionary with genotypes
+        family (Family): A family object with the individuals
+        strict (bool): If the strict mode should be used
+    """
+    family_id = family.family_id
+    individuals = family.individuals
+    inheritance_models = variant["inheritance_models"][family_id]
+
+    # Only check X-linked for the variants in the X-chromosome:
+    # For X-linked we do not need to check the other models
+    if variant["CHROM"] in ["X", "chrX"]:
+        if check_X_recessive(variant, family, strict):
+            inheritance_models["XR"] = True
+            for individual_id in individuals:
+                individual = individuals[individual_id]
+                if individual.has_parents:
+                    check_parents("X_recessive", individual_id, family, variant, strict=strict)
+
+        if check_X_dominant(variant, family, strict):
+            inheritance_models["XD"] = True
+            for individual_id in family.individuals:
+                individual = individuals[individual_id]
+                if individual.has_parents:
+                    check_parents("X_dominant", individual_id, family, variant, strict=strict)
+    # If variant is not on X:
+    else:
+        # Check the dominant model:
+        if check_dominant(variant, family, strict):
+            inheritance_models["AD"] = True
+            for individual_id in individuals:
+                individual = individuals[individual_id]
+                if individual.has_parents:
+                    check_parents("dominant", individual_id, family, variant, strict=strict)
+
+        # Check the recessive model:
+        if check_recessive(variant, family, strict):
+            inheritance_models["AR_hom"] = True
+            for individual_id in individuals:
+                individual = individuals[individual_id]
+                if individual.has_parents:
+                    check_parents("recessive", individual_id, family, variant, strict=strict)
+
+
+def check_compound_pairs(variant_batch, family, compound_candidates, phased=False, strict=False):
+    """
+    Check which pairs of compound candidates that follow the compound models
 
-        if len(compound_candidates) > 1:
-            for pair in generate_pairs(compound_candidates):
-                # If the variants in the pair belong to the same gene we check for compounds:
-                variant_1 = variant_batch[pair[0]]
-                variant_2 = variant_batch[pair[1]]
-                # Check that the pair is in the same feature:
-                if variant_1["annotation"].intersection(variant_2["annotation"]):
-                    if len(individuals) == 1:
-                        variant_1["compounds"][family_id].add(pair[1])
-                        variant_2["compounds"][family_id].add(pair[0])
-                        variant_1["inheritance_models"][family_id]["AR_comp"] = True
-                        variant_2["inheritance_models"][family_id]["AR_comp"] = True
-                    # We know from check_compound_candidates that all variants are present in all affected
-                    elif check_compounds(variant_1, variant_2, family, phased):
-                        parents_found = False
-                        for individual_id in individuals:
-                            individual = individuals[individual_id]
-                            if individual.has_parents:
-                                check_parents(
-                                    model="compound",
-                                    individual_id=individual_id,
-                                    family=family,
-                                    variant=variant_1,
-                                    variant_2=variant_2,
-                                    strict=strict,
-                                )
-                                parents_found = True
-                        if not parents_found:
-                            variant_1["inheritance_models"][family_id]["AR_comp"] = True
-                            variant_2["inheritance_models"][family_id]["AR_comp"] = True
-
-                        if (
-                            variant_1["inheritance_models"][family_id]["AR_comp"]
-                            or variant_1["inheritance_models"][family_id]["AR_comp_dn"]
-                        ):
-                            variant_1["compounds"][family_id].add(pair[1])
-
-                        if (
-                            variant_2["inheritance_models"][family_id]["AR_comp"]
-                            or variant_2["inheritance_models"][family_id]["AR_comp_dn"]
-                        ):
-                            variant_2["compounds"][family_id].add(pair[0])
+    The compounds and the AR_comp models of the variants in the pairs are
+    annotated for the family.
+
+    If two pairs of candidates have the same genotypes in the family and the
+    same features, they get the same results from check_compounds (without
+    phase) and from check_parents. The candidates are therefore put in
+    buckets on their genotypes and features and the pair checks are done once
+    for each pair of buckets. The pairs of buckets that do not share a feature,
+    or where a healthy individual carries both variants, are skipped without
+    looking at the pairs in them.
+
+    When every pair of buckets sets a compound model the buckets are annotated
+    at once. Otherwise the pairs that are left are annotated in the same order
+    as all pairs from generate_pairs, since a variant then gets its compounds
+    from the models that are set by the pairs before it.
+
+    Arguments:
+        variant_batch (dict): A dictionary with variant ids as keys and variant
+                              dictionaries as values
+        family (Family): A family object with the individuals
+        compound_candidates (list): The ids of the compound candidates
+        phased (bool): If the variants are phased
+        strict (bool): If the strict mode should be used
+
+    Returns:
+        nr_of_checked (int): The number of candidate pairs that share a feature
+        nr_of_pairs (int): The number of pairs that are compounds
+    """
+    family_id = family.family_id
+    individuals = family.individuals
+
+    if len(compound_candidates) < 2:
+        return 0, 0
+
+    # The positions of the candidates, bucketed on genotypes and features
+    buckets = {}
+    for index, variant_id in enumerate(compound_candidates):
+        variant = variant_batch[variant_id]
+        genotypes = variant["genotypes"]
+        bucket = (
+            tuple(genotypes[individual_id].genotype for individual_id in individuals),
+            frozenset(variant["annotation"]),
+        )
+        buckets.setdefault(bucket, []).append(index)
+
+    bucket_keys = list(buckets)
+    bucket_pairs = []
+    nr_of_checked = 0
+    for first, bucket_1 in enumerate(bucket_keys):
+        for bucket_2 in bucket_keys[first:]:
+            # Check that the pairs are in the same feature:
+            if not bucket_1[1].intersection(bucket_2[1]):
+                continue
+            if bucket_1 == bucket_2 and len(buckets[bucket_1]) == 1:
+                continue
+            nr_of_checked += count_pairs(buckets[bucket_1], buckets[bucket_2])
+            variant_1 = variant_batch[compound_candidates[buckets[bucket_1][0]]]
+            variant_2 = variant_batch[compound_candidates[buckets[bucket_2][0]]]
+            pair_models = get_pair_models(variant_1, variant_2, family, strict)
+            if pair_models is not None:
+                bucket_pairs.append((buckets[bucket_1], buckets[bucket_2], pair_models))
+
+    # In phased data affected individuals must have the variants on different
+    # alleles, that is checked for each pair
+    check_phase = phased and len(individuals) > 1
+
+    if not check_phase and all(any(pair_models) for _, _, pair_models in bucket_pairs):
+        # Every pair sets a model on both variants, so all pairs are
+        # compounds whatever the order and the buckets are annotated at once
+        for indexes_1, indexes_2, (ar_comp, ar_comp_dn) in bucket_pairs:
+            ids_1 = [compound_candidates[index] for index in indexes_1]
+            ids_2 = [compound_candidates[index] for index in indexes_2]
+            for variant_ids, partner_ids in ((ids_1, ids_2), (ids_2, ids_1)):
+                for variant_id in variant_ids:
+                    variant = variant_batch[variant_id]
+                    variant["inheritance_models"][family_id]["AR_comp"] |= ar_comp
+                    variant["inheritance_models"][family_id]["AR_comp_dn"] |= ar_comp_dn
+                    compounds = variant["compounds"][family_id]
+                    compounds.update(partner_ids)
+                    # A variant is not a pair with itself
+                    compounds.discard(variant_id)
+        nr_of_pairs = sum(
+            count_pairs(indexes_1, indexes_2) for indexes_1, indexes_2, _ in bucket_pairs
+        )
+        return nr_of_checked, nr_of_pairs
+
+    pairs = []
+    for indexes_1, indexes_2, pair_models in bucket_pairs:
+        if indexes_1 is indexes_2:
+            pairs.extend(
+                ((indexes_1[i], indexes_1[j]), pair_models)
+                for i in range(len(indexes_1) - 1)
+                for j in range(i + 1, len(indexes_1))
+            )
+        else:
+            pairs.extend(
+                ((min(index_1, index_2), max(index_1, index_2)), pair_models)
+                for index_1 in indexes_1
+                for index_2 in indexes_2
+            )
+    pairs.sort()
+
+    nr_of_pairs = 0
+
+    for (index_1, index_2), (ar_comp, ar_comp_dn) in pairs:
+        variant_id_1 = compound_candidates[index_1]
+        variant_id_2 = compound_candidates[index_2]
+        variant_1 = variant_batch[variant_id_1]
+        variant_2 = variant_batch[variant_id_2]
+        if check_phase and not check_compounds(variant_1, variant_2, family, phased):
+            continue
+
+        models_1 = variant_1["inheritance_models"][family_id]
+        models_2 = variant_2["inheritance_models"][family_id]
+        if ar_comp:
+            models_1["AR_comp"] = True
+            models_2["AR_comp"] = True
+        if ar_comp_dn:
+            models_1["AR_comp_dn"] = True
+            models_2["AR_comp_dn"] = True
+
+        is_pair = False
+        if models_1["AR_comp"] or models_1["AR_comp_dn"]:
+            variant_1["compounds"][family_id].add(variant_id_2)
+            is_pair = True
+        if models_2["AR_comp"] or models_2["AR_comp_dn"]:
+            variant_2["compounds"][family_id].add(variant_id_1)
+            is_pair = True
+        nr_of_pairs += is_pair
+
+    return nr_of_checked, nr_of_pairs
+
+
+def get_pair_models(variant_1, variant_2, family, strict=False):
+    """
+    Get the compound models that a pair of candidates sets
+
+    The rules of check_compounds without phase and of check_parents, the
+    variants are not changed.
+
+    Arguments:
+        variant_1, variant_2 (dict): Compound candidates that share a feature
+        family (Family): A family object with the individuals
+        strict (bool): If the strict mode should be used
+
+    Returns:
+        pair_models (tuple): If AR_comp and AR_comp_dn are set for the
+                             variants, None if the pair is not a compound
+    """
+    family_id = family.family_id
+    individuals = family.individuals
+
+    if len(individuals) == 1:
+        return (True, False)
+
+    # We know from check_compound_candidates that all variants are present in all affected
+    if not check_compounds(variant_1, variant_2, family, phased=False):
+        return None
+
+    # check_parents sets the models of the pair on copies of the variants
+    pair = [
+        {
+            "genotypes": variant["genotypes"],
+            "inheritance_models": {family_id: {"AR_comp": False, "AR_comp_dn": False}},
+        }
+        for variant in (variant_1, variant_2)
+    ]
+    parents_found = False
+    for individual_id in individuals:
+        individual = individuals[individual_id]
+        if individual.has_parents:
+            check_parents(
+                model="compound",
+                individual_id=individual_id,
+                family=family,
+                variant=pair[0],
+                variant_2=pair[1],
+                strict=strict,
+            )
+            parents_found = True
+    pair_models = pair[0]["inheritance_models"][family_id]
+    if not parents_found:
+        return (True, False)
+    return (pair_models["AR_comp"], pair_models["AR_comp_dn"])
 
 
 def check_compound_candidate(variant, family, strict):
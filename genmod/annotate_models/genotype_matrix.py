@@ -0,0 +1,407 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+genotype_matrix.py
+
+Check the genetic models of a batch with array operations.
+
+The genotype calls of a batch are encoded as a matrix of int8 codes with one
+row per variant and one column per individual. The rules of the models in
+genmod/annotate_models/models and of check_parents are then applied to whole
+columns at a time, so each rule is evaluated once per individual instead of
+once per individual and variant.
+
+The results are the same as from check_genetic_models. The compound pairs
+are checked with the same code as check_genetic_models, see
+check_compound_pairs, and small batches are left to check_genetic_models.
+
+The engine needs numpy, which is an optional dependency of genmod.
+"""
+
+from __future__ import absolute_import, print_function
+
+import logging
+
+from genmod.vcf_tools import Genotype, get_format_indexes
+
+from .genetic_models import check_compound_pairs, check_genetic_models, get_compound_counts
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# The genotype codes of the matrix
+NO_CALL = -1
+HOMO_REF = 0
+HETEROZYGOTE = 1
+HOMO_ALT = 2
+
+X_CHROMOSOMES = ("X", "chrX")
+
+# Smaller batches are checked with check_genetic_models, the array setup
+# costs more than it saves on a few variants
+MIN_MATRIX_BATCH_SIZE = 64
+
+# The keys of the inheritance_models dictionary, in the order of check_genetic_models
+MODEL_NAMES = (
+    "XR",
+    "XR_dn",
+    "XD",
+    "XD_dn",
+    "AD",
+    "AD_dn",
+    "AR_hom",
+    "AR_hom_dn",
+    "AR_comp",
+    "AR_comp_dn",
+)
+
+# The genotype codes of the GT strings that are seen
+GENOTYPE_CODES = {}
+
+
+def check_numpy():
+    """Check if numpy can be imported
+
+    Returns:
+        bool: If the numpy engine can be used
+    """
+    return np is not None
+
+
+def get_genotype_code(gt_call):
+    """Get the genotype code of a GT string
+
+    The code follows the same rules as the Genotype class, it is computed
+    once for each GT string that is seen.
+
+    Args:
+        gt_call (str): A GT string such as 0/1 or 1|1
+
+    Returns:
+        code (int): NO_CALL, HOMO_REF, HETEROZYGOTE or HOMO_ALT
+    """
+    code = GENOTYPE_CODES.get(gt_call)
+    if code is None:
+        genotype = Genotype(GT=gt_call)
+        if not genotype.genotyped:
+            code = NO_CALL
+        elif genotype.homo_ref:
+            code = HOMO_REF
+        elif genotype.homo_alt:
+            code = HOMO_ALT
+        else:
+            code = HETEROZYGOTE
+        GENOTYPE_CODES[gt_call] = code
+    return code
+
+
+def encode_genotypes(variants, individuals):
+    """Encode the genotype calls of variants as a matrix
+
+    Args:
+        variants (list): Variant dictionaries with FORMAT and individual columns
+        individuals (list): The individual ids of the columns
+
+    Returns:
+        codes (numpy.ndarray): int8 matrix with one row per variant
+    """
+    rows = []
+    no_calls = [NO_CALL] * len(individuals)
+    for variant in variants:
+        indexes = get_format_indexes(variant.get("FORMAT", ""), ("GT",))
+        if not indexes:
+            rows.append(no_calls)
+            continue
+        gt_index = indexes[0][1]
+        row = []
+        for individual in individuals:
+            gt_info = variant[individual].split(":", gt_index + 1)
+            if gt_index < len(gt_info):
+                gt_call = gt_info[gt_index]
+                code = GENOTYPE_CODES.get(gt_call)
+                row.append(get_genotype_code(gt_call) if code is None else code)
+            else:
+                row.append(NO_CALL)
+        rows.append(row)
+    return np.array(rows, dtype=np.int8).reshape(len(variants), len(individuals))
+
+
+class GenotypeColumns(object):
+    """The boolean genotype arrays of one individual over a batch"""
+
+    def __init__(self, genotyped, homo_ref, heterozygote, homo_alt):
+        super(GenotypeColumns, self).__init__()
+        self.genotyped = genotyped
+        self.homo_ref = homo_ref
+        self.heterozygote = heterozygote
+        self.homo_alt = homo_alt
+        self.has_variant = heterozygote | homo_alt
+
+
+def get_genotype_columns(codes, individuals):
+    """Get the boolean genotype arrays of the individuals
+
+    The comparisons are made once for the whole matrix, the arrays of an
+    individual are rows of the transposed results.
+
+    Arguments:
+        codes (numpy.ndarray): The matrix from encode_genotypes
+        individuals (list): The individual ids of the columns
+
+    Returns:
+        genotypes (dict): Individual ids as keys and GenotypeColumns as values
+    """
+    genotyped = np.ascontiguousarray((codes != NO_CALL).T)
+    homo_ref = np.ascontiguousarray((codes == HOMO_REF).T)
+    heterozygote = np.ascontiguousarray((codes == HETEROZYGOTE).T)
+    homo_alt = np.ascontiguousarray((codes == HOMO_ALT).T)
+    return {
+        individual_id: GenotypeColumns(
+            genotyped[column], homo_ref[column], heterozygote[column], homo_alt[column]
+        )
+        for column, individual_id in enumerate(individuals)
+    }
+
+
+def get_model_arrays(family, genotypes, reduced_penetrance, strict=False):
+    """Check the dominant, recessive and X linked models for a family
+
+    Arguments:
+        family (Family): A family object with the individuals
+        genotypes (dict): Individual ids as keys and GenotypeColumns as values
+        reduced_penetrance (numpy.ndarray): If the variants have reduced penetrance
+        strict (bool): If the strict mode should be used
+
+    Returns:
+        models (dict): Boolean arrays for AD, AR_hom, XR and XD
+    """
+    nr_variants = len(reduced_penetrance)
+    dominant = np.ones(nr_variants, dtype=bool)
+    recessive = np.ones(nr_variants, dtype=bool)
+    x_recessive = np.ones(nr_variants, dtype=bool)
+    x_dominant = np.ones(nr_variants, dtype=bool)
+
+    for individual_id, individual in family.individuals.items():
+        genotype = genotypes[individual_id]
+        if strict:
+            dominant &= genotype.genotyped
+            recessive &= genotype.genotyped
+            x_recessive &= genotype.genotyped
+            x_dominant &= genotype.genotyped
+
+        if individual.healthy:
+            dominant &= ~genotype.has_variant | (reduced_penetrance & ~genotype.homo_alt)
+            recessive &= ~genotype.homo_alt
+            x_recessive &= ~genotype.homo_alt
+            if individual.sex == 1:
+                x_recessive &= ~genotype.has_variant
+                x_dominant &= ~genotype.has_variant
+            elif individual.sex == 2:
+                x_dominant &= ~genotype.homo_alt
+
+        elif individual.affected:
+            dominant &= ~genotype.genotyped | genotype.heterozygote
+            recessive &= ~genotype.genotyped | genotype.homo_alt
+            x_recessive &= ~genotype.homo_ref
+            if individual.sex == 2:
+                x_recessive &= ~genotype.genotyped | genotype.homo_alt
+            x_dominant &= ~genotype.homo_ref
+
+    return {"AD": dominant, "AR_hom": recessive, "XR": x_recessive, "XD": x_dominant}
+
+
+def check_parents_arrays(models, family, genotypes, strict=False):
+    """Check the de novo models for the individuals with parents
+
+    The same rules as check_parents, applied to the variants that follow a
+    model. The model arrays are updated and the de novo arrays are added.
+
+    Arguments:
+        models (dict): Boolean arrays from get_model_arrays
+        family (Family): A family object with the individuals
+        genotypes (dict): Individual ids as keys and GenotypeColumns as values
+        strict (bool): If the strict mode should be used
+    """
+    # Parent checks only start from the variants that follow the model
+    followed = {model: models[model].copy() for model in ("AD", "AR_hom", "XR", "XD")}
+    for model in ("AD", "AR_hom", "XR", "XD"):
+        models[model + "_dn"] = np.zeros(len(followed[model]), dtype=bool)
+
+    def set_de_novo(model, de_novo, genotyped=None):
+        """Set de novo, the model is not followed if the parents are genotyped"""
+        models[model + "_dn"] |= followed[model] & de_novo
+        if genotyped is not None:
+            models[model] &= ~(followed[model] & de_novo & genotyped)
+
+    for individual in family.individuals.values():
+        if not individual.has_parents:
+            continue
+        mother = genotypes[individual.mother] if individual.mother != "0" else None
+        father = genotypes[individual.father] if individual.father != "0" else None
+        both_parents = mother is not None and father is not None
+        everything = np.ones(len(followed["AD"]), dtype=bool)
+
+        # Autosomal recessive
+        if both_parents:
+            set_de_novo(
+                "AR_hom",
+                ~(mother.has_variant & father.has_variant),
+                mother.genotyped & father.genotyped,
+            )
+        elif not strict:
+            set_de_novo("AR_hom", everything)
+
+        # Autosomal dominant
+        if both_parents:
+            set_de_novo(
+                "AD",
+                ~(mother.has_variant | father.has_variant),
+                mother.genotyped & father.genotyped,
+            )
+        else:
+            for parent in (mother, father):
+                if parent is not None:
+                    set_de_novo("AD", ~parent.has_variant, everything)
+
+        # X linked
+        if individual.sex == 1:
+            if mother is not None:
+                set_de_novo("XR", ~mother.has_variant, mother.genotyped)
+                set_de_novo("XD", ~mother.has_variant, mother.genotyped)
+            elif not strict:
+                set_de_novo("XR", everything)
+        elif individual.sex == 2:
+            if both_parents:
+                set_de_novo(
+                    "XR",
+                    ~(mother.has_variant & father.has_variant),
+                    mother.genotyped & father.genotyped,
+                )
+                set_de_novo(
+                    "XD",
+                    ~(mother.has_variant | father.has_variant),
+                    mother.genotyped & father.genotyped,
+                )
+            elif not strict:
+                set_de_novo("XR", everything)
+                set_de_novo("XD", everything)
+
+
+def get_compound_candidates(family, genotypes, nr_variants):
+    """Get the variants that are compound candidates in a family
+
+    The same rules as check_compound_candidate.
+
+    Arguments:
+        family (Family): A family object with the individuals
+        genotypes (dict): Individual ids as keys and GenotypeColumns as values
+        nr_variants (int): The number of variants in the batch
+
+    Returns:
+        candidates (numpy.ndarray): If the variants are compound candidates
+    """
+    candidates = np.ones(nr_variants, dtype=bool)
+    for individual in family.individuals.values():
+        genotype = genotypes[individual.individual_id]
+        candidates &= ~genotype.homo_alt
+        if individual.affected:
+            candidates &= genotype.heterozygote
+            if individual.mother != "0" and individual.father != "0":
+                mother = family.individuals[individual.mother]
+                father = family.individuals[individual.father]
+                if mother.healthy and father.healthy:
+                    candidates &= ~(
+                        genotypes[individual.mother].has_variant
+                        & genotypes[individual.father].has_variant
+                    )
+    return candidates
+
+
+def check_genetic_models_matrix(
+    variant_batch, families, phased=False, strict=False, model_cache=None
+):
+    """
+    Check and annotate which genetic models that are followed for the variants
+    in a batch, with array operations over the batch
+
+    Same arguments and annotations as check_genetic_models, batches with
+    fewer than MIN_MATRIX_BATCH_SIZE variants are checked with it.
+
+    Arguments:
+        variant_batch (dict): A dictionary with variant ids as keys and variant
+                              dictionaries as values
+        families (dict): A dictionary with family ids as keys and Family
+                        objects as values
+        phased (bool): If the variants are phased
+        strict (bool): If the strict mode should be used when checking the
+                       genetic models
+        model_cache (ModelCache): Used for the batches that are checked with
+                                  check_genetic_models
+
+    Returns:
+        compound_counts (dict): The counts of the compound work, see
+                                check_genetic_models
+    """
+    if len(variant_batch) < MIN_MATRIX_BATCH_SIZE:
+        return check_genetic_models(
+            variant_batch, families, phased=phased, strict=strict, model_cache=model_cache
+        )
+
+    variant_ids = list(variant_batch)
+    variants = [variant_batch[variant_id] for variant_id in variant_ids]
+    individuals = list(
+        {
+            individual_id: None
+            for family in families.values()
+            for individual_id in family.individuals
+        }
+    )
+    codes = encode_genotypes(variants, individuals)
+    genotypes = get_genotype_columns(codes, individuals)
+
+    on_x = np.array([variant["CHROM"] in X_CHROMOSOMES for variant in variants], dtype=bool)
+    reduced_penetrance = np.array(
+        [bool(variant.get("reduced_penetrance", False)) for variant in variants], dtype=bool
+    )
+    may_be_candidate = np.array(
+        [bool(variant.get("compound_candidate", True)) for variant in variants], dtype=bool
+    )
+
+    compound_counts = get_compound_counts()
+    for family_id, family in families.items():
+        logger.debug("Checking genetic models for family {0}".format(family_id))
+        models = get_model_arrays(family, genotypes, reduced_penetrance, strict)
+        # X linked models are only checked on X, the others only outside X
+        for model in ("XR", "XD"):
+            models[model] &= on_x
+        for model in ("AD", "AR_hom"):
+            models[model] &= ~on_x
+        check_parents_arrays(models, family, genotypes, strict)
+
+        candidates = may_be_candidate & get_compound_candidates(family, genotypes, len(variants))
+
+        # The model columns in the order of the inheritance_models dictionary
+        model_rows = zip(*[models[model].tolist() for model in MODEL_NAMES[:-2]])
+        for variant, model_row in zip(variants, model_rows):
+            inheritance_models = dict(zip(MODEL_NAMES, model_row + (False, False)))
+            variant.setdefault("compounds", {})[family_id] = set()
+            variant.setdefault("inheritance_models", {})[family_id] = inheritance_models
+
+        compound_candidates = [
+            variant_id
+            for variant_id, candidate in zip(variant_ids, candidates.tolist())
+            if candidate
+        ]
+
+        compound_counts["candidates"] += len(compound_candidates)
+        nr_of_checked, nr_of_pairs = check_compound_pairs(
+            variant_batch, family, compound_candidates, phased, strict
+        )
+        compound_counts["checked"] += nr_of_checked
+        compound_counts["pairs"] += nr_of_pairs
+
+    return compound_counts
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+model_cache.py
+
+Cache the genetic models that are followed for the genotype patterns of a
+family.
+
+For a family the results of the dominant, recessive and X linked models, of
+check_parents and of check_compound_candidate only depend on the genotypes of
+the individuals, if the variant is on X, if strict mode is used and if the
+variant has reduced penetrance. Most variants share a handful of patterns,
+like a heterozygous child with homozygous reference parents, so after the
+first variants of a pattern the models are a dictionary lookup.
+
+The cache holds the most recently used patterns, the least recently used
+pattern is dropped when it is full.
+"""
+
+from __future__ import absolute_import, print_function
+
+import logging
+from collections import OrderedDict
+
+from .genetic_models import check_compound_candidate, check_variant_models
+
+logger = logging.getLogger(__name__)
+
+# The number of genotype patterns that are kept
+MODEL_CACHE_SIZE = 4096
+
+X_CHROMOSOMES = ("X", "chrX")
+
+
+class ModelCache(object):
+    """Least recently used cache with the models of genotype patterns"""
+
+    def __init__(self, max_size=MODEL_CACHE_SIZE):
+        super(ModelCache, self).__init__()
+        self.max_size = max_size
+        self.patterns = OrderedDict()
+        # The individual ids of the families, in the order of the patterns
+        self.family_individuals = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_pattern(self, variant, family, strict):
+        """Get the genotype pattern of a variant in a family
+
+        The pattern holds everything that the models depend on. The
+        genotype string of a Genotype decides its genotype flags.
+
+        Args:
+            variant (dict): A variant dictionary with genotypes
+            family (Family): A family object with the individuals
+            strict (bool): If the strict mode is used
+
+        Returns:
+            pattern (tuple): A hashable genotype pattern
+        """
+        individual_ids = self.family_individuals.get(family.family_id)
+        if individual_ids is None:
+            individual_ids = tuple(family.individuals)
+            self.family_individuals[family.family_id] = individual_ids
+
+        genotypes = variant["genotypes"]
+        on_x = variant["CHROM"] in X_CHROMOSOMES
+        # Reduced penetrance is only used by the dominant model
+        reduced_penetrance = not on_x and variant.get("reduced_penetrance", False)
+        return (
+            family.family_id,
+            strict,
+            on_x,
+            reduced_penetrance,
+            *[genotypes[individual_id].genotype for individual_id in individual_ids],
+        )
+
+    def check_variant(self, variant, family, strict=False):
+        """Annotate the models that a variant follows in a family
+
+        The same annotations as check_variant_models. The inheritance_models
+        of the family must already be added to the variant.
+
+        Args:
+            variant (dict): A variant dictionary with genotypes
+            family (Family): A family object with the individuals
+            strict (bool): If the strict mode is used
+
+        Returns:
+            bool: If the variant is a compound candidate in the family, see
+                  check_compound_candidate
+        """
+        pattern = self.get_pattern(variant, family, strict)
+        inheritance_models = variant["inheritance_models"][family.family_id]
+
+        result = self.patterns.get(pattern)
+        if result is not None:
+            self.hits += 1
+            self.patterns.move_to_end(pattern)
+            models, compound_candidate = result
+            inheritance_models.update(models)
+            return compound_candidate
+
+        self.misses += 1
+        check_variant_models(variant, family, strict)
+        compound_candidate = check_compound_candidate(variant, family, strict)
+        self.patterns[pattern] = (dict(inheritance_models), compound_candidate)
+        if len(self.patterns) > self.max_size:
+            self.patterns.popitem(last=False)
+
+        return compound_candidate
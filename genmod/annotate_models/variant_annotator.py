@@ -3,8 +3,9 @@
 """
 variant_consumer.py
 
-Consumes batches of variants and annotates them. Each batch is a dictionary
-with variant_id:s as keys and dictionaries with variant information.
+Consumes batches of variants and annotates them. Each batch is a block of raw
+vcf lines, see genmod/utils/line_batches.py, that is parsed into a dictionary
+with integer handles as keys and the variant records as values.
 The variants will get different annotations depending on input
 
 Created by Måns Magnusson on 2013-03-01.
@@ -14,12 +15,45 @@ Copyright (c) 2013 __MyCompanyName__. All rights reserved.
 from __future__ import absolute_import, division, print_function
 
 import logging
+import time
 from multiprocessing import Process
 
-from genmod.vcf_tools import get_genotypes
+import tabix
 
-from .fix_variant import make_print_version
+from genmod.memory_report import memory_traced
+from genmod.metrics import NULL_METRICS, get_worker_metrics
+from genmod.profiling import profiled
+from genmod.score_variants import add_rank_score, score_compound_batch
+from genmod.utils import (
+    generate_batches,
+    generate_shard_lines,
+    get_annotated_batch_trace,
+    get_annotation,
+    get_chromosome_priority,
+    get_rank_score,
+    pack_lines,
+    read_task,
+    splice_info,
+    split_batch,
+)
+from genmod.vcf_tools import (
+    CsqColumns,
+    InfoView,
+    VariantRecord,
+    get_genotypes,
+    get_sample_index,
+    get_variant_id,
+    update_vcf_info,
+)
+
+from .family_shards import pack_family_annotations
+from .fix_variant import get_family_annotations, make_print_version
 from .genetic_models import check_genetic_models
+from .genotype_matrix import check_genetic_models_matrix
+from .model_cache import MODEL_CACHE_SIZE, ModelCache
+
+# The FORMAT keys that are used by the genetic models and the model score
+MODEL_FORMAT_KEYS = ("GT", "GQ")
 
 
 class VariantAnnotator(Process):
@@ -34,10 +68,16 @@ class VariantAnnotator(Process):
         results_queue,
         families,
         individuals,
+        header_line,
+        vep_header=None,
+        annotation_keyword="Annotation",
         phased=False,
         strict=False,
         vep=False,
         reduced_penetrance_genes=None,
+        engine="python",
+        model_cache_size=MODEL_CACHE_SIZE,
+        batch_tracer=None,
     ):
         """
         Initialize the VariantAnnotator
@@ -46,15 +86,30 @@ class VariantAnnotator(Process):
         genetic inheritance patterns that they follow and put them in the
         results queue.
 
+        A task is made with make_task. It has the batch number, a block of
+        variant lines, blocks with the context lines of a sub batch, see
+        split_batch, and if the lines are a chunk of batches with one
+        variant, see coalesce_batches. The result is a tuple with the batch
+        number and a block with the new INFO fields, in the same order as the
+        variant lines.
+
         Arguments:
             task_queue (Queue)
             results_queue (Queue)
             families (dict)
             individuals (list)
+            header_line (list): The header columns of the vcf
+            vep_header (list): The vep columns of the CSQ field
+            annotation_keyword (str): The INFO key that holds the features
             phased (bool)
             strict (bool)
             vep (bool)
             reduced_penetrance_genes (set): Set of reduced penetrance genes
+            engine (str): 'python' or 'numpy', how the genetic models are checked
+            model_cache_size (int): How many genotype patterns to cache the
+                                    models for, 0 turns the cache off
+            batch_tracer (BatchTracer): Keeps the slowest batches, None if
+                                        the batches are not traced
         """
         Process.__init__(self)
         self.logger = logging.getLogger(__name__)
@@ -68,12 +123,19 @@ class VariantAnnotator(Process):
 
         self.logger.debug("Setting up results queue")
         self.results_queue = results_queue
+        # The metrics are collected in run, see genmod/metrics.py
+        self.metrics = NULL_METRICS
 
         # The families that should be annotated
         self.families = families
         self.logger.debug("Families found: {0}".format(self.families))
         self.individuals = individuals
         self.logger.debug("Individuals found: {0}".format(self.individuals))
+        self.header_line = header_line
+        self.sample_index = get_sample_index(header_line)
+        self.vep_header = vep_header or []
+        self.csq_columns = CsqColumns(self.vep_header)
+        self.annotation_keyword = annotation_keyword
 
         # Settings for the annotation
         self.phased = phased
@@ -83,65 +145,517 @@ class VariantAnnotator(Process):
         self.vep = vep
         self.logger.debug("Setting vep to {0}".format(self.vep))
         self.reduced_penetrance = reduced_penetrance_genes or set()
+        self.engine = engine
+        self.logger.debug("Setting engine to {0}".format(self.engine))
+        # The models of the genotype patterns are cached over all batches
+        self.model_cache = None
+        if model_cache_size:
+            self.model_cache = ModelCache(model_cache_size)
+        self.batch_tracer = batch_tracer
+
+    def parse_variant(self, variant_line):
+        """Parse a raw variant line into a variant record
+
+        Arguments:
+            variant_line (str): A vcf variant line
+
+        Returns:
+            variant (VariantRecord): A variant with info_dict, variant_id and
+                                     annotation
+        """
+        variant = VariantRecord.from_line(variant_line, self.sample_index)
+        variant["info_dict"] = InfoView(variant["INFO"])
+        variant["variant_id"] = get_variant_id(variant)
+
+        variant["annotation"] = get_annotation(
+            variant=variant,
+            vep=self.vep,
+            annotation_key=self.annotation_keyword,
+            csq_columns=self.csq_columns,
+        )
+        return variant
+
+    def annotate_variants(self, variants, singletons=False):
+        """Annotate the genetic models of the parsed variants of a batch
+
+        The annotations are added to the INFO field of the variants, see
+        make_print_version.
+
+        Inside the batch a variant is known by an integer handle, the position
+        of its variant id in the batch. The compound pairs are sets of handles
+        and are only turned into variant ids when the Compounds are written.
+        The models are checked once for each variant id, a record with the
+        same variant id as an earlier record of the batch gets the model
+        annotations of that record.
+
+        Arguments:
+            variants (list): The variant records of a batch, see parse_variant
+            singletons (bool): If the variants are a chunk of batches with one
+                               variant, they are never compound pairs
+
+        Returns:
+            compound_counts (dict): The counts of the compound work, see
+                                    check_genetic_models
+        """
+        # A batch is a dictionary with variants on the form {handle:variant}
+        handles = {}
+        variant_batch = {}
+        duplicates = []
+        for variant in variants:
+            handle = handles.setdefault(variant["variant_id"], len(handles))
+            if handle in variant_batch:
+                duplicates.append((variant, variant_batch[handle]))
+            else:
+                variant_batch[handle] = variant
+        variant_ids = list(handles)
+
+        # We are now going to check the genetic models for the variants in
+        # the batch
+
+        for variant in variant_batch.values():
+            variant["genotypes"] = get_genotypes(variant, self.individuals, MODEL_FORMAT_KEYS)
+
+            # Check if the variant is in a gene with reduced penetrance
+            if variant.get("annotation", set()).intersection(self.reduced_penetrance):
+                self.logger.debug(
+                    "Setting reduced_penetrance to True for variant: {0}".format(
+                        variant["variant_id"]
+                    )
+                )
+
+                variant["reduced_penetrance"] = True
+
+        if singletons:
+            for variant in variants:
+                variant["compound_candidate"] = False
+        elif len(variant_batch) > 1:
+            # We only need to check compound candidates if there is
+            # more than one variant in the batch
+            for variant in variant_batch.values():
+                self.logger.debug("Check compound candidates")
+
+                variant["compound_candidate"] = False
+
+                if variant.get("annotation"):
+                    variant["compound_candidate"] = True
+                    self.logger.debug("Set compound_candidate to True")
+
+        # Check the genetic models for all variants in the batch
+        if self.engine == "numpy":
+            check_models = check_genetic_models_matrix
+        else:
+            check_models = check_genetic_models
+        compound_counts = check_models(
+            variant_batch=variant_batch,
+            families=self.families,
+            phased=self.phased,
+            strict=self.strict,
+            model_cache=self.model_cache,
+        )
+
+        # A duplicated record is annotated as the first record with its id
+        for variant, first_variant in duplicates:
+            for key in ("genotypes", "inheritance_models", "compounds"):
+                if key in first_variant:
+                    variant[key] = first_variant[key]
+
+        # # Now we want to make versions of the variants that are ready for printing.
+        for variant in variants:
+            self.make_print_version(variant, variant_ids)
+        return compound_counts
+
+    def make_print_version(self, variant, variant_ids=None):
+        """Set the model annotations in the info_dict, see make_print_version"""
+        make_print_version(variant=variant, families=self.families, variant_ids=variant_ids)
+
+    def put_result(self, batch_number, info_fields):
+        """Put the new INFO fields of a batch in the results queue"""
+        self.logger.debug("Putting batch {0} in results_queue".format(batch_number))
+        self.results_queue.put((batch_number, pack_lines(info_fields)))
+
+    def log_model_cache(self):
+        """Log how often the models of a genotype pattern were cached"""
+        if self.model_cache is not None:
+            self.logger.debug(
+                "{0}: Genotype pattern cache hits: {1}, misses: {2}".format(
+                    self.proc_name, self.model_cache.hits, self.model_cache.misses
+                )
+            )
 
+    def annotate_batch(self, variant_lines, context_before=(), context_after=(), singletons=False):
+        """Annotate the variants of a batch
+
+        The context lines are variants of the same features from a batch that
+        was split, see split_batch. They are used when the compounds are
+        checked but their INFO fields are not returned.
+
+        Arguments:
+            variant_lines (list): The vcf variant lines of a batch
+            context_before (list): Context lines that come before the batch
+            context_after (list): Context lines that come after the batch
+            singletons (bool): If the lines are a chunk of batches with one
+                               variant, see coalesce_batches
+
+        Returns:
+            info_fields (list): The new INFO fields, in the same order as the
+                                variant lines
+        """
+        start_time = time.perf_counter()
+        # Keep the variants in the order of the lines, the INFO fields are
+        # sent back in the same order
+        lines = list(context_before) + list(variant_lines) + list(context_after)
+        with self.metrics.timer("parse"):
+            variants = [self.parse_variant(line) for line in lines]
+        with self.metrics.timer("models"):
+            compound_counts = self.annotate_variants(variants, singletons)
+
+        start = len(context_before)
+        batch_variants = variants[start : start + len(variant_lines)]
+        if self.batch_tracer is not None and not singletons:
+            seconds = time.perf_counter() - start_time
+            if self.batch_tracer.is_slow(seconds):
+                self.batch_tracer.add_trace(
+                    get_annotated_batch_trace(
+                        seconds, variant_lines, batch_variants, compound_counts
+                    )
+                )
+        return [update_vcf_info(variant) for variant in batch_variants]
+
+    @profiled
+    @memory_traced
     def run(self):
         """Run the consuming"""
         self.logger.info("%s: Starting!" % self.proc_name)
+        self.metrics = get_worker_metrics(self.name)
         # Check if there are any batches in the queue
         while True:
-            # A batch is a dictionary with varints on the form {variant_id:variant_dict}
             self.logger.debug("Getting task from task_queue")
-            variant_batch = self.task_queue.get()
+            with self.metrics.timer("task_wait"):
+                task = self.task_queue.get()
 
-            if variant_batch is None:
+            if task is None:
                 self.logger.info("No more batches")
                 self.task_queue.task_done()
+                self.log_model_cache()
+                self.metrics.dump()
+                if self.batch_tracer is not None:
+                    self.batch_tracer.send(self.name)
                 self.logger.info("{0}: Exiting".format(self.proc_name))
                 break
 
-            # We are now going to check the genetic models for the variants in
-            # the batch
+            batch_number, variant_lines, context_before, context_after, singletons = read_task(task)
+            self.metrics.add_batch(len(variant_lines))
+            info_fields = self.annotate_batch(
+                variant_lines, context_before, context_after, singletons
+            )
+            with self.metrics.timer("put_result"):
+                self.put_result(batch_number, info_fields)
 
-            for variant_id in variant_batch:
-                variant = variant_batch[variant_id]
-                variant["genotypes"] = get_genotypes(variant, self.individuals)
+            self.task_queue.task_done()
 
-                # Check if the variant is in a gene with reduced penetrance
-                if variant.get("annotation", set()).intersection(self.reduced_penetrance):
-                    self.logger.debug(
-                        "Setting reduced_penetrance to True for variant: {0}".format(variant_id)
-                    )
+        return
+
+
+class FamilyShardAnnotator(VariantAnnotator):
+    """
+    Annotates the variants of all batches for the families of one shard.
 
-                    variant["reduced_penetrance"] = True
+    Every worker gets all batches in its own task queue, see family_shards.py.
+    Only the individuals of the shard families are parsed.
+    """
+
+    def __init__(self, task_queue, results_queue, shard_number, **kwargs):
+        """
+        Initialize the FamilyShardAnnotator
 
-            if len(variant_batch) > 1:
-                # We only need to check compound candidates if there is
-                # more than one variant in the batch
-                for variant_id in variant_batch:
-                    self.logger.debug("Check compound candidates")
-                    variant = variant_batch[variant_id]
+        The tasks are the same as for VariantAnnotator. The result is a tuple
+        with the batch number, a block with the packed model annotations of
+        the shard families for each variant, see pack_family_annotations,
+        and the shard number.
 
-                    variant["compound_candidate"] = False
+        Arguments:
+            task_queue (Queue): The task queue of this shard
+            results_queue (Queue)
+            shard_number (int): The number of the family shard
+            **kwargs: The arguments for VariantAnnotator, with the families
+                      and individuals of the shard
+        """
+        super(FamilyShardAnnotator, self).__init__(
+            task_queue=task_queue, results_queue=results_queue, **kwargs
+        )
+        self.shard_number = shard_number
 
-                    if variant.get("annotation"):
-                        variant["compound_candidate"] = True
-                        self.logger.debug("Set compound_candidate to True")
+    def make_print_version(self, variant, variant_ids=None):
+        """Replace the INFO field with the packed model annotations of the shard"""
+        variant["INFO"] = pack_family_annotations(
+            *get_family_annotations(
+                variant=variant, families=self.families, variant_ids=variant_ids
+            )
+        )
 
-            # Check the genetic models for all variants in the batch
-            check_genetic_models(
-                variant_batch=variant_batch,
-                families=self.families,
-                phased=self.phased,
-                strict=self.strict,
+    def put_result(self, batch_number, info_fields):
+        """Put the model annotations of a batch in the results queue"""
+        self.logger.debug(
+            "Putting batch {0} of shard {1} in results_queue".format(
+                batch_number, self.shard_number
             )
+        )
+        self.results_queue.put((batch_number, pack_lines(info_fields), self.shard_number))
 
-            # # Now we want to make versions of the variants that are ready for printing.
-            for variant_id in variant_batch:
-                variant = make_print_version(
-                    variant=variant_batch[variant_id], families=self.families
-                )
-                self.logger.debug("Putting variant in results_queue")
-                self.results_queue.put(variant)
+
+class ShardAnnotator(VariantAnnotator):
+    """
+    Annotates the variants of region shards of an indexed vcf.
+
+    Each worker reads its own shards from the bgzipped and tabix indexed
+    variant file, see genmod/utils/region_shards.py, and batches the variants
+    itself. The main process only hands out the shards and prints the results.
+    """
+
+    def __init__(
+        self,
+        task_queue,
+        results_queue,
+        variant_file,
+        head,
+        chunk_size=1000,
+        max_batch_size=None,
+        **kwargs,
+    ):
+        """
+        Initialize the ShardAnnotator
+
+        A task is a tuple with the shard number, contig, start and end of a
+        shard. The results are tuples with the shard number, a block with
+        annotated variant lines and if the shard is finished. Large shards are
+        sent in several blocks of about chunk_size variants, in order.
+
+        Arguments:
+            task_queue (Queue)
+            results_queue (Queue)
+            variant_file (str): Path to a bgzipped and tabix indexed vcf
+            head (HeaderParser): The header of the vcf
+            chunk_size (int): The number of variants to collect before sending
+            max_batch_size (int): Split larger batches, see split_batch
+            **kwargs: The arguments for VariantAnnotator
+        """
+        super(ShardAnnotator, self).__init__(
+            task_queue=task_queue,
+            results_queue=results_queue,
+            header_line=head.header,
+            vep_header=head.vep_columns,
+            **kwargs,
+        )
+        self.variant_file = variant_file
+        self.head = head
+        self.chunk_size = chunk_size
+        self.max_batch_size = max_batch_size
+
+    def annotate_shard(self, tabix_handle, shard_number, contig, start, end):
+        """Annotate the variants of one shard and put them in the results queue"""
+        shard_lines = generate_shard_lines(
+            tabix_handle=tabix_handle,
+            contig=contig,
+            start=start,
+            end=end,
+            annotation_keyword=self.annotation_keyword,
+            vep=self.vep,
+            vep_header=self.vep_header,
+        )
+        annotated_lines = []
+        for batch in generate_batches(
+            variants=shard_lines,
+            header=self.head,
+            vep=self.vep,
+            annotation_keyword=self.annotation_keyword,
+            raw=True,
+        ):
+            for lines, context_before, context_after in split_batch(
+                batch=batch,
+                max_batch_size=self.max_batch_size,
+                annotation_keyword=self.annotation_keyword,
+                vep=self.vep,
+                vep_header=self.vep_header,
+            ):
+                self.metrics.add_batch(len(lines))
+                info_fields = self.annotate_batch(lines, context_before, context_after)
+                annotated_lines.extend(map(splice_info, lines, info_fields))
+            if len(annotated_lines) >= self.chunk_size:
+                with self.metrics.timer("put_result"):
+                    self.results_queue.put((shard_number, pack_lines(annotated_lines), False))
+                annotated_lines = []
+
+        block = pack_lines(annotated_lines) if annotated_lines else None
+        self.logger.debug("Putting shard {0} in results_queue".format(shard_number))
+        with self.metrics.timer("put_result"):
+            self.results_queue.put((shard_number, block, True))
+
+    @profiled
+    @memory_traced
+    def run(self):
+        """Run the consuming"""
+        self.logger.info("%s: Starting!" % self.proc_name)
+        # The handle is opened here since it can not be shared between processes
+        tabix_handle = tabix.open(self.variant_file)
+        self.metrics = get_worker_metrics(self.name)
+        while True:
+            with self.metrics.timer("task_wait"):
+                task = self.task_queue.get()
+
+            if task is None:
+                self.logger.info("No more shards")
+                self.task_queue.task_done()
+                self.log_model_cache()
+                self.metrics.dump()
+                if self.batch_tracer is not None:
+                    self.batch_tracer.send(self.name)
+                self.logger.info("{0}: Exiting".format(self.proc_name))
+                break
+
+            self.annotate_shard(tabix_handle, *task)
+            self.task_queue.task_done()
+
+        return
+
+
+class PipelineAnnotator(VariantAnnotator):
+    """
+    Runs the models, score and compound stages on the batches of variants.
+
+    Each variant is parsed once and the stages work on the same variant
+    dictionary, the INFO field is serialised when the batch is finished.
+    Used by 'genmod pipeline'.
+    """
+
+    def __init__(
+        self,
+        task_queue,
+        results_queue,
+        annotate_models=True,
+        config_parser=None,
+        family_id="1",
+        rank_results=False,
+        compound_models=None,
+        threshold=9,
+        penalty=6,
+        sort_mode=None,
+        **kwargs,
+    ):
+        """
+        Initialize the PipelineAnnotator
+
+        A task is made with make_task, without context lines. The result is
+        a tuple with the batch number and a block with the new INFO fields,
+        and a block with the sort priorities if the variants are sorted.
+
+        Arguments:
+            task_queue (Queue)
+            results_queue (Queue)
+            annotate_models (bool): If the genetic models should be annotated
+            config_parser (ConfigParser): The score config, None if the
+                                          variants should not be scored
+            family_id (str): The family id of the rank scores
+            rank_results (bool): If the category scores should be added
+            compound_models (list): The models that are penalised, None if the
+                                    compounds should not be scored
+            threshold (int): Threshold for the compound penalty
+            penalty (int): The compound penalty
+            sort_mode (str): 'rank', 'chromosome' or None
+            **kwargs: The arguments for VariantAnnotator
+        """
+        super(PipelineAnnotator, self).__init__(
+            task_queue=task_queue, results_queue=results_queue, **kwargs
+        )
+        self.annotate_models = annotate_models
+        self.config_parser = config_parser
+        self.score_categories = list(config_parser.categories.keys()) if config_parser else []
+        self.family_id = family_id
+        self.rank_results = rank_results
+        self.compound_models = compound_models
+        self.threshold = threshold
+        self.penalty = penalty
+        self.sort_mode = sort_mode
+
+    def process_batch(self, variant_lines, singletons=False):
+        """Run the stages on the variants of a batch
+
+        Arguments:
+            variant_lines (list): The vcf variant lines of a batch
+            singletons (bool): If the lines are a chunk of batches with one
+                               variant, see coalesce_batches
+
+        Returns:
+            info_fields (list): The new INFO fields, in the same order as the
+                                variant lines
+            priorities (list): The sort priorities, None if not sorted
+        """
+        metrics = self.metrics
+        with metrics.timer("parse"):
+            variants = [self.parse_variant(line) for line in variant_lines]
+
+        if self.annotate_models:
+            with metrics.timer("models"):
+                self.annotate_variants(variants, singletons)
+
+        if self.config_parser:
+            with metrics.timer("score"):
+                for variant in variants:
+                    add_rank_score(
+                        variant=variant,
+                        config_parser=self.config_parser,
+                        score_categories=self.score_categories,
+                        family_id=self.family_id,
+                        csq_format=self.vep_header,
+                        csq_columns=self.csq_columns,
+                        rank_results=self.rank_results,
+                    )
+
+        if self.compound_models is not None:
+            # Each singleton is scored as its own batch
+            batches = [variants] if not singletons else [[variant] for variant in variants]
+            with metrics.timer("compound"):
+                for batch in batches:
+                    score_compound_batch(
+                        variants=batch,
+                        models=self.compound_models,
+                        threshold=self.threshold,
+                        penalty=self.penalty,
+                    )
+
+        priorities = None
+        if self.sort_mode == "rank":
+            priorities = [get_rank_score(variant_dict=variant) for variant in variants]
+        elif self.sort_mode == "chromosome":
+            priorities = [get_chromosome_priority(variant["CHROM"]) for variant in variants]
+
+        return [update_vcf_info(variant) for variant in variants], priorities
+
+    @profiled
+    @memory_traced
+    def run(self):
+        """Run the consuming"""
+        self.logger.info("%s: Starting!" % self.proc_name)
+        self.metrics = get_worker_metrics(self.name)
+        while True:
+            with self.metrics.timer("task_wait"):
+                task = self.task_queue.get()
+
+            if task is None:
+                self.logger.info("No more batches")
+                self.task_queue.task_done()
+                self.log_model_cache()
+                self.metrics.dump()
+                self.logger.info("{0}: Exiting".format(self.proc_name))
+                break
+
+            batch_number, variant_lines, _, _, singletons = read_task(task)
+            self.metrics.add_batch(len(variant_lines))
+            info_fields, priorities = self.process_batch(variant_lines, singletons)
+            with self.metrics.timer("put_result"):
+                result = (batch_number, pack_lines(info_fields))
+                if priorities is not None:
+                    result += (pack_lines(priorities),)
+                self.results_queue.put(result)
 
             self.task_queue.task_done()
 
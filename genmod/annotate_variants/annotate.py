@@ -12,7 +12,7 @@ logger = logging.getLogger(__name__)
 
 def annotate_variant(variant, annotation_arguments):
     """Annotate a variant based on what arguments that are passed"""
-    variant_info = variant.rstrip().split("\t")
+    variant_info = variant.rstrip().split("\t", 8)
     chrom = variant_info[0]
     if chrom.startswith(("chr", "CHR", "Chr")):
         chrom = chrom[3:]
@@ -0,0 +1,19 @@
+from .harness import COMMANDS, compare_results, run_benchmark, run_command, write_results
+from .synthetic import (
+    FAMILY_TYPES,
+    generate_variant_lines,
+    get_ped_lines,
+    write_synthetic_files,
+)
+
+__all__ = [
+    "COMMANDS",
+    "compare_results",
+    "run_benchmark",
+    "run_command",
+    "write_results",
+    "FAMILY_TYPES",
+    "generate_variant_lines",
+    "get_ped_lines",
+    "write_synthetic_files",
+]
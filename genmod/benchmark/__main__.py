@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+__main__.py
+
+Command line for the genmod benchmarks.
+
+    python -m genmod.benchmark generate synthetic.vcf synthetic.ped -n 100000
+    python -m genmod.benchmark run --sizes 10000,100000 --processes 1,4 -o results.json
+    python -m genmod.benchmark compare old.json new.json
+"""
+
+from __future__ import print_function
+
+import json
+import logging
+import os
+import tempfile
+from contextlib import nullcontext
+
+import click
+
+from genmod import logger
+from genmod.log import LEVELS, init_log
+
+from .harness import COMMANDS, compare_results, run_benchmark, write_results
+from .synthetic import FAMILY_TYPES, write_synthetic_files
+
+family_type_option = click.option(
+    "-t",
+    "--family_type",
+    "--family-type",
+    "family_types",
+    type=click.Choice(sorted(FAMILY_TYPES)),
+    multiple=True,
+    default=["trio"],
+    show_default=True,
+    help="The type of each family. Can be used multiple times for a cohort.",
+)
+seed_option = click.option("--seed", default=1, show_default=True, help="Seed of the data.")
+vep_option = click.option("--vep", is_flag=True, help="If a vep CSQ field should be added.")
+
+
+def get_numbers(context, param, value):
+    """Parse a comma separated list of numbers"""
+    try:
+        return [int(number) for number in value.split(",")]
+    except ValueError:
+        raise click.BadParameter("Give numbers separated by commas, like 1000,10000")
+
+
+@click.group()
+@click.option(
+    "-v",
+    "--verbose",
+    count=True,
+    default=0,
+    help="Increase output verbosity. Can be used multiple times, eg. -vv",
+)
+def cli(verbose):
+    """Benchmarks of the genmod commands on synthetic data."""
+    init_log(logger, loglevel=LEVELS.get(min(verbose, 2), "WARNING"))
+
+
+@cli.command()
+@click.argument("vcf_path", type=click.Path())
+@click.argument("ped_path", type=click.Path())
+@click.option("-n", "--nr_variants", "--nr-variants", default=10000, show_default=True)
+@family_type_option
+@seed_option
+@vep_option
+@click.option(
+    "--sv_fraction",
+    "--sv-fraction",
+    default=0.01,
+    show_default=True,
+    help="The fraction of structural variants.",
+)
+def generate(vcf_path, ped_path, nr_variants, family_types, seed, vep, sv_fraction):
+    """Write a synthetic vcf and ped file."""
+    write_synthetic_files(
+        vcf_path, ped_path, nr_variants, family_types, seed=seed, vep=vep, sv_fraction=sv_fraction
+    )
+
+
+@cli.command()
+@click.option(
+    "--sizes",
+    default="10000,100000",
+    show_default=True,
+    callback=get_numbers,
+    help="The numbers of variants, separated by commas.",
+)
+@click.option(
+    "-p",
+    "--processes",
+    default="1,4",
+    show_default=True,
+    callback=get_numbers,
+    help="The numbers of processes of models and compound, separated by commas.",
+)
+@click.option(
+    "-c",
+    "--command",
+    "commands",
+    type=click.Choice(COMMANDS),
+    multiple=True,
+    help="The commands to run, all if not given. Can be used multiple times.",
+)
+@family_type_option
+@seed_option
+@vep_option
+@click.option(
+    "-w",
+    "--workdir",
+    type=click.Path(exists=True, file_okay=False),
+    help="Directory for the synthetic files and outputs, a temporary directory if not given.",
+)
+@click.option(
+    "-o", "--outfile", type=click.Path(), required=True, help="The json file with the results."
+)
+def run(sizes, processes, commands, family_types, seed, vep, workdir, outfile):
+    """Time the commands on synthetic data of several sizes."""
+    # The files are kept in the workdir, a temporary directory is removed
+    run_dir_context = nullcontext(workdir) if workdir else tempfile.TemporaryDirectory()
+    with run_dir_context as run_dir:
+        results = run_benchmark(
+            workdir=run_dir,
+            sizes=sizes,
+            processes=processes,
+            commands=commands or COMMANDS,
+            family_types=family_types,
+            seed=seed,
+            vep=vep,
+        )
+    write_results(results, outfile)
+    for result in results["results"]:
+        click.echo(
+            "{command}\t{nr_variants}\t{processes}\t{wall_time}s\t{variants_per_second}/s\t"
+            "{peak_rss_mb}MB".format(**result)
+        )
+
+
+@cli.command()
+@click.argument("old_results", type=click.File())
+@click.argument("new_results", type=click.File())
+def compare(old_results, new_results):
+    """Compare the results of two benchmark runs."""
+    comparisons = compare_results(json.load(old_results), json.load(new_results))
+    for comparison in comparisons:
+        click.echo(
+            "{command}\t{nr_variants}\t{processes}\ttime x{time_ratio}\t"
+            "memory x{memory_ratio}".format(**comparison)
+        )
+
+
+if __name__ == "__main__":
+    logging.captureWarnings(True)
+    cli(prog_name=os.path.basename(os.path.dirname(__file__)))
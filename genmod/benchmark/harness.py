@@ -0,0 +1,224 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+harness.py
+
+Time the genmod commands end to end on synthetic data.
+
+For each input size a synthetic vcf and ped file are written, see
+synthetic.py, and the commands are run in the order of a real analysis:
+annotate, models, score, compound and sort. Each command reads the output of
+the command before it. The commands that use several processes are run once
+for each number of processes.
+
+Every command is run in a new python process. The wall time, the throughput
+and the peak resident memory of the largest process are recorded, and the
+results are written as json so that versions can be compared, see
+compare_results.
+"""
+
+from __future__ import division, print_function
+
+import json
+import logging
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from genmod import __version__
+
+from .synthetic import write_synthetic_files
+
+logger = logging.getLogger(__name__)
+
+COMMANDS = ("annotate", "models", "score", "compound", "sort")
+
+# The commands that take --processes
+PARALLEL_COMMANDS = ("models", "compound")
+
+SCORE_CONFIG = os.path.join(
+    os.path.dirname(os.path.dirname(__file__)), "configs", "rank_model_cmms_v1.9.ini"
+)
+
+
+def get_command_arguments(command, vcf_path, ped_path, vep=False):
+    """Get the genmod arguments of a command
+
+    Args:
+        command (str): One of COMMANDS
+        vcf_path (str): The input vcf of the command
+        ped_path (str): The ped file of the families
+        vep (bool): If the variants are annotated with vep
+
+    Returns:
+        arguments (list): The arguments after 'genmod'
+    """
+    arguments = [command, vcf_path]
+    if command == "annotate":
+        arguments.append("--annotate-regions")
+    elif command == "models":
+        arguments.extend(["-f", ped_path])
+    elif command == "score":
+        arguments.extend(["-c", SCORE_CONFIG, "--skip_plugin_check"])
+    if vep and command in ("models", "compound"):
+        arguments.append("--vep")
+    return arguments
+
+
+def run_command(arguments, outfile):
+    """Run a genmod command in a new process and measure it
+
+    Args:
+        arguments (list): The arguments after 'genmod'
+        outfile (str): The path to the output of the command
+
+    Returns:
+        measure (dict): The wall time in seconds, the peak resident memory of
+                        the largest process in MB and the exit code
+    """
+    command_line = [sys.executable, "-m", "genmod.commands.base"] + arguments + ["-o", outfile]
+    logger.info("Running {0}".format(" ".join(command_line)))
+    start = time.perf_counter()
+    process = subprocess.Popen(command_line, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    # wait4 gives the resource usage of the process and the workers it started
+    stderr = process.stderr.read()
+    _, status, usage = os.wait4(process.pid, 0)
+    wall_time = time.perf_counter() - start
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -1
+    process.stderr.close()
+
+    if process.returncode != 0:
+        logger.warning("Command failed: {0}".format(stderr.decode("utf-8", "replace")))
+
+    # ru_maxrss is in kilobytes on linux and in bytes on mac
+    peak_rss = usage.ru_maxrss / 1024
+    if sys.platform == "darwin":
+        peak_rss /= 1024
+    return {
+        "wall_time": round(wall_time, 3),
+        "peak_rss_mb": round(peak_rss, 1),
+        "exit_code": process.returncode,
+    }
+
+
+def run_benchmark(
+    workdir,
+    sizes,
+    processes=(1,),
+    commands=COMMANDS,
+    family_types=("trio",),
+    seed=1,
+    vep=False,
+):
+    """Run the commands on synthetic data of several sizes
+
+    Args:
+        workdir (str): A directory for the synthetic files and the outputs
+        sizes (list): The numbers of variants
+        processes (list): The numbers of processes of the parallel commands
+        commands (list): The commands to run, in the order of COMMANDS
+        family_types (list): The family types of the samples, see get_ped_lines
+        seed (int): The seed of the synthetic data
+        vep (bool): If the variants should have a vep CSQ field
+
+    Returns:
+        results (dict): The settings, the environment and one result for each
+                        command, size and number of processes
+    """
+    results = {
+        "genmod_version": __version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
+        "seed": seed,
+        "family_types": list(family_types),
+        "vep": vep,
+        "results": [],
+    }
+
+    for nr_variants in sizes:
+        vcf_path = os.path.join(workdir, "synthetic_{0}.vcf".format(nr_variants))
+        ped_path = os.path.join(workdir, "synthetic_{0}.ped".format(nr_variants))
+        write_synthetic_files(vcf_path, ped_path, nr_variants, family_types, seed=seed, vep=vep)
+
+        # Each command reads the output of the command before it
+        input_path = vcf_path
+        for command in COMMANDS:
+            if command not in commands:
+                continue
+            outfile = os.path.join(workdir, "{0}_{1}.vcf".format(command, nr_variants))
+            arguments = get_command_arguments(command, input_path, ped_path, vep)
+            command_processes = processes if command in PARALLEL_COMMANDS else [None]
+            for nr_processes in command_processes:
+                command_arguments = list(arguments)
+                if nr_processes:
+                    command_arguments.extend(["-p", str(nr_processes)])
+                measure = run_command(command_arguments, outfile)
+                measure.update(
+                    {
+                        "command": command,
+                        "nr_variants": nr_variants,
+                        "processes": nr_processes,
+                        "variants_per_second": round(nr_variants / max(measure["wall_time"], 1e-9)),
+                    }
+                )
+                logger.info(
+                    "{0} {1} variants, {2} processes: {3}s".format(
+                        command, nr_variants, nr_processes or 1, measure["wall_time"]
+                    )
+                )
+                results["results"].append(measure)
+            # annotate only adds regions, the later commands use the
+            # annotations of the synthetic vcf
+            if command != "annotate":
+                input_path = outfile
+
+    return results
+
+
+def write_results(results, outfile):
+    """Write the results as json"""
+    with open(outfile, "w") as json_file:
+        json.dump(results, json_file, indent=2)
+        json_file.write("\n")
+
+
+def get_result_key(result):
+    """Get what identifies a result, the command, size and processes"""
+    return (result["command"], result["nr_variants"], result["processes"])
+
+
+def compare_results(old_results, new_results):
+    """Compare the wall times and memory of two benchmark results
+
+    Args:
+        old_results (dict): The results of the reference version
+        new_results (dict): The results to compare
+
+    Returns:
+        comparisons (list): Dictionaries with the command, size, processes and
+                            the new wall time and peak memory relative to the
+                            old, for the runs that are in both results
+    """
+    old = {get_result_key(result): result for result in old_results["results"]}
+    comparisons = []
+    for result in new_results["results"]:
+        old_result = old.get(get_result_key(result))
+        if old_result is None or old_result["exit_code"] or result["exit_code"]:
+            continue
+        comparisons.append(
+            {
+                "command": result["command"],
+                "nr_variants": result["nr_variants"],
+                "processes": result["processes"],
+                "time_ratio": round(result["wall_time"] / max(old_result["wall_time"], 1e-9), 3),
+                "memory_ratio": round(
+                    result["peak_rss_mb"] / max(old_result["peak_rss_mb"], 1e-9), 3
+                ),
+            }
+        )
+    return comparisons
@@ -0,0 +1,437 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+synthetic.py
+
+Generate seeded synthetic vcf and ped files for benchmarks.
+
+The variants are laid out along the chromosomes in genes and intergenic
+stretches. Most genes hold a few variants but the sizes are skewed with a
+long tail, like TTN or the olfactory receptor clusters in real data, and
+some genes overlap so that batches chain. Intergenic variants have no
+annotation and are batches of one variant.
+
+The genotypes of the children are inherited from the parents, with a small
+rate of de novo calls, so that the genetic models are followed about as
+often as in real families. A vep CSQ field with one annotation per
+transcript and structural variant records can be added.
+
+The same seed always gives the same files.
+"""
+
+from __future__ import print_function
+
+import logging
+import random
+
+logger = logging.getLogger(__name__)
+
+# The members of each family type as (role, father, mother, sex, phenotype)
+FAMILY_TYPES = {
+    "singleton": [("proband", "0", "0", "1", "2")],
+    "duo": [
+        ("proband", "0", "mother", "2", "2"),
+        ("mother", "0", "0", "2", "1"),
+    ],
+    "trio": [
+        ("proband", "father", "mother", "1", "2"),
+        ("mother", "0", "0", "2", "1"),
+        ("father", "0", "0", "1", "1"),
+    ],
+    "quartet": [
+        ("proband", "father", "mother", "1", "2"),
+        ("sibling", "father", "mother", "2", "1"),
+        ("mother", "0", "0", "2", "1"),
+        ("father", "0", "0", "1", "1"),
+    ],
+}
+
+# Chromosomes and their relative sizes, the variants are spread after size
+CHROMOSOMES = [
+    ("1", 249),
+    ("2", 243),
+    ("3", 198),
+    ("4", 191),
+    ("5", 181),
+    ("6", 171),
+    ("7", 159),
+    ("8", 146),
+    ("9", 141),
+    ("10", 136),
+    ("11", 135),
+    ("12", 134),
+    ("13", 115),
+    ("14", 107),
+    ("15", 103),
+    ("16", 90),
+    ("17", 81),
+    ("18", 78),
+    ("19", 59),
+    ("20", 63),
+    ("21", 48),
+    ("22", 51),
+    ("X", 155),
+]
+
+CONSEQUENCES = [
+    ("missense_variant", 0.35),
+    ("synonymous_variant", 0.3),
+    ("splice_region_variant", 0.1),
+    ("stop_gained", 0.05),
+    ("frameshift_variant", 0.05),
+    ("5_prime_UTR_variant", 0.1),
+    ("3_prime_UTR_variant", 0.05),
+]
+
+CSQ_FIELDS = [
+    "Allele",
+    "Gene",
+    "Feature",
+    "Feature_type",
+    "Consequence",
+    "cDNA_position",
+    "CDS_position",
+    "Protein_position",
+    "Amino_acids",
+    "Codons",
+    "Existing_variation",
+    "EXON",
+    "INTRON",
+    "DISTANCE",
+    "STRAND",
+    "SYMBOL",
+    "SYMBOL_SOURCE",
+    "SIFT",
+    "PolyPhen",
+    "HGVSc",
+    "HGVSp",
+]
+
+HEADER_LINES = [
+    "##fileformat=VCFv4.2",
+    '##INFO=<ID=Annotation,Number=.,Type=String,Description="Annotates what feature(s) this '
+    'variant belongs to.">',
+    '##INFO=<ID=DP,Number=1,Type=Integer,Description="Approximate read depth">',
+    '##INFO=<ID=MQ,Number=1,Type=Float,Description="RMS Mapping Quality">',
+    '##INFO=<ID=1000GAF,Number=1,Type=Float,Description="Frequency in the 1000G database.">',
+    '##INFO=<ID=EXACAF,Number=1,Type=Float,Description="Frequency in the ExAC database.">',
+    '##INFO=<ID=CADD,Number=1,Type=Float,Description="The CADD relative score for this '
+    'alternative.">',
+    '##INFO=<ID=CLNSIG,Number=A,Type=String,Description="Variant Clinical Significance">',
+    '##INFO=<ID=MostSevereConsequence,Number=.,Type=String,Description="Most severe genomic '
+    'consequence.">',
+    '##INFO=<ID=SVTYPE,Number=1,Type=String,Description="Type of structural variant">',
+    '##INFO=<ID=END,Number=1,Type=Integer,Description="End position of the variant">',
+    '##INFO=<ID=SVLEN,Number=.,Type=Integer,Description="Difference in length between REF and '
+    'ALT alleles">',
+    '##ALT=<ID=DEL,Description="Deletion">',
+    '##ALT=<ID=DUP,Description="Duplication">',
+    '##FORMAT=<ID=GT,Number=1,Type=String,Description="Genotype">',
+    '##FORMAT=<ID=AD,Number=R,Type=Integer,Description="Allelic depths for the ref and alt '
+    'alleles">',
+    '##FORMAT=<ID=DP,Number=1,Type=Integer,Description="Approximate read depth">',
+    '##FORMAT=<ID=GQ,Number=1,Type=Integer,Description="Genotype Quality">',
+    '##FORMAT=<ID=PL,Number=G,Type=Integer,Description="Phred-scaled genotype likelihoods">',
+]
+
+CSQ_HEADER_LINE = (
+    '##INFO=<ID=CSQ,Number=.,Type=String,Description="Consequence type as predicted by VEP. '
+    'Format: {0}">'.format("|".join(CSQ_FIELDS))
+)
+
+NUCLEOTIDES = "ACGT"
+
+
+def get_ped_lines(family_types):
+    """Get the lines of a ped file with one family for each family type
+
+    Args:
+        family_types (list): Family types, see FAMILY_TYPES
+
+    Returns:
+        ped_lines (list): The lines of the ped file, with a header
+    """
+    ped_lines = ["#FamilyID\tSampleID\tFather\tMother\tSex\tPhenotype"]
+    for number, family_type in enumerate(family_types, 1):
+        family_id = str(number)
+        for role, father, mother, sex, phenotype in FAMILY_TYPES[family_type]:
+            ped_lines.append(
+                "\t".join(
+                    [
+                        family_id,
+                        get_sample_id(family_id, role),
+                        get_sample_id(family_id, father),
+                        get_sample_id(family_id, mother),
+                        sex,
+                        phenotype,
+                    ]
+                )
+            )
+    return ped_lines
+
+
+def get_sample_id(family_id, role):
+    """Get the sample id of a family member, '0' is a missing parent"""
+    if role == "0":
+        return role
+    return "{0}_{1}".format(role, family_id)
+
+
+def get_gene_size(rng, skew=1.2):
+    """Draw the number of variants of a gene
+
+    The sizes follow a log normal distribution, most genes hold a few
+    variants and a few genes hold hundreds.
+
+    Args:
+        rng (Random): The random generator
+        skew (float): The sigma of the distribution, larger is more skewed
+
+    Returns:
+        size (int): The number of variants
+    """
+    return int(rng.lognormvariate(1.0, skew)) + 1
+
+
+def get_genotype(rng, allele_frequency):
+    """Draw the alleles of a founder from the allele frequency"""
+    return [int(rng.random() < allele_frequency), int(rng.random() < allele_frequency)]
+
+
+def get_family_genotypes(rng, family_type, allele_frequency, de_novo_rate=0.001):
+    """Draw the alleles of the members of a family
+
+    The children get one allele from each parent that is in the family,
+    and alleles of a missing parent are drawn from the allele frequency.
+
+    Returns:
+        genotypes (list): The two alleles of each member, in the order of
+                          FAMILY_TYPES
+    """
+    alleles = {}
+    # The parents are listed after the children, draw them first
+    for role, father, mother, _, _ in reversed(FAMILY_TYPES[family_type]):
+        if father == "0" and mother == "0":
+            alleles[role] = get_genotype(rng, allele_frequency)
+            continue
+        child = []
+        for parent in (father, mother):
+            if parent == "0":
+                child.append(int(rng.random() < allele_frequency))
+            else:
+                child.append(rng.choice(alleles[parent]))
+        if rng.random() < de_novo_rate:
+            child[0] = 1
+        alleles[role] = child
+    return [alleles[role] for role, _, _, _, _ in FAMILY_TYPES[family_type]]
+
+
+def get_sample_column(rng, alleles):
+    """Get the FORMAT column of a sample with GT:AD:DP:GQ:PL"""
+    if rng.random() < 0.02:
+        return "./.:0,0:0:.:."
+    depth = rng.randint(8, 60)
+    nr_alt = sum(alleles)
+    alt_depth = {0: 0, 1: depth // 2, 2: depth}[nr_alt]
+    gq = rng.randint(20, 99)
+    pl = ["0", "0", "0"]
+    for index in range(3):
+        if index != nr_alt:
+            pl[index] = str(rng.randint(20, 900))
+    return "{0}/{1}:{2},{3}:{4}:{5}:{6}".format(
+        min(alleles), max(alleles), depth - alt_depth, alt_depth, depth, gq, ",".join(pl)
+    )
+
+
+def get_csq(rng, alt, genes, nr_transcripts):
+    """Get a vep CSQ field with one annotation per transcript of each gene
+
+    Like vep, variants outside of genes get one intergenic annotation.
+    """
+    if not genes:
+        fields = dict.fromkeys(CSQ_FIELDS, "")
+        fields.update({"Allele": alt, "Consequence": "intergenic_variant"})
+        return "|".join(fields[field] for field in CSQ_FIELDS)
+
+    annotations = []
+    for gene in genes:
+        for transcript in range(nr_transcripts):
+            consequence = rng.choices(
+                [term for term, _ in CONSEQUENCES], [weight for _, weight in CONSEQUENCES]
+            )[0]
+            fields = dict.fromkeys(CSQ_FIELDS, "")
+            fields.update(
+                {
+                    "Allele": alt,
+                    "Gene": gene,
+                    "Feature": "{0}T{1}".format(gene, transcript),
+                    "Feature_type": "Transcript",
+                    "Consequence": consequence,
+                    "STRAND": "1",
+                    "SYMBOL": gene,
+                    "SYMBOL_SOURCE": "HGNC",
+                    "SIFT": "deleterious" if rng.random() < 0.3 else "tolerated",
+                    "PolyPhen": "benign" if rng.random() < 0.6 else "probably_damaging",
+                }
+            )
+            annotations.append("|".join(fields[field] for field in CSQ_FIELDS))
+    return ",".join(annotations)
+
+
+def generate_regions(rng, nr_variants, intergenic_fraction=0.5, overlap_rate=0.05, skew=1.2):
+    """Generate the features of the variants along the genome
+
+    Args:
+        rng (Random): The random generator
+        nr_variants (int): The number of variants
+        intergenic_fraction (float): The fraction of variants outside of genes
+        overlap_rate (float): How often a gene overlaps the next gene
+        skew (float): The skew of the gene sizes, see get_gene_size
+
+    Yields:
+        genes (list): The genes of each variant, empty if intergenic
+    """
+    nr_genes = 0
+    overlapping = None
+    nr_yielded = 0
+    while nr_yielded < nr_variants:
+        if overlapping is None and rng.random() < intergenic_fraction:
+            # A stretch of variants outside of genes
+            for _ in range(min(get_gene_size(rng, skew), nr_variants - nr_yielded)):
+                yield []
+                nr_yielded += 1
+            continue
+
+        nr_genes += 1
+        gene = "GENE{0}".format(nr_genes)
+        for _ in range(min(get_gene_size(rng, skew), nr_variants - nr_yielded)):
+            yield [overlapping, gene] if overlapping else [gene]
+            nr_yielded += 1
+        overlapping = gene if rng.random() < overlap_rate else None
+
+
+def generate_variant_lines(
+    nr_variants,
+    family_types,
+    seed=1,
+    vep=False,
+    nr_transcripts=3,
+    sv_fraction=0.01,
+    intergenic_fraction=0.5,
+    skew=1.2,
+):
+    """Generate synthetic vcf variant lines
+
+    Args:
+        nr_variants (int): The number of variants
+        family_types (list): The family types of the samples, see get_ped_lines
+        seed (int): The seed of the random generator
+        vep (bool): If a vep CSQ field should be added
+        nr_transcripts (int): The number of CSQ annotations of each gene
+        sv_fraction (float): The fraction of structural variants
+        intergenic_fraction (float): The fraction of variants outside of genes
+        skew (float): The skew of the gene sizes, see get_gene_size
+
+    Yields:
+        variant_line (str): A vcf variant line without newline
+    """
+    rng = random.Random(seed)
+    total_size = sum(size for _, size in CHROMOSOMES)
+    regions = generate_regions(rng, nr_variants, intergenic_fraction, skew=skew)
+
+    nr_left = nr_variants
+    for chrom_number, (chrom, size) in enumerate(CHROMOSOMES):
+        if chrom_number == len(CHROMOSOMES) - 1:
+            nr_chrom_variants = nr_left
+        else:
+            nr_chrom_variants = min(nr_left, round(nr_variants * size / total_size))
+        nr_left -= nr_chrom_variants
+        # The mean distance between variants to fill the chromosome
+        spacing = max(2, size * 1000000 // max(nr_chrom_variants, 1))
+        position = rng.randint(10000, 20000)
+
+        for _ in range(nr_chrom_variants):
+            genes = next(regions)
+            position += rng.randint(1, 2 * spacing - 1)
+            ref = rng.choice(NUCLEOTIDES)
+            alt = rng.choice(NUCLEOTIDES.replace(ref, ""))
+
+            info = [
+                "DP={0}".format(rng.randint(20, 600)),
+                "MQ={0}".format(rng.choice(["60", "59.8", "57.2"])),
+            ]
+            allele_frequency = rng.choice([0.0005, 0.003, 0.01, 0.05, 0.3])
+            if rng.random() < 0.8:
+                info.append("1000GAF={0}".format(allele_frequency))
+            if rng.random() < 0.5:
+                info.append("EXACAF={0}".format(allele_frequency))
+            if rng.random() < 0.9:
+                info.append("CADD={0:.2f}".format(rng.uniform(0, 40)))
+            if rng.random() < 0.02:
+                info.append("CLNSIG={0}".format(rng.choice(["2", "3", "4", "5"])))
+
+            if rng.random() < sv_fraction:
+                svtype = rng.choice(["DEL", "DUP"])
+                length = rng.randint(50, 20000)
+                alt = "<{0}>".format(svtype)
+                info.extend(
+                    [
+                        "SVTYPE={0}".format(svtype),
+                        "END={0}".format(position + length),
+                        "SVLEN={0}".format(-length if svtype == "DEL" else length),
+                    ]
+                )
+
+            if genes:
+                info.append("Annotation={0}".format(",".join(genes)))
+                consequence = rng.choice([term for term, _ in CONSEQUENCES])
+                info.append(
+                    "MostSevereConsequence={0}".format(
+                        ",".join("{0}:{1}".format(gene, consequence) for gene in genes)
+                    )
+                )
+            if vep:
+                info.append("CSQ={0}".format(get_csq(rng, alt, genes, nr_transcripts)))
+
+            columns = [chrom, str(position), ".", ref, alt, "100", "PASS", ";".join(info)]
+            columns.append("GT:AD:DP:GQ:PL")
+            for family_type in family_types:
+                for alleles in get_family_genotypes(rng, family_type, allele_frequency):
+                    columns.append(get_sample_column(rng, alleles))
+
+            yield "\t".join(columns)
+
+
+def write_synthetic_files(vcf_path, ped_path, nr_variants, family_types, **kwargs):
+    """Write a synthetic vcf and the ped file of its families
+
+    Args:
+        vcf_path (str): Path to the vcf
+        ped_path (str): Path to the ped file
+        nr_variants (int): The number of variants
+        family_types (list): The family types of the samples, see get_ped_lines
+        **kwargs: The arguments for generate_variant_lines
+    """
+    ped_lines = get_ped_lines(family_types)
+    samples = [line.split("\t")[1] for line in ped_lines[1:]]
+    logger.info(
+        "Writing {0} variants for {1} samples to {2}".format(nr_variants, len(samples), vcf_path)
+    )
+
+    with open(ped_path, "w") as ped_file:
+        for line in ped_lines:
+            print(line, file=ped_file)
+
+    with open(vcf_path, "w") as vcf_file:
+        for line in HEADER_LINES:
+            print(line, file=vcf_file)
+        if kwargs.get("vep"):
+            print(CSQ_HEADER_LINE, file=vcf_file)
+        print(
+            "\t".join(
+                ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"] + samples
+            ),
+            file=vcf_file,
+        )
+        for line in generate_variant_lines(nr_variants, family_types, **kwargs):
+            print(line, file=vcf_file)
@@ -4,6 +4,7 @@ from .annotate_models import models as models_command
 from .annotate_variant import annotate as annotate_variant_command
 from .filter_variants import filter as filter_command
 from .genmod_sort import sort as sort_command
+from .pipeline import pipeline as pipeline_command
 from .score_compounds import compound as score_compounds_command
 from .score_variants import score as score_command
 
@@ -12,6 +13,7 @@ __all__ = [
     "annotate_variant_command",
     "filter_command",
     "sort_command",
+    "pipeline_command",
     "score_compounds_command",
     "score_command",
 ]
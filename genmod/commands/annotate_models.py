@@ -16,28 +16,55 @@ from __future__ import print_function
 import inspect
 import itertools
 import logging
-import os
 import sys
-from codecs import open
 from datetime import datetime
-from multiprocessing import JoinableQueue, Manager, cpu_count, util
-from tempfile import NamedTemporaryFile
+from multiprocessing import JoinableQueue, Queue, cpu_count, util
+from queue import Empty
 
 import click
 from ped_parser import FamilyParser
 
 from genmod import __version__
-from genmod.annotate_models.variant_annotator import VariantAnnotator
-from genmod.utils import VariantPrinter, check_individuals, get_batches
-from genmod.vcf_tools import HeaderParser, add_metadata, print_headers, print_variant, sort_variants
+from genmod.annotate_models.family_shards import FamilyShardPrinter, split_families
+from genmod.annotate_models.genotype_matrix import check_numpy
+from genmod.annotate_models.variant_annotator import (
+    FamilyShardAnnotator,
+    ShardAnnotator,
+    VariantAnnotator,
+)
+from genmod.memory_report import memory_checkpoint
+from genmod.metrics import get_metrics
+from genmod.utils import (
+    BatchPrinter,
+    BatchTracer,
+    ShardPrinter,
+    check_indexed,
+    check_individuals,
+    coalesce_batches,
+    format_batch_traces,
+    generate_batches,
+    get_contig_lengths,
+    get_index_contigs,
+    get_result,
+    get_shards,
+    make_task,
+    split_batch,
+)
+from genmod.utils.region_shards import SHARD_SIZE
+from genmod.vcf_tools import HeaderParser, add_metadata, print_headers
 
 from .utils import (
     family_file,
     family_type,
     get_file_handle,
+    get_output_handle,
+    index_format,
+    memory_budget,
     outfile,
+    output_format,
     processes,
     silent,
+    slow_batches,
     temp_dir,
     variant_file,
 )
@@ -46,6 +73,102 @@ logger = logging.getLogger(__name__)
 util.abstract_sockets_supported = False
 
 
+def get_reduced_penetrance_genes(reduced_penetrance):
+    """Get the gene ids from a file with genes that have reduced penetrance
+
+    Args:
+        reduced_penetrance (iterable): The lines of a tsv file with gene ids
+                                       in the first column
+
+    Returns:
+        reduced_penetrance_genes (set): The gene ids
+    """
+    reduced_penetrance_genes = set()
+    nr_reduced_penetrance_genes = 0
+    logger.info("Found file with genes that have reduced penetrance")
+    for line in reduced_penetrance:
+        if not line.startswith("#"):
+            nr_reduced_penetrance_genes += 1
+            gene_id = line.rstrip().split()[0]
+            logger.debug("Adding gene {0} to reduced penetrance genes".format(gene_id))
+            reduced_penetrance_genes.add(gene_id)
+
+    logger.info("Found {0} genes with reduced penetrance".format(nr_reduced_penetrance_genes))
+    return reduced_penetrance_genes
+
+
+def get_affected_families(family_parser):
+    """Get the families that have at least one affected individual
+
+    Args:
+        family_parser (FamilyParser): A parsed family file
+
+    Returns:
+        families (dict): Family ids as keys and family objects as values
+    """
+    families = {}
+    logger.info("Check if the familys have any affected")
+    for family_id in family_parser.families:
+        found_affected = False
+        family_obj = family_parser.families[family_id]
+        for ind_id in family_obj.individuals:
+            ind_obj = family_obj.individuals[ind_id]
+            if ind_obj.affected:
+                found_affected = True
+
+        if found_affected:
+            families[family_id] = family_obj
+        else:
+            logger.warning(
+                "No affected individuals found for family {0}. Skipping family.".format(family_id)
+            )
+    return families
+
+
+def add_models_header(head):
+    """Add the fields of the genetic models annotation to the vcf header
+
+    Args:
+        head (HeaderParser): A HeaderParser object
+    """
+    logger.info("Adding genetic models to vcf header")
+    add_metadata(
+        head,
+        "info",
+        "GeneticModels",
+        annotation_number=".",
+        entry_type="String",
+        description="':'-separated list of genetic models for this variant.",
+    )
+
+    logger.debug("Genetic models added")
+    logger.info("Adding model score to vcf header")
+    add_metadata(
+        head,
+        "info",
+        "ModelScore",
+        annotation_number=".",
+        entry_type="String",
+        description="PHRED score for genotype models.",
+    )
+    logger.debug("Model score added")
+
+    logger.info("Adding Compounds to vcf header")
+    add_metadata(
+        head,
+        "info",
+        "Compounds",
+        annotation_number=".",
+        entry_type="String",
+        description=(
+            "List of compound pairs for this variant."
+            "The list is splitted on ',' family id is separated with compounds"
+            "with ':'. Compounds are separated with '|'."
+        ),
+    )
+    logger.debug("Compounds added")
+
+
 @click.command("models", short_help="Annotate inheritance")
 @variant_file
 @family_file
@@ -84,7 +207,47 @@ util.abstract_sockets_supported = False
     help="""What annotation keyword that should be used when
                     searching for features.""",
 )
+@click.option(
+    "--region_shards",
+    "--region-shards",
+    is_flag=True,
+    help="""If the vcf is bgzipped and tabix indexed, split it in regions
+                    that each process reads by itself.""",
+)
+@click.option(
+    "--shard_size",
+    "--shard-size",
+    default=SHARD_SIZE,
+    show_default=True,
+    help="Size in bases of the regions used with --region-shards.",
+)
+@click.option(
+    "--family_shards",
+    "--family-shards",
+    is_flag=True,
+    help="""Split the families between the processes. Each process gets all
+                    batches and checks the models of its own families.""",
+)
+@click.option(
+    "--max_batch_size",
+    "--max-batch-size",
+    type=click.IntRange(min=1),
+    help="""Split batches with more variants than this in sub batches, with
+                    the variants of the same features as context.""",
+)
+@click.option(
+    "--engine",
+    type=click.Choice(["python", "numpy"]),
+    default="python",
+    show_default=True,
+    help="""How the genetic models are checked. 'numpy' checks a whole batch with
+                    array operations and needs numpy to be installed.""",
+)
+@memory_budget
+@slow_batches
 @outfile
+@output_format
+@index_format
 @temp_dir
 @click.pass_context
 def models(
@@ -102,6 +265,15 @@ def models(
     outfile,
     temp_dir,
     whole_gene,
+    region_shards,
+    shard_size,
+    output_format,
+    index_format,
+    engine,
+    max_batch_size,
+    family_shards,
+    memory_budget,
+    slow_batches,
 ):
     """
     Annotate genetic models for vcf variants.
@@ -111,6 +283,17 @@ def models(
     file and exists in the variant file will get it's own annotation.
 
     Note that the "whole_gene" flag has been disabled and will be removed in a later version.
+    The "temp_dir" option is not used since variants are printed in order without a temp file.
+
+    With --region-shards a bgzipped and tabix indexed vcf is split in regions
+    that never cut through the features of a batch. Each process reads its
+    own regions from the file.
+
+    With --max-batch-size the batches of overlapping features are split in
+    sub batches, that hold the other variants of their features as context.
+
+    With --family-shards the families of a cohort are split between the
+    processes, the annotations of all families are merged before printing.
     """
 
     ######### This is for logging the command line string #########
@@ -118,49 +301,31 @@ def models(
     args, _, _, values = inspect.getargvalues(frame)
     argument_list = [i + "=" + str(values[i]) for i in values if values[i] and i not in ["frame"]]
 
+    variant_path = variant_file
     variant_file = get_file_handle(variant_file)
+    outfile = get_output_handle(outfile, output_format, index_format, silent)
     ###########################################################################
 
     logger.info("Running GENMOD annotate models version {0}".format(__version__))
     logger.debug("Arguments: {0}".format(", ".join(argument_list)))
 
     reduced_penetrance_genes = set()
-    nr_reduced_penetrance_genes = 0
     if reduced_penetrance:
-        logger.info("Found file with genes that have reduced penetrance")
-        for line in reduced_penetrance:
-            if not line.startswith("#"):
-                nr_reduced_penetrance_genes += 1
-                gene_id = line.rstrip().split()[0]
-                logger.debug("Adding gene {0} to reduced penetrance genes".format(gene_id))
-                reduced_penetrance_genes.add(gene_id)
-
-        logger.info("Found {0} genes with reduced penetrance".format(nr_reduced_penetrance_genes))
+        reduced_penetrance_genes = get_reduced_penetrance_genes(reduced_penetrance)
 
     if not family_file:
         logger.warning("Please provide a family file with -f/--family_file")
         context.abort()
 
+    if engine == "numpy" and not check_numpy():
+        logger.warning("--engine numpy needs numpy, install it with 'pip install genmod[numpy]'")
+        context.abort()
+
     logger.info("Setting up a family parser")
     family_parser = FamilyParser(family_file, family_type)
     logger.debug("Family parser done")
 
-    families = {}
-    logger.info("Check if the familys have any affected")
-    for family_id in family_parser.families:
-        found_affected = False
-        family_obj = family_parser.families[family_id]
-        for ind_id in family_obj.individuals:
-            ind_obj = family_obj.individuals[ind_id]
-            if ind_obj.affected:
-                found_affected = True
-
-        if found_affected:
-            families[family_id] = family_obj
-        else:
-            logger.warning(
-                "No affected individuals found for family {0}. Skipping family.".format(family_id)
-            )
+    families = get_affected_families(family_parser)
 
     if not families:
         logger.warning("Please provide at least one family with affected individuals")
@@ -172,6 +337,7 @@ def models(
             ",".join(list(family_parser.individuals.keys()))
         )
     )
+    memory_checkpoint("resources")
 
     head = HeaderParser()
 
@@ -184,6 +350,7 @@ def models(
                 head.parse_header_line(line)
         else:
             break
+    memory_checkpoint("header")
 
     # Check before adding models info to header
     if "GeneticModels" in head.info_dict:
@@ -199,42 +366,7 @@ def models(
     )
 
     logger.debug("Version added")
-    logger.info("Adding genetic models to vcf header")
-    add_metadata(
-        head,
-        "info",
-        "GeneticModels",
-        annotation_number=".",
-        entry_type="String",
-        description="':'-separated list of genetic models for this variant.",
-    )
-
-    logger.debug("Genetic models added")
-    logger.info("Adding model score to vcf header")
-    add_metadata(
-        head,
-        "info",
-        "ModelScore",
-        annotation_number=".",
-        entry_type="String",
-        description="PHRED score for genotype models.",
-    )
-    logger.debug("Model score added")
-
-    logger.info("Adding Compounds to vcf header")
-    add_metadata(
-        head,
-        "info",
-        "Compounds",
-        annotation_number=".",
-        entry_type="String",
-        description=(
-            "List of compound pairs for this variant."
-            "The list is splitted on ',' family id is separated with compounds"
-            "with ':'. Compounds are separated with '|'."
-        ),
-    )
-    logger.debug("Compounds added")
+    add_models_header(head)
 
     # Add the first variant to the iterator
     if not line.startswith("#"):
@@ -258,6 +390,14 @@ def models(
         else:
             logger.info("Using {0} annotation".format(keyword))
 
+    if region_shards and not check_indexed(variant_path):
+        logger.warning("--region-shards needs a bgzipped vcf with a tabix index")
+        context.abort()
+
+    if region_shards and family_shards:
+        logger.warning("--region-shards can not be used with --family-shards")
+        context.abort()
+
     vcf_individuals = head.individuals
     logger.debug("Individuals found in vcf file: {}".format(", ".join(vcf_individuals)))
 
@@ -271,6 +411,7 @@ def models(
         context.abort()
 
     start_time_analysis = datetime.now()
+    metrics = get_metrics()
 
     analysis_individuals = list(family_parser.individuals.keys())
 
@@ -286,103 +427,199 @@ def models(
     # One batch consists of all variants from one or several overlapping genes
     # there can be a significant amount of variants in a batch for whole genome
     # data...
+    # The batches are sent as blocks of raw variant lines and the workers send
+    # back blocks with the new INFO fields, see genmod/utils/line_batches.py
     variant_queue = JoinableQueue(maxsize=100)
+    # With family shards each worker has its own queue that gets all batches
+    task_queues = [variant_queue]
     logger.debug("Setting up a Queue for storing results from workers")
-    results = Manager().Queue()
+    results = Queue()
 
     num_model_checkers = processes
     # Adapt the number of processes to the machine that run the analysis
     logger.info("Number of CPU:s {}".format(cpu_count()))
     logger.info("Number of model checkers: {}".format(num_model_checkers))
 
+    annotator_arguments = dict(
+        families=families,
+        individuals=analysis_individuals,
+        annotation_keyword=keyword,
+        phased=phased,
+        strict=strict,
+        vep=vep,
+        reduced_penetrance_genes=reduced_penetrance_genes,
+        engine=engine,
+    )
+    # Each worker keeps the slowest of its batches and sends them back at the end
+    batch_tracer = None
+    if slow_batches:
+        batch_tracer = BatchTracer(slow_batches, Queue())
+        annotator_arguments["batch_tracer"] = batch_tracer
+
     # These are the workers that do the heavy part of the analysis
     logger.info("Seting up the workers")
+    model_checkers = []
     try:
-        model_checkers = [
-            VariantAnnotator(
-                task_queue=variant_queue,
-                results_queue=results,
-                families=families,
-                individuals=analysis_individuals,
-                phased=phased,
-                strict=strict,
-                vep=vep,
-                reduced_penetrance_genes=reduced_penetrance_genes,
+        if region_shards:
+            shards = get_shards(
+                contigs=get_index_contigs(variant_path + ".tbi"),
+                contig_lengths=get_contig_lengths(head),
+                shard_size=shard_size,
             )
-            for i in range(num_model_checkers)
-        ]
+            logger.info("Split the variant file in {0} region shards".format(len(shards)))
+            model_checkers = [
+                ShardAnnotator(
+                    task_queue=variant_queue,
+                    results_queue=results,
+                    variant_file=variant_path,
+                    head=head,
+                    max_batch_size=max_batch_size,
+                    **annotator_arguments,
+                )
+                for i in range(num_model_checkers)
+            ]
+        elif family_shards:
+            family_groups = split_families(families, num_model_checkers)
+            logger.info("Split the families in {0} family shards".format(len(family_groups)))
+            task_queues = [JoinableQueue(maxsize=100) for _ in family_groups]
+            model_checkers = []
+            for shard_number, shard_families in enumerate(family_groups):
+                shard_arguments = dict(annotator_arguments, families=shard_families)
+                shard_arguments["individuals"] = [
+                    individual_id
+                    for family in shard_families.values()
+                    for individual_id in family.individuals
+                ]
+                model_checkers.append(
+                    FamilyShardAnnotator(
+                        task_queue=task_queues[shard_number],
+                        results_queue=results,
+                        shard_number=shard_number,
+                        header_line=head.header,
+                        vep_header=head.vep_columns,
+                        **shard_arguments,
+                    )
+                )
+        else:
+            model_checkers = [
+                VariantAnnotator(
+                    task_queue=variant_queue,
+                    results_queue=results,
+                    header_line=head.header,
+                    vep_header=head.vep_columns,
+                    **annotator_arguments,
+                )
+                for i in range(num_model_checkers)
+            ]
         logger.info("Starting the workers")
         for worker in model_checkers:
             logger.debug("Starting worker {0}".format(worker))
             worker.start()
 
-        # This process prints the variants to temporary files
-        logger.info("Seting up the variant printer")
-        if len(model_checkers) == 1:
-            print_headers(head=head, outfile=outfile, silent=silent)
-            if hasattr(outfile, "name"):
-                outfile_name = outfile.name
-                outfile.close()
-            else:
-                outfile_name = outfile
-            variant_printer = VariantPrinter(
-                task_queue=results, head=head, mode="normal", outfile=outfile_name
-            )
-        else:
-            # We use a temp file to store the processed variants
-            logger.debug("Build a tempfile for printing the variants")
-            if temp_dir:
-                temp_file = NamedTemporaryFile(delete=False, dir=temp_dir)
-            else:
-                temp_file = NamedTemporaryFile(delete=False)
-            temp_file.close()
-
-            variant_printer = VariantPrinter(
-                task_queue=results, head=head, mode="chromosome", outfile=temp_file.name
-            )
-
-        logger.info("Starting the variant printer process")
-        variant_printer.start()
-
-        # This process parses the original vcf and create batches to put in the variant queue:
-        logger.info("Start parsing the variants")
-        get_batches(
-            variants=variant_file,
-            batch_queue=variant_queue,
-            header=head,
-            vep=vep,
-            annotation_keyword=keyword,
-        )
-
-        logger.debug("Put stop signs in the variant queue")
-        for i in range(num_model_checkers):
-            variant_queue.put(None)
+        print_headers(head=head, outfile=outfile, silent=silent)
 
-        variant_queue.join()
-        results.put(None)
-        variant_printer.join()
+        if region_shards:
+            # The workers read the shards themselves, the shards are printed
+            # in the order of the file
+            shard_printer = ShardPrinter(nr_of_shards=len(shards), outfile=outfile, silent=silent)
+            for shard_number, shard in enumerate(shards):
+                variant_queue.put((shard_number,) + shard)
 
-        if len(model_checkers) > 1:
-            sort_variants(infile=temp_file.name, mode="chromosome")
+            logger.debug("Put stop signs in the variant queue")
+            for i in range(num_model_checkers):
+                variant_queue.put(None)
 
-            print_headers(head=head, outfile=outfile, silent=silent)
+            while shard_printer.nr_waiting:
+                with metrics.timer("result_wait"):
+                    result = get_result(results, model_checkers)
+                with metrics.timer("print"):
+                    shard_printer.add_result(*result)
 
-            with open(temp_file.name, "r", encoding="utf-8") as f:
-                for line in f:
-                    print_variant(
-                        variant_line=line, outfile=outfile, mode="modified", silent=silent
+        else:
+            # Batches can be finished in any order, the printer holds them until
+            # they can be printed in the same order as they were read
+            batch_printer = BatchPrinter(
+                outfile=outfile, silent=silent, memory_budget=memory_budget
+            )
+            if family_shards:
+                batch_printer = FamilyShardPrinter(batch_printer, len(task_queues))
+
+            # The main process parses the original vcf and create batches to put in the variant
+            # queue. Results are printed as they arrive so that they do not pile up.
+            # The batches with one variant are sent in chunks, see coalesce_batches.
+            logger.info("Start parsing the variants")
+            batches = generate_batches(
+                variants=variant_file,
+                header=head,
+                vep=vep,
+                annotation_keyword=keyword,
+                raw=True,
+            )
+            for batch, singletons in metrics.iterate("read", coalesce_batches(batches)):
+                if singletons:
+                    sub_batches = [(batch, None, None)]
+                else:
+                    sub_batches = split_batch(
+                        batch=batch,
+                        max_batch_size=max_batch_size,
+                        annotation_keyword=keyword,
+                        vep=vep,
+                        vep_header=head.vep_columns,
+                    )
+                for lines, context_before, context_after in sub_batches:
+                    batch_number = batch_printer.add_batch(lines)
+                    metrics.add_batch(len(lines))
+                    task = make_task(batch_number, lines, context_before, context_after, singletons)
+                    with metrics.timer("put_wait"):
+                        for task_queue in task_queues:
+                            task_queue.put(task)
+                    metrics.sample(
+                        nr_printed=batch_printer.nr_printed,
+                        variant_queue=variant_queue,
+                        results=results,
                     )
+                    with metrics.timer("print"):
+                        while True:
+                            try:
+                                batch_printer.add_result(*results.get_nowait())
+                            except Empty:
+                                break
+                    # Wait for the results to be printed before more batches are sent
+                    while batch_printer.is_full:
+                        with metrics.timer("budget_wait"):
+                            result = get_result(results, model_checkers)
+                        with metrics.timer("print"):
+                            batch_printer.add_result(*result)
+            memory_checkpoint("batching")
+
+            logger.debug("Put stop signs in the variant queue")
+            for worker in model_checkers:
+                worker.task_queue.put(None)
+
+            while batch_printer.nr_waiting:
+                with metrics.timer("result_wait"):
+                    result = get_result(results, model_checkers)
+                with metrics.timer("print"):
+                    batch_printer.add_result(*result)
+                metrics.sample(
+                    nr_printed=batch_printer.nr_printed,
+                    variant_queue=variant_queue,
+                    results=results,
+                )
+            metrics.sample(nr_printed=batch_printer.nr_printed, force=True)
+
+        for task_queue in task_queues:
+            task_queue.join()
+        memory_checkpoint("printing")
+
+        if batch_tracer is not None:
+            slow_traces = batch_tracer.collect(len(model_checkers))
+            click.echo("\n".join(format_batch_traces(slow_traces)), err=True)
 
     except Exception as err:
         logger.warning(err)
         for worker in model_checkers:
             worker.terminate()
-        variant_printer.terminate()
         context.abort()
-    finally:
-        if len(model_checkers) > 1:
-            logger.info("Removing temp file")
-            os.remove(temp_file.name)
-            logger.debug("Temp file removed")
 
     logger.info("Time for whole analyis: {0}".format(str(datetime.now() - start_time_analysis)))
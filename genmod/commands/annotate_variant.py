@@ -34,12 +34,122 @@ from genmod.annotate_variants.add_annotations import (
 from genmod.annotate_variants.annotate import annotate_variant
 from genmod.annotate_variants.read_tabix_files import get_tabixhandle
 from genmod.annotations import ensembl_path_37, ensembl_path_38
-from genmod.commands.utils import get_file_handle, outfile, silent, temp_dir, variant_file
+from genmod.commands.utils import (
+    get_file_handle,
+    get_output_handle,
+    index_format,
+    outfile,
+    output_format,
+    silent,
+    temp_dir,
+    variant_file,
+)
+from genmod.memory_report import memory_checkpoint
 from genmod.vcf_tools import HeaderParser, print_headers, print_variant
 
 logger = logging.getLogger(__name__)
 
 
+def get_region_file(genome_build="37"):
+    """Get the path to the ensembl genes that come with genmod
+
+    Args:
+        genome_build (str): '37' or '38'
+
+    Returns:
+        region_file (str): The path to the region file
+    """
+    if genome_build == "38":
+        return str(ensembl_path_38)
+    return str(ensembl_path_37)
+
+
+def get_annotation_arguments(
+    head,
+    regions=False,
+    region_file=None,
+    cadd_files=None,
+    thousand_g=None,
+    exac=None,
+    spidex=None,
+    cosmic=None,
+    max_af=False,
+    cadd_raw=False,
+):
+    """Open the annotation sources and add their fields to the vcf header
+
+    Raises TabixError if a source can not be opened.
+
+    Args:
+        head (HeaderParser): A HeaderParser object
+        regions (bool): If the variants should be annotated with regions
+        region_file (str): Path to a bed file with regions
+        cadd_files (list): Paths to bgzipped cadd files
+        thousand_g (str): Path to a bgzipped vcf with 1000g variants
+        exac (str): Path to a bgzipped vcf with exac variants
+        spidex (str): Path to a bgzipped tsv with spidex information
+        cosmic (str): Path to a bgzipped vcf with COSMIC variants
+        max_af (bool): If the MAX AF should be annotated
+        cadd_raw (bool): If the raw cadd scores should be annotated
+
+    Returns:
+        annotation_arguments (dict): The arguments for annotate_variant
+    """
+    annotation_arguments = {"header_line": head.header}
+
+    if regions:
+        logger.info("Loading annotations")
+        logger.info("Use annotations file: {0}".format(region_file))
+        add_regions(head)
+        regions_handle = get_file_handle(region_file)
+        logger.debug("Adding region trees to arguments")
+        annotation_arguments["region_trees"] = build_region_trees(regions_handle, padding=4000)
+
+    if exac:
+        logger.info("Annotating ExAC frequencies")
+        logger.debug("Using ExAC file: {0}".format(exac))
+        annotation_arguments["exac"] = get_tabixhandle(exac)
+        add_exac(head)
+
+    if thousand_g:
+        logger.info("Annotating 1000G frequencies")
+        logger.debug("Using 1000G file: {0}".format(thousand_g))
+        annotation_arguments["thousand_g"] = get_tabixhandle(thousand_g)
+        add_thousandg(head)
+
+    if spidex:
+        logger.info("Annotating Spidex z scores")
+        logger.debug("Using Spidex file: {0}".format(spidex))
+        annotation_arguments["spidex"] = get_tabixhandle(spidex)
+        add_spidex(head)
+
+    if cadd_files:
+        logger.info("Annotating CADD scores")
+        logger.debug("Using CADD file(s): {0}".format(", ".join(cadd_files)))
+        annotation_arguments["cadd_files"] = [get_tabixhandle(cadd) for cadd in cadd_files]
+
+        add_cadd(head)
+
+        if cadd_raw:
+            annotation_arguments["cadd_raw"] = cadd_raw
+            add_cadd_raw(head)
+
+    if max_af:
+        annotation_arguments["max_af"] = max_af
+        if thousand_g:
+            add_thousandg_max(head)
+        if exac:
+            add_exac_max(head)
+
+    if cosmic:
+        logger.info("Annotating if variant is in COSMIC")
+        logger.debug("Using COSMIC file: {0}".format(cosmic))
+        annotation_arguments["cosmic"] = get_tabixhandle(cosmic)
+        add_cosmic(head)
+
+    return annotation_arguments
+
+
 @click.command("annotate", short_help="Annotate vcf variants")
 @variant_file
 @click.option(
@@ -101,6 +211,8 @@ logger = logging.getLogger(__name__)
     "--cadd-raw", "--cadd_raw", is_flag=True, help="""If the raw cadd scores should be annotated."""
 )
 @outfile
+@output_format
+@index_format
 @silent
 @temp_dir
 @click.pass_context
@@ -120,6 +232,8 @@ def annotate(
     max_af,
     temp_dir,
     genome_build,
+    output_format,
+    index_format,
 ):
     """
     Annotate vcf variants.
@@ -131,14 +245,10 @@ def annotate(
     logger.info("Running genmod annotate_variant version {0}".format(__version__))
 
     if not region_file:
-        if genome_build == "37":
-            region_file = str(ensembl_path_37)
-        elif genome_build == "38":
-            region_file = str(ensembl_path_38)
-
-    annotation_arguments = {}
+        region_file = get_region_file(genome_build)
 
     variants = get_file_handle(variant_file)
+    outfile = get_output_handle(outfile, output_format, index_format, silent)
 
     logger.info("Initializing a Header Parser")
     head = HeaderParser()
@@ -154,6 +264,7 @@ def annotate(
                 head.parse_header_line(line)
         else:
             break
+    memory_checkpoint("header")
 
     # Add the first variant back to the iterator
     # If the vcf has no variants the last line will be a header
@@ -163,62 +274,23 @@ def annotate(
         print_headers(head, outfile, silent)
         sys.exit(0)
 
-    header_line = head.header
-    annotation_arguments["header_line"] = header_line
-
     try:
-        if regions:
-            logger.info("Loading annotations")
-            logger.info("Use annotations file: {0}".format(region_file))
-            add_regions(head)
-            regions_handle = get_file_handle(region_file)
-            logger.debug("Adding region trees to arguments")
-            annotation_arguments["region_trees"] = build_region_trees(regions_handle, padding=4000)
-
-        if exac:
-            logger.info("Annotating ExAC frequencies")
-            logger.debug("Using ExAC file: {0}".format(exac))
-            annotation_arguments["exac"] = get_tabixhandle(exac)
-            add_exac(head)
-
-        if thousand_g:
-            logger.info("Annotating 1000G frequencies")
-            logger.debug("Using 1000G file: {0}".format(thousand_g))
-            annotation_arguments["thousand_g"] = get_tabixhandle(thousand_g)
-            add_thousandg(head)
-
-        if spidex:
-            logger.info("Annotating Spidex z scores")
-            logger.debug("Using Spidex file: {0}".format(spidex))
-            annotation_arguments["spidex"] = get_tabixhandle(spidex)
-            add_spidex(head)
-
-        if cadd_file:
-            logger.info("Annotating CADD scores")
-            logger.debug("Using CADD file(s): {0}".format(", ".join(cadd_file)))
-            annotation_arguments["cadd_files"] = [get_tabixhandle(cadd) for cadd in cadd_file]
-
-            add_cadd(head)
-
-            if cadd_raw:
-                annotation_arguments["cadd_raw"] = cadd_raw
-                add_cadd_raw(head)
-
-        if max_af:
-            annotation_arguments["max_af"] = max_af
-            if thousand_g:
-                add_thousandg_max(head)
-            if exac:
-                add_exac_max(head)
-
-        if cosmic:
-            logger.info("Annotating if variant is in COSMIC")
-            logger.debug("Using COSMIC file: {0}".format(cosmic))
-            annotation_arguments["cosmic"] = get_tabixhandle(cosmic)
-            add_cosmic(head)
+        annotation_arguments = get_annotation_arguments(
+            head=head,
+            regions=regions,
+            region_file=region_file,
+            cadd_files=cadd_file,
+            thousand_g=thousand_g,
+            exac=exac,
+            spidex=spidex,
+            cosmic=cosmic,
+            max_af=max_af,
+            cadd_raw=cadd_raw,
+        )
     except TabixError as err:
         logger.warning(err)
         context.abort()
+    memory_checkpoint("resources")
 
     print_headers(head, outfile, silent)
 
@@ -228,3 +300,4 @@ def annotate(
             outfile=outfile,
             silent=silent,
         )
+    memory_checkpoint("printing")
@@ -20,6 +20,7 @@ from . import (
     annotate_variant_command,
     filter_command,
     models_command,
+    pipeline_command,
     score_command,
     score_compounds_command,
     sort_command,
@@ -59,8 +60,29 @@ def print_version(ctx, param, value):
     default=0,
     help="Increase output verbosity. Can be used multiple times, eg. -vv",
 )
+@click.option(
+    "--profile",
+    type=click.Path(file_okay=False),
+    help="""Profile the main process and every worker process. The pstats files
+                    of each process and a merged summary are written to this directory.""",
+)
+@click.option(
+    "--memory_report",
+    "--memory-report",
+    type=click.Path(file_okay=False),
+    help="""Trace the memory of the main process and every worker process at the
+                    end of each stage. A json report for each process and a summary with the
+                    peak memory and the top allocation sites are written to this directory.""",
+)
+@click.option(
+    "--metrics_json",
+    "--metrics-json",
+    type=click.Path(dir_okay=False),
+    help="""Write the time of each stage, the batch sizes, the queue depths, the
+                    worker utilisation and the throughput of the run to this json file.""",
+)
 @click.pass_context
-def cli(context, logfile, verbose):
+def cli(context, logfile, verbose, profile, memory_report, metrics_json):
     """Tool for annotating and analyzing genetic variants in the vcf format.\n
     For more information, please run:
     genmod COMMAND --help \n
@@ -72,6 +94,24 @@ def cli(context, logfile, verbose):
 
     init_log(logger, logfile, loglevel)
 
+    if profile:
+        from genmod.profiling import start_profiling, stop_profiling
+
+        profiler = start_profiling(profile)
+        context.call_on_close(lambda: stop_profiling(profiler, profile))
+
+    if memory_report:
+        from genmod.memory_report import start_memory_report, stop_memory_report
+
+        start_memory_report(memory_report)
+        context.call_on_close(lambda: stop_memory_report(memory_report))
+
+    if metrics_json:
+        from genmod.metrics import start_metrics, stop_metrics
+
+        metrics = start_metrics(context.invoked_subcommand)
+        context.call_on_close(lambda: stop_metrics(metrics, metrics_json))
+
 
 cli.add_command(sort_command)
 cli.add_command(models_command)
@@ -79,6 +119,7 @@ cli.add_command(score_command)
 cli.add_command(score_compounds_command)
 cli.add_command(annotate_variant_command)
 cli.add_command(filter_command)
+cli.add_command(pipeline_command)
 
 
 if __name__ == "__main__":
@@ -26,7 +26,15 @@ from genmod.vcf_tools import (
     print_variant,
 )
 
-from .utils import get_file_handle, outfile, silent, variant_file
+from .utils import (
+    get_file_handle,
+    get_output_handle,
+    index_format,
+    outfile,
+    output_format,
+    silent,
+    variant_file,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -56,7 +64,19 @@ logger = logging.getLogger(__name__)
 )
 @silent
 @outfile
-def filter(variant_file, annotation, threshold, discard, greater, silent, outfile):
+@output_format
+@index_format
+def filter(
+    variant_file,
+    annotation,
+    threshold,
+    discard,
+    greater,
+    silent,
+    outfile,
+    output_format,
+    index_format,
+):
     """
     Filter vcf variants.
 
@@ -64,6 +84,7 @@ def filter(variant_file, annotation, threshold, discard, greater, silent, outfil
     """
     logger.info("Running genmod filter version {0}".format(__version__))
     variant_file = get_file_handle(variant_file)
+    outfile = get_output_handle(outfile, output_format, index_format, silent)
 
     logger.info("Initializing a Header Parser")
     head = HeaderParser()
@@ -29,7 +29,16 @@ from genmod.vcf_tools import (
     sort_variants,
 )
 
-from .utils import get_file_handle, outfile, silent, temp_dir, variant_file
+from .utils import (
+    get_file_handle,
+    get_output_handle,
+    index_format,
+    outfile,
+    output_format,
+    silent,
+    temp_dir,
+    variant_file,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -37,16 +46,19 @@ logger = logging.getLogger(__name__)
 @click.command()
 @variant_file
 @outfile
+@output_format
+@index_format
 @click.option("-f", "--family_id", type=str, help="Specify the family id for sorting.")
 @silent
 @temp_dir
 @click.option("-p", "--position", is_flag=True, help="If variants should be sorted by position.")
-def sort(variant_file, outfile, family_id, silent, position, temp_dir):
+def sort(variant_file, outfile, output_format, index_format, family_id, silent, position, temp_dir):
     """
     Sort a VCF file based on rank score.
     """
     head = HeaderParser()
     variant_file = get_file_handle(variant_file)
+    outfile = get_output_handle(outfile, output_format, index_format, silent)
     logger.info("Running GENMOD sort version {0}".format(__version__))
     start = datetime.now()
     # Create a temporary variant file for sorting
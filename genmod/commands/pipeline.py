@@ -0,0 +1,479 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+pipeline.py
+
+Command line tool that runs annotate, models, score, compound and sort on a
+vcf in one pass.
+
+The stages that should run are the sections of a small config file:
+
+    keyword = Annotation
+    vep = False
+
+    [annotate]
+      regions = True
+    [models]
+      family_file = family.ped
+    [score]
+      score_config = rank_model.ini
+    [compound]
+    [sort]
+
+Each variant line is annotated in the main process and the batches of lines
+are sent to the workers, where each variant is parsed once and the stages run
+on the same variant dictionary. The variant line is only serialised again
+when it is printed.
+"""
+
+from __future__ import print_function
+
+import inspect
+import itertools
+import logging
+import os
+import sys
+from codecs import open
+from datetime import datetime
+from multiprocessing import JoinableQueue, Queue, cpu_count, util
+from queue import Empty
+from tempfile import NamedTemporaryFile
+
+import click
+import configobj
+from ped_parser import FamilyParser
+from tabix import TabixError
+from validate import ValidateError, Validator
+
+from genmod import __version__
+from genmod.annotate_models.genotype_matrix import check_numpy
+from genmod.annotate_models.variant_annotator import PipelineAnnotator
+from genmod.annotate_variants.annotate import annotate_variant
+from genmod.memory_report import memory_checkpoint
+from genmod.metrics import get_metrics
+from genmod.score_variants import ConfigParser, check_plugins, get_compound_models
+from genmod.utils import (
+    BatchPrinter,
+    check_individuals,
+    coalesce_batches,
+    generate_batches,
+    get_result,
+    make_task,
+)
+from genmod.vcf_tools import HeaderParser, print_headers, print_variant, sort_variants
+
+from .annotate_models import add_models_header, get_affected_families, get_reduced_penetrance_genes
+from .annotate_variant import get_annotation_arguments, get_region_file
+from .score_compounds import add_compounds_normalized_header
+from .score_variants import add_rank_score_header
+from .utils import (
+    get_file_handle,
+    get_output_handle,
+    index_format,
+    memory_budget,
+    outfile,
+    output_format,
+    processes,
+    silent,
+    temp_dir,
+    variant_file,
+)
+
+logger = logging.getLogger(__name__)
+util.abstract_sockets_supported = False
+
+# The stages in the order they run
+PIPELINE_STAGES = ["annotate", "models", "score", "compound", "sort"]
+
+PIPELINE_CONFIGSPEC = """
+keyword = string(default="Annotation")
+vep = boolean(default=False)
+[annotate]
+  regions = boolean(default=False)
+  region_file = string(default=None)
+  genome_build = option("37", "38", default="37")
+  cadd_files = force_list(default=list())
+  thousand_g = string(default=None)
+  exac = string(default=None)
+  spidex = string(default=None)
+  cosmic = string(default=None)
+  max_af = boolean(default=False)
+  cadd_raw = boolean(default=False)
+[models]
+  family_file = string(default=None)
+  family_type = option("ped", "alt", "cmms", "mip", default="ped")
+  reduced_penetrance = string(default=None)
+  phased = boolean(default=False)
+  strict = boolean(default=False)
+  engine = option("python", "numpy", default="python")
+[score]
+  score_config = string(default=None)
+  family_id = string(default=None)
+  rank_results = boolean(default=False)
+  skip_plugin_check = boolean(default=False)
+[compound]
+  threshold = integer(default=9)
+  penalty = integer(default=6)
+[sort]
+  position = boolean(default=False)
+"""
+
+
+def read_pipeline_config(config_file):
+    """Read the pipeline config
+
+    Args:
+        config_file (str): Path to the pipeline config
+
+    Returns:
+        config (ConfigObj): The validated config with defaults filled in
+        stages (list): The stages that are in the config, in run order
+    """
+    config = configobj.ConfigObj(
+        infile=config_file,
+        configspec=PIPELINE_CONFIGSPEC.splitlines(),
+        encoding="utf-8",
+    )
+    for section in config.sections:
+        if section not in PIPELINE_STAGES:
+            raise ValidateError("Unknown pipeline stage {0}".format(section))
+    stages = [stage for stage in PIPELINE_STAGES if stage in config.sections]
+
+    result = config.validate(Validator(), preserve_errors=True)
+    if result is not True:
+        for sections, key, error in configobj.flatten_errors(config, result):
+            raise ValidateError(
+                "Bad value for {0} in pipeline config: {1}".format(
+                    ".".join(sections + [key or ""]), error
+                )
+            )
+
+    if "compound" in stages and "score" not in stages:
+        raise ValidateError("The compound stage needs the score stage")
+    if "models" in stages and not config["models"]["family_file"]:
+        raise ValidateError("The models stage needs a family_file")
+    if "score" in stages and not config["score"]["score_config"]:
+        raise ValidateError("The score stage needs a score_config")
+    if "models" in stages and config["models"]["engine"] == "numpy" and not check_numpy():
+        raise ValidateError(
+            "The numpy engine needs numpy, install it with 'pip install genmod[numpy]'"
+        )
+
+    return config, stages
+
+
+@click.command("pipeline", short_help="Annotate, score and sort in one pass")
+@variant_file
+@click.option(
+    "-c",
+    "--config",
+    "pipeline_config",
+    type=click.Path(exists=True),
+    required=True,
+    help="The pipeline config file(.ini)",
+)
+@processes
+@memory_budget
+@silent
+@outfile
+@output_format
+@index_format
+@temp_dir
+@click.pass_context
+def pipeline(
+    context,
+    variant_file,
+    pipeline_config,
+    processes,
+    memory_budget,
+    silent,
+    outfile,
+    output_format,
+    index_format,
+    temp_dir,
+):
+    """
+    Run annotate, models, score, compound and sort in one pass.
+
+    The stages that should run and their settings are the sections of the
+    config file, see the documentation. The result is the same as piping the
+    commands into each other, but each variant is only parsed and printed once.
+    """
+    ######### This is for logging the command line string #########
+    frame = inspect.currentframe()
+    args, _, _, values = inspect.getargvalues(frame)
+    argument_list = [i + "=" + str(values[i]) for i in values if values[i] and i not in ["frame"]]
+
+    logger.info("Running GENMOD pipeline version {0}".format(__version__))
+
+    try:
+        config, stages = read_pipeline_config(pipeline_config)
+    except (ValidateError, configobj.ConfigObjError) as err:
+        logger.warning(err)
+        context.abort()
+    logger.info("Stages in the pipeline: {0}".format(", ".join(stages)))
+
+    keyword = config["keyword"]
+    vep = config["vep"]
+
+    variant_file = get_file_handle(variant_file)
+    outfile = get_output_handle(outfile, output_format, index_format, silent)
+
+    head = HeaderParser()
+    line = None
+    for line in variant_file:
+        line = line.rstrip()
+        if line.startswith("#"):
+            if line.startswith("##"):
+                head.parse_meta_data(line)
+            else:
+                head.parse_header_line(line)
+        else:
+            break
+    memory_checkpoint("header")
+
+    ###### annotate ######
+    annotation_arguments = None
+    if "annotate" in stages:
+        annotate_config = config["annotate"]
+        try:
+            annotation_arguments = get_annotation_arguments(
+                head=head,
+                regions=annotate_config["regions"],
+                region_file=annotate_config["region_file"]
+                or get_region_file(annotate_config["genome_build"]),
+                cadd_files=annotate_config["cadd_files"],
+                thousand_g=annotate_config["thousand_g"],
+                exac=annotate_config["exac"],
+                spidex=annotate_config["spidex"],
+                cosmic=annotate_config["cosmic"],
+                max_af=annotate_config["max_af"],
+                cadd_raw=annotate_config["cadd_raw"],
+            )
+        except TabixError as err:
+            logger.warning(err)
+            context.abort()
+
+    ###### models ######
+    families = {}
+    family_parser = None
+    reduced_penetrance_genes = set()
+    if "models" in stages:
+        models_config = config["models"]
+        if models_config["reduced_penetrance"]:
+            with open(models_config["reduced_penetrance"], "r", encoding="utf-8") as f:
+                reduced_penetrance_genes = get_reduced_penetrance_genes(f)
+
+        family_parser = FamilyParser(
+            open(models_config["family_file"], "r", encoding="utf-8"),
+            models_config["family_type"],
+        )
+        families = get_affected_families(family_parser)
+        if not families:
+            logger.warning("Please provide at least one family with affected individuals")
+            context.abort()
+
+        if "GeneticModels" in head.info_dict:
+            logger.warning("Genetic models are already annotated according to vcf header.")
+            context.abort()
+
+        try:
+            check_individuals(family_parser.individuals, head.individuals)
+        except IOError as e:
+            logger.error(e)
+            context.abort()
+
+        head.add_version_tracking(
+            info_id="genmod",
+            version=__version__,
+            date=datetime.now().strftime("%Y-%m-%d %H:%M"),
+            command_line=" ".join(argument_list),
+        )
+        add_models_header(head)
+
+        if vep and "CSQ" not in head.info_dict:
+            logger.warning("vep flag is used but there is no CSQ field specified in header")
+            context.abort()
+        if not vep and keyword not in head.info_dict:
+            logger.warning("Annotation key {0} could not be found in VCF header".format(keyword))
+            context.abort()
+
+    ###### score ######
+    config_parser = None
+    family_id = "1"
+    if "score" in stages:
+        score_config = config["score"]
+        try:
+            config_parser = ConfigParser(score_config["score_config"])
+        except ValidateError as e:
+            logger.error(e.message)
+            context.abort()
+
+        if score_config["family_id"]:
+            family_id = score_config["family_id"]
+        elif family_parser:
+            family_id = list(family_parser.families.keys())[0]
+        logger.info("Family used in scoring: {0}".format(family_id))
+
+        if not check_plugins(config_parser, head) and not score_config["skip_plugin_check"]:
+            logger.error("All score plugins has to be defined in vcf header")
+            context.abort()
+
+        if "RankScore" in head.info_dict:
+            logger.warning("Variants already scored according to VCF header")
+            context.abort()
+
+        add_rank_score_header(
+            head, list(config_parser.categories.keys()), score_config["rank_results"]
+        )
+
+    ###### compound ######
+    if "compound" in stages:
+        add_compounds_normalized_header(head)
+
+    memory_checkpoint("resources")
+
+    # Add the first variant to the iterator
+    if line is not None and not line.startswith("#"):
+        variant_file = itertools.chain([line], variant_file)
+    else:
+        print_headers(head=head, outfile=outfile, silent=silent)
+        sys.exit(0)
+
+    sort_mode = None
+    if "sort" in stages:
+        sort_mode = "chromosome" if config["sort"]["position"] else "rank"
+
+    if annotation_arguments is not None:
+        variant_file = (
+            annotate_variant(variant_line, annotation_arguments) for variant_line in variant_file
+        )
+
+    start_time_analysis = datetime.now()
+    metrics = get_metrics()
+
+    variant_queue = JoinableQueue(maxsize=100)
+    results = Queue()
+    logger.info("Number of CPU:s {}".format(cpu_count()))
+    logger.info("Number of workers: {}".format(processes))
+
+    workers = [
+        PipelineAnnotator(
+            task_queue=variant_queue,
+            results_queue=results,
+            families=families,
+            individuals=list(family_parser.individuals.keys()) if family_parser else [],
+            header_line=head.header,
+            vep_header=head.vep_columns,
+            annotation_keyword=keyword,
+            phased="models" in stages and config["models"]["phased"],
+            strict="models" in stages and config["models"]["strict"],
+            engine=config["models"]["engine"],
+            vep=vep,
+            reduced_penetrance_genes=reduced_penetrance_genes,
+            annotate_models="models" in stages,
+            config_parser=config_parser,
+            family_id=family_id,
+            rank_results="score" in stages and config["score"]["rank_results"],
+            compound_models=(
+                get_compound_models(head.individuals) if "compound" in stages else None
+            ),
+            threshold=config["compound"]["threshold"],
+            penalty=config["compound"]["penalty"],
+            sort_mode=sort_mode,
+        )
+        for i in range(processes)
+    ]
+
+    # Sorted variants are printed with their priority to a temp file first
+    printer_outfile = outfile
+    if sort_mode:
+        temp_file = NamedTemporaryFile(delete=False, dir=temp_dir)
+        temp_file.close()
+        printer_outfile = open(temp_file.name, mode="w", encoding="utf-8", errors="replace")
+    else:
+        print_headers(head=head, outfile=outfile, silent=silent)
+
+    # The temp file is removed also when the run fails or is aborted
+    try:
+        try:
+            for worker in workers:
+                worker.start()
+
+            batch_printer = BatchPrinter(
+                outfile=printer_outfile, silent=silent, memory_budget=memory_budget
+            )
+            batches = generate_batches(
+                variants=variant_file,
+                header=head,
+                vep=vep,
+                annotation_keyword=keyword,
+                raw=True,
+            )
+            # The batches with one variant are sent in chunks, see coalesce_batches
+            for batch, singletons in metrics.iterate("read", coalesce_batches(batches)):
+                batch_number = batch_printer.add_batch(batch)
+                metrics.add_batch(len(batch))
+                with metrics.timer("put_wait"):
+                    variant_queue.put(make_task(batch_number, batch, singletons=singletons))
+                metrics.sample(
+                    nr_printed=batch_printer.nr_printed,
+                    variant_queue=variant_queue,
+                    results=results,
+                )
+                with metrics.timer("print"):
+                    while True:
+                        try:
+                            batch_printer.add_result(*results.get_nowait())
+                        except Empty:
+                            break
+                # Wait for the results to be printed before more batches are sent
+                while batch_printer.is_full:
+                    with metrics.timer("budget_wait"):
+                        result = get_result(results, workers)
+                    with metrics.timer("print"):
+                        batch_printer.add_result(*result)
+            memory_checkpoint("batching")
+
+            for i in range(processes):
+                variant_queue.put(None)
+
+            while batch_printer.nr_waiting:
+                with metrics.timer("result_wait"):
+                    result = get_result(results, workers)
+                with metrics.timer("print"):
+                    batch_printer.add_result(*result)
+                metrics.sample(
+                    nr_printed=batch_printer.nr_printed,
+                    variant_queue=variant_queue,
+                    results=results,
+                )
+            metrics.sample(nr_printed=batch_printer.nr_printed, force=True)
+
+            variant_queue.join()
+            memory_checkpoint("printing")
+
+        except Exception as err:
+            logger.warning(err)
+            for worker in workers:
+                worker.terminate()
+            context.abort()
+
+        if sort_mode:
+            printer_outfile.close()
+            logger.info("Sorting variants")
+            sort_variants(infile=temp_file.name, mode=sort_mode)
+
+            print_headers(head=head, outfile=outfile, silent=silent)
+            with open(temp_file.name, mode="r", encoding="utf-8", errors="replace") as f:
+                for variant_line in f:
+                    print_variant(
+                        variant_line=variant_line, outfile=outfile, mode="modified", silent=silent
+                    )
+            memory_checkpoint("sorting")
+    finally:
+        if sort_mode:
+            printer_outfile.close()
+            os.remove(temp_file.name)
+
+    logger.info("Time for whole analyis: {0}".format(str(datetime.now() - start_time_analysis)))
@@ -13,33 +13,71 @@ from __future__ import print_function
 
 import itertools
 import logging
-import os
-import subprocess
 import sys
-from codecs import open
 from datetime import datetime
 from multiprocessing import JoinableQueue, Queue, cpu_count, util
-from tempfile import NamedTemporaryFile
-from time import sleep
+from queue import Empty
 
 import click
 
 from genmod import __version__
+from genmod.memory_report import memory_checkpoint
+from genmod.metrics import get_metrics
 from genmod.score_variants import CompoundScorer
-from genmod.utils import VariantPrinter, get_batches
-from genmod.vcf_tools import HeaderParser, add_metadata, print_headers, sort_variants
-
-from .utils import get_file_handle, outfile, processes, silent, temp_dir, variant_file
+from genmod.utils import (
+    BatchPrinter,
+    BatchTracer,
+    coalesce_batches,
+    format_batch_traces,
+    generate_batches,
+    get_result,
+    make_task,
+)
+from genmod.vcf_tools import HeaderParser, add_metadata, print_headers
+
+from .utils import (
+    get_file_handle,
+    get_output_handle,
+    index_format,
+    memory_budget,
+    outfile,
+    output_format,
+    processes,
+    silent,
+    slow_batches,
+    temp_dir,
+    variant_file,
+)
 
 logger = logging.getLogger(__name__)
 util.abstract_sockets_supported = False
 
 
+def add_compounds_normalized_header(head):
+    """Add the CompoundsNormalized field to the vcf header
+
+    Args:
+        head (HeaderParser): A HeaderParser object
+    """
+    add_metadata(
+        head,
+        "info",
+        "CompoundsNormalized",
+        annotation_number=".",
+        entry_type="String",
+        description="Rank score as provided by compound analysis, based on RankScoreNormalized. family_id:rank_score",
+    )
+
+
 @click.command("compound", short_help="Score compounds")
 @variant_file
 @silent
 @outfile
+@output_format
+@index_format
 @processes
+@memory_budget
+@slow_batches
 @temp_dir
 @click.option(
     "--vep", is_flag=True, help="If variants are annotated with the Variant Effect Predictor."
@@ -53,7 +91,19 @@ util.abstract_sockets_supported = False
 @click.option("--penalty", type=int, help="Penalty applied together with --threshold", default=6)
 @click.pass_context
 def compound(
-    context, variant_file, silent, outfile, vep, threshold: int, penalty: int, processes, temp_dir
+    context,
+    variant_file,
+    silent,
+    outfile,
+    output_format,
+    index_format,
+    vep,
+    threshold: int,
+    penalty: int,
+    processes,
+    memory_budget,
+    slow_batches,
+    temp_dir,
 ):
     """
     Score compound variants in a vcf file based on their rank score.
@@ -61,8 +111,10 @@ def compound(
     logger.info("Running GENMOD score_compounds, version: {0}".format(__version__))
 
     variant_file = get_file_handle(variant_file)
+    outfile = get_output_handle(outfile, output_format, index_format, silent)
 
     start_time_analysis = datetime.now()
+    metrics = get_metrics()
     logger.info("Initializing a Header Parser")
     head = HeaderParser()
 
@@ -78,6 +130,7 @@ def compound(
             break
 
     logger.info("Headers parsed")
+    memory_checkpoint("header")
 
     if not line.startswith("#"):
         variant_file = itertools.chain([line], variant_file)
@@ -87,14 +140,7 @@ def compound(
 
     individuals = head.individuals
 
-    add_metadata(
-        head,
-        "info",
-        "CompoundsNormalized",
-        annotation_number=".",
-        entry_type="String",
-        description="Rank score as provided by compound analysis, based on RankScoreNormalized. family_id:rank_score",
-    )
+    add_compounds_normalized_header(head)
 
     ###################################################################
     ### The task queue is where all jobs(in this case batches that  ###
@@ -103,6 +149,8 @@ def compound(
     ###################################################################
 
     logger.debug("Setting up a JoinableQueue for storing variant batches")
+    # The batches are sent as blocks of raw variant lines and the workers send
+    # back blocks with the new INFO fields, see genmod/utils/line_batches.py
     variant_queue = JoinableQueue(maxsize=1000)
     logger.debug("Setting up a Queue for storing results from workers")
     results = Queue()
@@ -112,6 +160,11 @@ def compound(
     logger.info("Number of CPU:s {}".format(cpu_count()))
     logger.info("Number of model checkers: {}".format(num_scorers))
 
+    # Each worker keeps the slowest of its batches and sends them back at the end
+    batch_tracer = None
+    if slow_batches:
+        batch_tracer = BatchTracer(slow_batches, Queue())
+
     # These are the workers that do the heavy part of the analysis
     logger.info("Seting up the workers")
     compound_scorers = [
@@ -119,8 +172,12 @@ def compound(
             task_queue=variant_queue,
             results_queue=results,
             individuals=individuals,
+            header_line=head.header,
             threshold=threshold,
             penalty=penalty,
+            batch_tracer=batch_tracer,
+            vep=vep,
+            vep_header=head.vep_columns,
         )
         for i in range(num_scorers)
     ]
@@ -131,77 +188,68 @@ def compound(
             logger.debug("Starting worker {0}".format(worker))
             worker.start()
 
-        # This process prints the variants to temporary files
-        logger.info("Seting up the variant printer")
-
-        # We use a temp file to store the processed variants
-        logger.debug("Build a tempfile for printing the variants")
-        if temp_dir:
-            temp_variant_file = NamedTemporaryFile(delete=False, dir=temp_dir)
-            temp_header_file = NamedTemporaryFile(delete=False, dir=temp_dir)
-        else:
-            temp_variant_file = NamedTemporaryFile(delete=False)
-            temp_header_file = NamedTemporaryFile(delete=False)
-        temp_variant_file.close()
-        temp_header_file.close()
-
-        variant_printer = VariantPrinter(
-            task_queue=results, head=head, mode="vcf", outfile=temp_variant_file.name
-        )
-
-        logger.info("Starting the variant printer process")
-        variant_printer.start()
+        # Batches can be finished in any order, the printer holds them until
+        # they can be printed in the same order as they were read
+        batch_printer = BatchPrinter(outfile=outfile, silent=silent, memory_budget=memory_budget)
+        print_headers(head=head, outfile=outfile, silent=silent)
 
         # This process parses the original vcf and create batches to put in the variant queue:
-        get_batches(
+        # The batches with one variant are sent in chunks, see coalesce_batches
+        batches = generate_batches(
             variants=variant_file,
-            batch_queue=variant_queue,
             header=head,
             vep=vep,
-            results_queue=results,
+            raw=True,
         )
+        for batch, singletons in metrics.iterate("read", coalesce_batches(batches)):
+            batch_number = batch_printer.add_batch(batch)
+            metrics.add_batch(len(batch))
+            with metrics.timer("put_wait"):
+                variant_queue.put(make_task(batch_number, batch, singletons=singletons))
+            metrics.sample(
+                nr_printed=batch_printer.nr_printed, variant_queue=variant_queue, results=results
+            )
+            with metrics.timer("print"):
+                while True:
+                    try:
+                        batch_printer.add_result(*results.get_nowait())
+                    except Empty:
+                        break
+            # Wait for the results to be printed before more batches are sent
+            while batch_printer.is_full:
+                with metrics.timer("budget_wait"):
+                    result = get_result(results, compound_scorers)
+                with metrics.timer("print"):
+                    batch_printer.add_result(*result)
+        memory_checkpoint("batching")
 
         logger.debug("Put stop signs in the variant queue")
         for i in range(num_scorers):
             variant_queue.put(None)
 
-        # Before joining on variant_queue, check whether workers have completed
-        # or failed, to avoid main process deadlock on never-decreasing queue semaphore.
-        while any([worker.is_alive() for worker in compound_scorers]):
-            sleep(1)  # Don't churn CPU
-            for worker in compound_scorers:
-                if not worker.is_alive() and worker.exitcode != 0:
-                    raise RuntimeError(f"Worker {worker} failed")
-                logger.debug(f"Worker {worker} alive")
+        # get_result checks whether workers have failed, to avoid main process
+        # deadlock on a result that never comes.
+        while batch_printer.nr_waiting:
+            with metrics.timer("result_wait"):
+                result = get_result(results, compound_scorers)
+            with metrics.timer("print"):
+                batch_printer.add_result(*result)
+            metrics.sample(
+                nr_printed=batch_printer.nr_printed, variant_queue=variant_queue, results=results
+            )
+        metrics.sample(nr_printed=batch_printer.nr_printed, force=True)
 
         variant_queue.join()
-
-        results.put(None)
-        variant_printer.join()
         results.close()
+        memory_checkpoint("printing")
 
-        with open(temp_header_file.name, "w", encoding="utf-8") as header_file:
-            print_headers(head=head, outfile=header_file, silent=silent)
-
-        # Sort the variants temp file first
-        sort_variants(infile=temp_variant_file.name, mode="vcf")
-
-        # Combine header + sorted variants into final file
-        subprocess.run(
-            ["cat", temp_header_file.name, temp_variant_file.name],
-            stdout=open(outfile.name, "wb"),
-            check=True,
-        )
+        if batch_tracer is not None:
+            slow_traces = batch_tracer.collect(len(compound_scorers))
+            click.echo("\n".join(format_batch_traces(slow_traces)), err=True)
     except Exception as e:
         logger.error(e)
         for worker in compound_scorers:
             worker.terminate()
-        variant_printer.terminate()
         context.abort()
-    finally:
-        logger.info("Removing temp files")
-        os.remove(temp_variant_file.name)
-        os.remove(temp_header_file.name)
-        logger.debug("Temp files removed")
 
     logger.info("Time for whole analyis: {0}".format(str(datetime.now() - start_time_analysis)))
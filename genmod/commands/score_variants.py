@@ -21,28 +21,78 @@ from ped_parser import FamilyParser
 from validate import ValidateError
 
 from genmod import __version__
+from genmod.memory_report import memory_checkpoint
+from genmod.metrics import get_metrics
 from genmod.score_variants import (
     RANK_SCORE_TYPES,
     ConfigParser,
-    as_normalized_max_min,
+    add_rank_score,
     check_plugins,
-    get_category_score,
 )
 from genmod.vcf_tools import (
+    CsqColumns,
     HeaderParser,
+    InfoView,
     add_metadata,
-    add_vcf_info,
-    get_info_dict,
     get_variant_dict,
     print_headers,
     print_variant,
+    update_vcf_info,
 )
 
-from .utils import family_file, family_type, get_file_handle, outfile, silent, variant_file
+from .utils import (
+    family_file,
+    family_type,
+    get_file_handle,
+    get_output_handle,
+    index_format,
+    outfile,
+    output_format,
+    silent,
+    variant_file,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def add_rank_score_header(head, score_categories, rank_results=False):
+    """Add the rank score fields to the vcf header
+
+    Args:
+        head (HeaderParser): A HeaderParser object
+        score_categories (list): The score categories of the score config
+        rank_results (bool): If the RankResult field is added
+    """
+    for rank_score_type, rank_score_description in RANK_SCORE_TYPES.items():
+        add_metadata(
+            head,
+            "info",
+            rank_score_type,
+            annotation_number=".",
+            entry_type="String",
+            description=rank_score_description,
+        )
+
+    add_metadata(
+        head,
+        "info",
+        "RankScoreMinMax",
+        annotation_number=".",
+        entry_type="String",
+        description="The rank score MIN-MAX bounds. family_id:min:max.",
+    )
+
+    if rank_results:
+        add_metadata(
+            head,
+            "info",
+            "RankResult",
+            annotation_number=".",
+            entry_type="String",
+            description="|".join(score_categories),
+        )
+
+
 @click.command("score", short_help="Score variants")
 @variant_file
 @click.option(
@@ -63,6 +113,8 @@ logger = logging.getLogger(__name__)
     help="Add a info field that shows how the different categories contribute to the rank score.",
 )
 @outfile
+@output_format
+@index_format
 @click.option(
     "-c", "--score_config", type=click.Path(exists=True), help="The plug-in config file(.ini)"
 )
@@ -78,6 +130,8 @@ def score(
     skip_plugin_check,
     rank_results,
     outfile,
+    output_format,
+    index_format,
 ):
     """
     Score variants in a vcf file using a Weighted Sum Model.
@@ -90,6 +144,7 @@ def score(
     logger.info("Checking family id")
 
     variant_file = get_file_handle(variant_file)
+    outfile = get_output_handle(outfile, output_format, index_format, silent)
 
     if family_file:
         logger.info("Setting up a family parser")
@@ -113,6 +168,7 @@ def score(
         context.abort()
 
     score_categories = list(config_parser.categories.keys())
+    memory_checkpoint("resources")
 
     logger.debug("Config parsed succesfully")
 
@@ -128,6 +184,7 @@ def score(
                 head.parse_header_line(line)
         else:
             break
+    memory_checkpoint("header")
 
     logger.info("Check if all score plugins exist in vcf ...")
     if not check_plugins(config_parser, head):
@@ -138,6 +195,7 @@ def score(
         logger.info("All plugins are defined in vcf")
 
     csq_format = head.vep_columns
+    csq_columns = CsqColumns(csq_format)
     # Add the first variant to the iterator
     if not line.startswith("#"):
         variant_file = itertools.chain([line], variant_file)
@@ -152,102 +210,38 @@ def score(
         logger.info("Please check VCF file")
         context.abort()
 
-    for rank_score_type, rank_score_description in RANK_SCORE_TYPES.items():
-        add_metadata(
-            head,
-            "info",
-            rank_score_type,
-            annotation_number=".",
-            entry_type="String",
-            description=rank_score_description,
-        )
-
-    add_metadata(
-        head,
-        "info",
-        "RankScoreMinMax",
-        annotation_number=".",
-        entry_type="String",
-        description="The rank score MIN-MAX bounds. family_id:min:max.",
-    )
-
-    if rank_results:
-        add_metadata(
-            head,
-            "info",
-            "RankResult",
-            annotation_number=".",
-            entry_type="String",
-            description="|".join(score_categories),
-        )
+    add_rank_score_header(head, score_categories, rank_results)
 
     print_headers(head=head, outfile=outfile, silent=silent)
     start_scoring = datetime.now()
     last_twenty = datetime.now()
     nr_of_variants = 1
 
-    for line in variant_file:
+    metrics = get_metrics()
+    for line in metrics.iterate("read", variant_file):
         if not line.startswith("#"):
-            variant = get_variant_dict(line, header_line)
-            variant["info_dict"] = get_info_dict(variant["INFO"])
-            rank_score = 0
-            # This is for printing results to vcf:
-            category_scores = []
-            # Keep track for per-category min max scores for normalization purposes
-            category_scores_max: float = 0.0
-            category_scores_min: float = 0.0
-            for category in score_categories:
-                category_score, category_score_min, category_score_max = get_category_score(
+            with metrics.timer("parse"):
+                variant = get_variant_dict(line, header_line)
+                variant["info_dict"] = InfoView(variant["INFO"])
+            with metrics.timer("score"):
+                variant = add_rank_score(
                     variant=variant,
-                    category=category,
                     config_parser=config_parser,
+                    score_categories=score_categories,
+                    family_id=family_id,
                     csq_format=csq_format,
+                    csq_columns=csq_columns,
+                    rank_results=rank_results,
                 )
-                logger.debug("Adding category score {0} to rank_score".format(category_score))
-                rank_score += category_score
-                logger.debug("Updating rank score to {0}".format(rank_score))
-                category_scores_min += category_score_min
-                category_scores_max += category_score_max
-
-                category_scores.append(str(category_score))
-
-            rank_score = float(rank_score)  # Export rank score as float type
-
-            # Normalize ranks score (across all categories)
-            rank_score_normalized: float = as_normalized_max_min(
-                score=float(rank_score),
-                min_score_value=category_scores_min,
-                max_score_value=category_scores_max,
-            )
-
-            variant = add_vcf_info(
-                keyword="RankScore",
-                variant_dict=variant,
-                annotation="{0}:{1}".format(family_id, rank_score),
-            )
-
-            variant: dict = add_vcf_info(
-                keyword="RankScoreNormalized",
-                variant_dict=variant,
-                annotation="{0}:{1}".format(family_id, rank_score_normalized),
-            )
-
-            variant: dict = add_vcf_info(
-                keyword="RankScoreMinMax",
-                variant_dict=variant,
-                annotation="{0}:{1}:{2}".format(
-                    family_id, category_scores_min, category_scores_max
-                ),
-            )
-
-            if rank_results:
-                variant = add_vcf_info(
-                    keyword="RankResult", variant_dict=variant, annotation="|".join(category_scores)
-                )
+                update_vcf_info(variant)
 
-            print_variant(
-                variant_dict=variant, header_line=header_line, outfile=outfile, silent=silent
-            )
+            with metrics.timer("print"):
+                print_variant(
+                    variant_dict=variant, header_line=header_line, outfile=outfile, silent=silent
+                )
+            # Each variant is scored on its own, a batch of one
+            metrics.add_batch(1)
+            metrics.sample(nr_printed=nr_of_variants)
 
             nr_of_variants += 1
 
@@ -256,5 +250,7 @@ def score(
                 logger.info("Last 20000 took {0} to score.".format(datetime.now() - last_twenty))
                 last_twenty = datetime.now()
 
+    metrics.sample(nr_printed=nr_of_variants, force=True)
+    memory_checkpoint("printing")
     logger.info("Variants scored. Number of variants: {0}".format(nr_of_variants))
     logger.info("Time to score variants: {0}".format(datetime.now() - start_scoring))
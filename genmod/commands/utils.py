@@ -1,10 +1,16 @@
 import gzip
+import logging
 import sys
 from codecs import getreader, open
 from multiprocessing import cpu_count
 
 import click
 
+from genmod.utils import MEMORY_BUDGET
+from genmod.vcf_tools import BgzfReader, BgzfWriter, is_bgzf
+
+logger = logging.getLogger(__name__)
+
 variant_file = click.argument("variant_file", type=click.Path(), metavar="<vcf_file> or -")
 
 outfile = click.option(
@@ -14,6 +20,22 @@ outfile = click.option(
     help="Specify the path to a file where results should be stored.",
 )
 
+output_format = click.option(
+    "--output_format",
+    "--output-format",
+    type=click.Choice(["vcf", "vcf.gz"]),
+    default="vcf",
+    show_default=True,
+    help="If the output should be plain text or block gzipped (bgzip).",
+)
+
+index_format = click.option(
+    "--index",
+    "index_format",
+    type=click.Choice(["tbi", "csi"]),
+    help="Write a tabix or csi index next to a vcf.gz outfile.",
+)
+
 silent = click.option("-s", "--silent", is_flag=True, help="Do not print the variants.")
 
 processes = click.option(
@@ -23,6 +45,28 @@ processes = click.option(
     help="Define how many processes that should be use for annotation.",
 )
 
+memory_budget = click.option(
+    "--memory_budget",
+    "--memory-budget",
+    type=click.IntRange(min=0),
+    default=MEMORY_BUDGET,
+    show_default=True,
+    metavar="MB",
+    help="""How many MB of variant lines and results may wait to be printed.
+                    When they are over the budget no more batches are sent to the
+                    workers until the results are printed. 0 turns the limit off.""",
+)
+
+slow_batches = click.option(
+    "--slow_batches",
+    "--slow-batches",
+    type=click.IntRange(min=0),
+    default=0,
+    metavar="N",
+    help="""Time each batch and report the N slowest batches, with their
+                    features, variants, compound candidates and pairs, to stderr.""",
+)
+
 temp_dir = click.option("--temp_dir", type=click.Path(exists=True), help="Path to tempdir")
 
 family_file = click.option("-f", "--family_file", type=click.File("r"), metavar="<ped_file>")
@@ -37,7 +81,11 @@ family_type = click.option(
 
 
 def get_file_handle(path):
-    """Get a file handle"""
+    """Get a file handle
+
+    Block gzipped (bgzip) files are read with a BgzfReader, other gzipped files
+    with gzip.
+    """
     if path == "-":
         if sys.version_info < (3, 0):
             sys.stdin = getreader("utf-8")(sys.stdin)
@@ -45,9 +93,48 @@ def get_file_handle(path):
         file_handle = sys.stdin
 
     elif path.endswith(".gz"):
-        file_handle = getreader("utf-8")(gzip.open(path, "r"), errors="replace")
+        # Block gzipped files are inflated in parallel
+        if is_bgzf(path):
+            file_handle = BgzfReader(path)
+        else:
+            file_handle = getreader("utf-8")(gzip.open(path, "r"), errors="replace")
 
     else:
         file_handle = open(path, "r")
 
     return file_handle
+
+
+def get_output_handle(outfile, output_format="vcf", index_format=None, silent=False):
+    """Get the handle that the variants should be printed to
+
+    If the output format is vcf.gz the output is written block gzipped,
+    optionally with an index, and the handle is closed when the command is
+    finished.
+
+    Args:
+        outfile (file): The outfile from the command line or None for stdout
+        output_format (str): 'vcf' or 'vcf.gz'
+        index_format (str): 'tbi', 'csi' or None
+        silent (bool): If nothing should be printed to stdout
+
+    Returns:
+        outfile (file): A handle to print to or None for stdout
+    """
+    if output_format != "vcf.gz":
+        if index_format:
+            logger.warning("An index can only be written with --output-format vcf.gz")
+        return outfile
+
+    if outfile is None or outfile.name in ("-", "<stdout>"):
+        if silent:
+            return None
+        if index_format:
+            logger.warning("An index can only be written when there is an outfile")
+        output_handle = BgzfWriter(sys.stdout.buffer)
+    else:
+        outfile.close()
+        output_handle = BgzfWriter(outfile.name, index_format=index_format)
+
+    click.get_current_context().call_on_close(output_handle.close)
+    return output_handle
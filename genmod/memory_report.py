@@ -0,0 +1,316 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+memory_report.py
+
+Report the memory of the main process and the worker processes of a command.
+
+With 'genmod --memory-report DIR' python allocations are traced with
+tracemalloc and a checkpoint is taken at the boundaries of the stages of a
+command, like when the header is parsed, when the resources are loaded, when
+all batches are made and when all variants are printed. A checkpoint records
+the resident memory of the process, its peak so far, the traced memory, the
+peak of the traced memory since the checkpoint before, and the allocation
+sites that hold the most memory.
+
+The directory is passed on to the workers in the environment, like the
+profiles in profiling.py. The run method of each worker is decorated with
+memory_traced, that takes a checkpoint when the worker starts and when it is
+finished. Every process writes its checkpoints as json, named after the
+process, its pid and the id of the run. When the command is finished the main
+process waits for the workers and writes memory_summary.txt with the peak
+memory of each process of the run and the top allocation sites. The reports
+of earlier runs in the same directory are left out.
+
+Tracing the allocations makes the command a lot slower, the option is meant
+for finding where the memory goes, not for production runs.
+"""
+
+from __future__ import division, print_function
+
+import functools
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+
+try:
+    import resource
+except ImportError:
+    # resource is only available on unix
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+# The environment variable that holds the memory report directory
+MEMORY_DIR_VARIABLE = "GENMOD_MEMORY_DIR"
+
+# The environment variable that holds the id of the reported run
+MEMORY_RUN_VARIABLE = "GENMOD_MEMORY_RUN"
+
+# The number of allocation sites recorded for each checkpoint
+TOP_SITES = 10
+
+# The number of frames that tracemalloc stores for each allocation
+TRACE_FRAMES = 1
+
+# The checkpoints of the process
+_checkpoints = []
+_start_time = None
+
+
+def get_memory_dir():
+    """Get the memory report directory, None if memory is not reported"""
+    return os.environ.get(MEMORY_DIR_VARIABLE) or None
+
+
+def get_memory_run():
+    """Get the id of the reported run, None if it is not set"""
+    return os.environ.get(MEMORY_RUN_VARIABLE) or None
+
+
+def get_report_name(name, run_id=None):
+    """Get the file name of the memory report of a process
+
+    Args:
+        name (str): The name of the process
+        run_id (str): The id of the run
+
+    Returns:
+        report_name (str): Like <name>-<pid>-<run_id>.json
+    """
+    if run_id is None:
+        return "{0}-{1}.json".format(name, os.getpid())
+    return "{0}-{1}-{2}.json".format(name, os.getpid(), run_id)
+
+
+def get_rss():
+    """Get the current resident memory of the process in MB, None if unknown"""
+    if resource is None:
+        return None
+    try:
+        with open("/proc/self/statm") as statm:
+            resident_pages = int(statm.read().split()[1])
+    except (IOError, OSError, IndexError, ValueError):
+        return None
+    return resident_pages * resource.getpagesize() / 1024 / 1024
+
+
+def get_peak_rss():
+    """Get the peak resident memory of the process in MB, None if unknown"""
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on linux and in bytes on mac
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    if sys.platform == "darwin":
+        peak_rss /= 1024
+    return peak_rss
+
+
+def get_top_sites(snapshot, nr_of_sites=TOP_SITES):
+    """Get the allocation sites of a snapshot that hold the most memory
+
+    Args:
+        snapshot (tracemalloc.Snapshot)
+        nr_of_sites (int): The number of sites
+
+    Returns:
+        sites (list): Dictionaries with the file and line, the size in KB
+                      and the number of blocks
+    """
+    snapshot = snapshot.filter_traces(
+        (
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        )
+    )
+    sites = []
+    for statistic in snapshot.statistics("lineno")[:nr_of_sites]:
+        frame = statistic.traceback[0]
+        sites.append(
+            {
+                "site": "{0}:{1}".format(frame.filename, frame.lineno),
+                "size_kb": round(statistic.size / 1024, 1),
+                "count": statistic.count,
+            }
+        )
+    return sites
+
+
+def memory_checkpoint(stage):
+    """Record the memory of the process at the end of a stage
+
+    Does nothing if memory is not reported. The peak of the traced memory is
+    reset, so the peak of a checkpoint is the peak of the stage that ends.
+
+    Args:
+        stage (str): The name of the stage that ends
+    """
+    if not tracemalloc.is_tracing() or not get_memory_dir():
+        return
+    traced, peak_traced = tracemalloc.get_traced_memory()
+    rss = get_rss()
+    peak_rss = get_peak_rss()
+    _checkpoints.append(
+        {
+            "stage": stage,
+            "time": round(time.perf_counter() - (_start_time or 0), 3),
+            "rss_mb": None if rss is None else round(rss, 1),
+            "peak_rss_mb": None if peak_rss is None else round(peak_rss, 1),
+            "traced_mb": round(traced / 1024 / 1024, 1),
+            "peak_traced_mb": round(peak_traced / 1024 / 1024, 1),
+            "top_sites": get_top_sites(tracemalloc.take_snapshot()),
+        }
+    )
+    tracemalloc.reset_peak()
+
+
+def dump_checkpoints(memory_dir, name):
+    """Write the checkpoints of the process as json
+
+    Args:
+        memory_dir (str): The directory of the memory report
+        name (str): The name of the process
+
+    Returns:
+        memory_path (str): The path to the json file
+    """
+    memory_path = os.path.join(memory_dir, get_report_name(name, get_memory_run()))
+    with open(memory_path, "w") as memory_file:
+        json.dump({"name": name, "pid": os.getpid(), "checkpoints": _checkpoints}, memory_file)
+    return memory_path
+
+
+def start_tracing():
+    """Start to trace the allocations of the process, from a clean slate"""
+    global _start_time
+    del _checkpoints[:]
+    _start_time = time.perf_counter()
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+    # A forked worker inherits the traces and the peak of the main process
+    tracemalloc.reset_peak()
+
+
+def memory_traced(run):
+    """Decorate the run method of a worker process to report its memory
+
+    The memory is only reported if a memory report directory is set. A
+    checkpoint is taken when the worker has started and when it is finished.
+    """
+
+    @functools.wraps(run)
+    def memory_traced_run(self, *args, **kwargs):
+        memory_dir = get_memory_dir()
+        if not memory_dir:
+            return run(self, *args, **kwargs)
+
+        start_tracing()
+        memory_checkpoint("start")
+        try:
+            return run(self, *args, **kwargs)
+        finally:
+            memory_checkpoint("batches")
+            dump_checkpoints(memory_dir, self.name)
+
+    return memory_traced_run
+
+
+def start_memory_report(memory_dir):
+    """Start to trace the main process and set the directory for the workers
+
+    Args:
+        memory_dir (str): The directory for the memory report
+    """
+    if not os.path.isdir(memory_dir):
+        os.makedirs(memory_dir)
+    os.environ[MEMORY_DIR_VARIABLE] = os.path.abspath(memory_dir)
+    os.environ[MEMORY_RUN_VARIABLE] = uuid.uuid4().hex[:8]
+    logger.info("Writing memory report to {0}".format(memory_dir))
+    start_tracing()
+
+
+def stop_memory_report(memory_dir):
+    """Take the last checkpoint of the main process and write the summary
+
+    Waits for the workers so that all checkpoints are written.
+
+    Args:
+        memory_dir (str): The directory for the memory report
+    """
+    memory_checkpoint("end")
+    dump_checkpoints(memory_dir, "main")
+    run_id = get_memory_run()
+    os.environ.pop(MEMORY_DIR_VARIABLE, None)
+    os.environ.pop(MEMORY_RUN_VARIABLE, None)
+    tracemalloc.stop()
+
+    for process in multiprocessing.active_children():
+        process.join()
+
+    write_memory_summary(memory_dir, run_id)
+
+
+def write_memory_summary(memory_dir, run_id=None):
+    """Write a summary of the memory reports of a directory
+
+    For each process the peak resident memory, the peak traced memory of each
+    stage and the top allocation sites of the stage with the largest traced
+    memory are written to memory_summary.txt.
+
+    Args:
+        memory_dir (str): The directory with the json reports
+        run_id (str): Only sum up the reports of this run, all reports if
+                      None
+
+    Returns:
+        summary_path (str): The path to the summary
+    """
+    pattern = "*.json" if run_id is None else "*-{0}.json".format(run_id)
+    reports = []
+    for memory_path in sorted(glob.glob(os.path.join(memory_dir, pattern))):
+        with open(memory_path) as memory_file:
+            reports.append(json.load(memory_file))
+    if not reports:
+        logger.warning("No memory reports found in {0}".format(memory_dir))
+        return None
+
+    summary_path = os.path.join(memory_dir, "memory_summary.txt")
+    with open(summary_path, "w") as summary:
+        print("Processes:", file=summary)
+        for report in reports:
+            checkpoints = report["checkpoints"]
+            peak_rss = max([checkpoint["peak_rss_mb"] or 0 for checkpoint in checkpoints] or [0])
+            print(
+                "  {0}-{1}: peak rss {2:.1f} MB".format(report["name"], report["pid"], peak_rss),
+                file=summary,
+            )
+        for report in reports:
+            checkpoints = report["checkpoints"]
+            if not checkpoints:
+                continue
+            print(file=summary)
+            print("{0}-{1}:".format(report["name"], report["pid"]), file=summary)
+            print("  stage\trss_mb\ttraced_mb\tpeak_traced_mb", file=summary)
+            for checkpoint in checkpoints:
+                print(
+                    "  {stage}\t{rss_mb}\t{traced_mb}\t{peak_traced_mb}".format(**checkpoint),
+                    file=summary,
+                )
+            largest = max(checkpoints, key=lambda checkpoint: checkpoint["traced_mb"])
+            print("  Top allocation sites after {0}:".format(largest["stage"]), file=summary)
+            for site in largest["top_sites"]:
+                print(
+                    "    {size_kb:>10.1f} KB {count:>8} blocks  {site}".format(**site),
+                    file=summary,
+                )
+
+    logger.info("Memory summary written to {0}".format(summary_path))
+    return summary_path
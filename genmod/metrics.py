@@ -0,0 +1,324 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+metrics.py
+
+Collect metrics of a command run and write them as json.
+
+With 'genmod --metrics-json PATH' the main process and every worker process
+collect a Metrics object. The time of each stage, like parsing, checking the
+models, scoring and printing, is added up with Metrics.timer. The main
+process also records a histogram of the batch sizes, and samples the depth
+of the queues and the number of variants that are read and printed, so that
+the throughput over time can be followed.
+
+The workers write their metrics to a temporary directory that is passed on
+in the environment, like the profiles in profiling.py. When the command is
+finished the main process waits for the workers and writes all metrics to
+one json file, with a summary of the worker utilisation. If the workers wait
+for batches most of the time the run is bound by the main process, if the
+main process waits to put batches on the queue it is bound by the workers.
+
+Without the option the stages are timed with NULL_METRICS, that does nothing.
+"""
+
+from __future__ import division, print_function
+
+import glob
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# The environment variable that holds the directory of the worker metrics
+METRICS_DIR_VARIABLE = "GENMOD_METRICS_DIR"
+
+# Seconds between the samples of the queues and the throughput
+SAMPLE_INTERVAL = 1.0
+
+# The fraction of time that the main process or the workers wait before the
+# run is said to be bound by the other side
+BOUND_FRACTION = 0.5
+
+# The metrics of the main process
+_main_metrics = None
+
+
+def get_batch_bin(nr_variants):
+    """Get the histogram bin of a batch size, the bins are powers of two
+
+    Args:
+        nr_variants (int): The number of variants of a batch
+
+    Returns:
+        bin (str): Like '1', '2-3' or '4-7'
+    """
+    lower = 1 << (max(nr_variants, 1).bit_length() - 1)
+    upper = 2 * lower - 1
+    if lower == upper:
+        return str(lower)
+    return "{0}-{1}".format(lower, upper)
+
+
+def get_queue_size(queue):
+    """Get the approximate size of a multiprocessing queue, None if unknown"""
+    try:
+        return queue.qsize()
+    except NotImplementedError:
+        # qsize is not implemented on mac os
+        return None
+
+
+class Metrics(object):
+    """The metrics of one process
+
+    Args:
+        name (str): The name of the process
+    """
+
+    def __init__(self, name):
+        super(Metrics, self).__init__()
+        self.name = name
+        self.start = time.perf_counter()
+        # The seconds and number of calls of each stage
+        self.stages = {}
+        self.batch_sizes = {}
+        self.nr_of_batches = 0
+        self.nr_of_variants = 0
+        self.samples = []
+        self.last_sample = None
+
+    @contextmanager
+    def timer(self, stage):
+        """Add the time of a block to a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - start)
+
+    def iterate(self, stage, iterable):
+        """Iterate over an iterable and add the time of each next to a stage"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add_time(stage, time.perf_counter() - start)
+            yield item
+
+    def add_time(self, stage, seconds):
+        """Add seconds to a stage"""
+        stage_time = self.stages.get(stage)
+        if stage_time is None:
+            stage_time = self.stages[stage] = [0.0, 0]
+        stage_time[0] += seconds
+        stage_time[1] += 1
+
+    def add_batch(self, nr_variants):
+        """Count a batch and add its size to the histogram"""
+        self.nr_of_batches += 1
+        self.nr_of_variants += nr_variants
+        batch_bin = get_batch_bin(nr_variants)
+        self.batch_sizes[batch_bin] = self.batch_sizes.get(batch_bin, 0) + 1
+
+    def sample(self, nr_printed=None, force=False, **queues):
+        """Sample the queue depths and the throughput
+
+        A sample is taken at most once every SAMPLE_INTERVAL seconds.
+
+        Args:
+            nr_printed (int): The number of variants that are printed
+            force (bool): If a sample should be taken even if the last sample
+                          is recent
+            **queues: The queues to sample, with their names as keys
+        """
+        now = time.perf_counter()
+        if not force and self.last_sample is not None:
+            if now - self.last_sample < SAMPLE_INTERVAL:
+                return
+        self.last_sample = now
+        sample = {
+            "time": round(now - self.start, 3),
+            "variants_read": self.nr_of_variants,
+            "variants_printed": nr_printed,
+        }
+        for queue_name, queue in queues.items():
+            sample["{0}_depth".format(queue_name)] = get_queue_size(queue)
+        # The waits up to the sample, to see when the process starts to wait
+        for stage, (seconds, _) in self.stages.items():
+            if stage.endswith("_wait"):
+                sample[stage] = round(seconds, 3)
+        self.samples.append(sample)
+
+    def to_dict(self):
+        """Get the metrics as a dictionary"""
+        elapsed = time.perf_counter() - self.start
+        stages = {
+            stage: {"seconds": round(seconds, 4), "calls": calls}
+            for stage, (seconds, calls) in self.stages.items()
+        }
+        wait_time = sum(
+            seconds for stage, (seconds, _) in self.stages.items() if stage.endswith("_wait")
+        )
+        metrics = {
+            "name": self.name,
+            "pid": os.getpid(),
+            "elapsed": round(elapsed, 3),
+            "stages": stages,
+            "wait_time": round(wait_time, 3),
+            "utilisation": round(1 - wait_time / elapsed, 3) if elapsed > 0 else None,
+            "nr_of_batches": self.nr_of_batches,
+            "nr_of_variants": self.nr_of_variants,
+        }
+        if self.batch_sizes:
+            metrics["batch_sizes"] = dict(
+                sorted(self.batch_sizes.items(), key=lambda item: int(item[0].split("-")[0]))
+            )
+        if self.samples:
+            metrics["samples"] = self.samples
+        return metrics
+
+    def dump(self):
+        """Write the metrics of a worker to the metrics directory"""
+        metrics_dir = os.environ.get(METRICS_DIR_VARIABLE)
+        if metrics_dir:
+            metrics_path = os.path.join(metrics_dir, "{0}-{1}.json".format(self.name, os.getpid()))
+            with open(metrics_path, "w") as metrics_file:
+                json.dump(self.to_dict(), metrics_file)
+
+
+class NullMetrics(object):
+    """Metrics that are not collected"""
+
+    def timer(self, stage):
+        return nullcontext()
+
+    def iterate(self, stage, iterable):
+        return iterable
+
+    def add_time(self, stage, seconds):
+        pass
+
+    def add_batch(self, nr_variants):
+        pass
+
+    def sample(self, nr_printed=None, force=False, **queues):
+        pass
+
+    def dump(self):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+
+
+def get_metrics():
+    """Get the metrics of the main process, NULL_METRICS if not collected"""
+    return _main_metrics or NULL_METRICS
+
+
+def get_worker_metrics(name):
+    """Get new metrics for a worker process, NULL_METRICS if not collected
+
+    Args:
+        name (str): The name of the worker
+    """
+    if os.environ.get(METRICS_DIR_VARIABLE):
+        return Metrics(name)
+    return NULL_METRICS
+
+
+def start_metrics(command):
+    """Start to collect metrics in the main process and the workers
+
+    Args:
+        command (str): The name of the command that is run
+
+    Returns:
+        metrics (Metrics): The metrics of the main process
+    """
+    global _main_metrics
+    os.environ[METRICS_DIR_VARIABLE] = tempfile.mkdtemp(prefix="genmod_metrics_")
+    _main_metrics = Metrics(command)
+    return _main_metrics
+
+
+def get_summary(main_metrics, worker_metrics):
+    """Summarise where the time of a run goes
+
+    Args:
+        main_metrics (dict): The metrics of the main process
+        worker_metrics (list): The metrics of the workers
+
+    Returns:
+        summary (dict): The throughput, the utilisation of the workers and if
+                        the run is bound by the main process or the workers
+    """
+    elapsed = main_metrics["elapsed"]
+    summary = {
+        "wall_time": elapsed,
+        "nr_of_variants": main_metrics["nr_of_variants"],
+        "variants_per_second": round(main_metrics["nr_of_variants"] / elapsed) if elapsed else None,
+        "nr_of_workers": len(worker_metrics),
+    }
+    if not worker_metrics:
+        return summary
+
+    utilisations = [worker["utilisation"] for worker in worker_metrics]
+    summary["worker_utilisation"] = round(sum(utilisations) / len(utilisations), 3)
+    put_wait = main_metrics["stages"].get("put_wait", {}).get("seconds", 0)
+    summary["main_put_wait_fraction"] = round(put_wait / elapsed, 3) if elapsed else None
+
+    summary["bound"] = None
+    if summary["worker_utilisation"] < 1 - BOUND_FRACTION:
+        summary["bound"] = "main process"
+    elif put_wait > BOUND_FRACTION * elapsed:
+        summary["bound"] = "workers"
+    return summary
+
+
+def stop_metrics(metrics, metrics_path):
+    """Wait for the workers and write the metrics of all processes
+
+    Args:
+        metrics (Metrics): The metrics of the main process
+        metrics_path (str): The path to the json file
+    """
+    global _main_metrics
+    _main_metrics = None
+    main_metrics = metrics.to_dict()
+    metrics_dir = os.environ.pop(METRICS_DIR_VARIABLE, None)
+
+    for process in multiprocessing.active_children():
+        process.join()
+
+    worker_metrics = []
+    if metrics_dir:
+        for worker_path in sorted(glob.glob(os.path.join(metrics_dir, "*.json"))):
+            with open(worker_path) as worker_file:
+                worker_metrics.append(json.load(worker_file))
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+
+    with open(metrics_path, "w") as metrics_file:
+        json.dump(
+            {
+                "command": metrics.name,
+                "summary": get_summary(main_metrics, worker_metrics),
+                "main": main_metrics,
+                "workers": worker_metrics,
+            },
+            metrics_file,
+            indent=2,
+        )
+        metrics_file.write("\n")
+    logger.info("Metrics written to {0}".format(metrics_path))
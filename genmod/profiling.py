@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+profiling.py
+
+Profile the main process and the worker processes of a command.
+
+With 'genmod --profile DIR' the main process is profiled with cProfile and
+the directory is passed on to the workers in the environment, so that it
+reaches the workers whether they are forked or spawned. The run method of
+each worker is decorated with profiled, that profiles the worker if the
+directory is set.
+
+Every process writes its own pstats file, named after the process, its pid
+and the id of the run. When the command is finished the main process waits
+for the workers, and merges the pstats files of the run in merged.pstats and
+a text summary in summary.txt. The profiles of earlier runs in the same
+directory are left out.
+"""
+
+from __future__ import print_function
+
+import cProfile
+import functools
+import glob
+import logging
+import multiprocessing
+import os
+import pstats
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# The environment variable that holds the profile directory
+PROFILE_DIR_VARIABLE = "GENMOD_PROFILE_DIR"
+
+# The environment variable that holds the id of the profiled run
+PROFILE_RUN_VARIABLE = "GENMOD_PROFILE_RUN"
+
+# The number of functions in the summary
+SUMMARY_LINES = 40
+
+# The profiler of the main process, forked workers inherit it enabled
+_main_profiler = None
+
+
+def get_profile_dir():
+    """Get the profile directory, None if the processes are not profiled"""
+    return os.environ.get(PROFILE_DIR_VARIABLE) or None
+
+
+def get_profile_run():
+    """Get the id of the profiled run, None if it is not set"""
+    return os.environ.get(PROFILE_RUN_VARIABLE) or None
+
+
+def get_profile_name(name, run_id=None):
+    """Get the file name of the profile of a process
+
+    Args:
+        name (str): The name of the process
+        run_id (str): The id of the run
+
+    Returns:
+        profile_name (str): Like <name>-<pid>-<run_id>.pstats
+    """
+    if run_id is None:
+        return "{0}-{1}.pstats".format(name, os.getpid())
+    return "{0}-{1}-{2}.pstats".format(name, os.getpid(), run_id)
+
+
+def dump_profile(profiler, profile_dir, name):
+    """Write the stats of a profiler to a pstats file
+
+    Args:
+        profiler (cProfile.Profile): A profiler that is disabled
+        profile_dir (str): The directory for the pstats files
+        name (str): The name of the process
+
+    Returns:
+        profile_path (str): The path to the pstats file
+    """
+    profile_path = os.path.join(profile_dir, get_profile_name(name, get_profile_run()))
+    profiler.dump_stats(profile_path)
+    return profile_path
+
+
+def profiled(run):
+    """Decorate the run method of a worker process to profile it
+
+    The worker is only profiled if a profile directory is set. The stats are
+    written when the method returns or fails.
+    """
+
+    @functools.wraps(run)
+    def profiled_run(self, *args, **kwargs):
+        profile_dir = get_profile_dir()
+        if not profile_dir:
+            return run(self, *args, **kwargs)
+
+        if _main_profiler is not None:
+            # Only one profiler can be active in a process
+            _main_profiler.disable()
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return run(self, *args, **kwargs)
+        finally:
+            profiler.disable()
+            dump_profile(profiler, profile_dir, self.name)
+
+    return profiled_run
+
+
+def start_profiling(profile_dir):
+    """Start to profile the main process and set the directory for the workers
+
+    Args:
+        profile_dir (str): The directory for the pstats files
+
+    Returns:
+        profiler (cProfile.Profile): The profiler of the main process
+    """
+    global _main_profiler
+    if not os.path.isdir(profile_dir):
+        os.makedirs(profile_dir)
+    os.environ[PROFILE_DIR_VARIABLE] = os.path.abspath(profile_dir)
+    os.environ[PROFILE_RUN_VARIABLE] = uuid.uuid4().hex[:8]
+    logger.info("Writing profiles to {0}".format(profile_dir))
+
+    _main_profiler = cProfile.Profile()
+    _main_profiler.enable()
+    return _main_profiler
+
+
+def stop_profiling(profiler, profile_dir):
+    """Stop to profile the main process and write the merged summary
+
+    Waits for the workers so that all pstats files are written.
+
+    Args:
+        profiler (cProfile.Profile): The profiler of the main process
+        profile_dir (str): The directory for the pstats files
+    """
+    global _main_profiler
+    profiler.disable()
+    _main_profiler = None
+    dump_profile(profiler, profile_dir, "main")
+    run_id = get_profile_run()
+    os.environ.pop(PROFILE_DIR_VARIABLE, None)
+    os.environ.pop(PROFILE_RUN_VARIABLE, None)
+
+    for process in multiprocessing.active_children():
+        process.join()
+
+    write_summary(profile_dir, run_id)
+
+
+def write_summary(profile_dir, run_id=None):
+    """Merge the pstats files of a directory and write a summary
+
+    Writes merged.pstats and summary.txt, with the time of each process and
+    the functions with the largest cumulative time over all processes.
+
+    Args:
+        profile_dir (str): The directory with the pstats files
+        run_id (str): Only merge the pstats files of this run, all files if
+                      None
+
+    Returns:
+        summary_path (str): The path to the summary
+    """
+    merged_path = os.path.join(profile_dir, "merged.pstats")
+    pattern = "*.pstats" if run_id is None else "*-{0}.pstats".format(run_id)
+    profile_paths = sorted(
+        path for path in glob.glob(os.path.join(profile_dir, pattern)) if path != merged_path
+    )
+    summary_path = os.path.join(profile_dir, "summary.txt")
+    if not profile_paths:
+        logger.warning("No profiles found in {0}".format(profile_dir))
+        return None
+
+    with open(summary_path, "w") as summary:
+        print("Processes:", file=summary)
+        for profile_path in profile_paths:
+            stats = pstats.Stats(profile_path)
+            print(
+                "  {0}: {1:.3f}s".format(os.path.basename(profile_path), stats.total_tt),
+                file=summary,
+            )
+        print(file=summary)
+
+        stats = pstats.Stats(*profile_paths, stream=summary)
+        stats.dump_stats(merged_path)
+        stats.sort_stats("cumulative").print_stats(SUMMARY_LINES)
+
+    logger.info("Profile summary written to {0}".format(summary_path))
+    return summary_path
@@ -1,19 +1,22 @@
 from __future__ import absolute_import
 
 from .check_plugins import check_plugins
-from .compound_scorer import CompoundScorer
+from .compound_scorer import CompoundScorer, get_compound_models, score_compound_batch
 from .config_parser import ConfigParser
 from .rank_score_variant_definitions import RANK_SCORE_TYPE_NAMES, RANK_SCORE_TYPES
 from .score_function import ScoreFunction
-from .score_variant import as_normalized_max_min, get_category_score
+from .score_variant import add_rank_score, as_normalized_max_min, get_category_score
 
 __all__ = [
     "check_plugins",
     "CompoundScorer",
+    "get_compound_models",
+    "score_compound_batch",
     "ConfigParser",
     "RANK_SCORE_TYPE_NAMES",
     "RANK_SCORE_TYPES",
     "ScoreFunction",
+    "add_rank_score",
     "as_normalized_max_min",
     "get_category_score",
 ]
@@ -3,8 +3,9 @@
 """
 variant_consumer.py
 
-Consumes batches of variants and annotates them. Each batch is a dictionary
-with variant_id:s as keys and dictionaries with variant information.
+Consumes batches of variants and annotates them. Each batch is a block of raw
+vcf lines, see genmod/utils/line_batches.py, that is parsed into a list of
+variant dictionaries, in the order of the lines.
 The variants will get different annotations depending on input
 
 Created by Måns Magnusson on 2013-03-01.
@@ -14,10 +15,14 @@ Copyright (c) 2013 __MyCompanyName__. All rights reserved.
 from __future__ import division, print_function
 
 import logging
+import time
 import traceback
 from multiprocessing import Process
 from typing import Dict, List, Tuple, Union
 
+from genmod.memory_report import memory_traced
+from genmod.metrics import get_worker_metrics
+from genmod.profiling import profiled
 from genmod.score_variants.cap_rank_score_to_min_bound import cap_rank_score_to_min_bound
 from genmod.score_variants.rank_score_variant_definitions import RANK_SCORE_TYPE_NAMES
 from genmod.score_variants.score_variant import (
@@ -25,7 +30,15 @@ from genmod.score_variants.score_variant import (
     MIN_SCORE_NORMALIZED,
     as_normalized_max_min,
 )
-from genmod.vcf_tools import add_vcf_info, replace_vcf_info
+from genmod.utils.batch_tracer import get_scored_batch_trace
+from genmod.utils.line_batches import pack_lines, read_task
+from genmod.vcf_tools import (
+    InfoView,
+    get_variant_dict,
+    get_variant_id,
+    set_vcf_info,
+    update_vcf_info,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -95,24 +108,232 @@ def get_rank_score_as_magnitude(
     raise ValueError(f"Unknown rank score type {rank_score_type}")
 
 
+def get_compound_models(individuals):
+    """Get the models that are penalised when the compounds have low scores
+
+    Args:
+        individuals (list): The individuals of the vcf
+
+    Returns:
+        models (list): AR_comp and AR_comp_dn, and AD and AD_dn for single
+                       individuals
+    """
+    if len(individuals) == 1:
+        return ["AR_comp", "AR_comp_dn", "AD", "AD_dn"]
+    return ["AR_comp", "AR_comp_dn"]
+
+
+def get_rankscore_normalization_bounds(variants: List[Dict]) -> List[Tuple]:
+    """
+    For all variants in a variant batch, find the rank score normalization
+    min-max bounds.
+
+    Returns:
+        A list containing tuple min-max, in the order of the variants
+    """
+    variant_rankscore_normalization_bounds: list = []
+    for variant in variants:
+        entry_minmax: List[str] = variant["info_dict"]["RankScoreMinMax"].split(":")
+        rankscore_normalization_min_max: tuple = (
+            float(entry_minmax[1]),
+            float(entry_minmax[2]),
+        )
+        if not rankscore_normalization_min_max[0] <= rankscore_normalization_min_max[1]:
+            raise ValueError(
+                f"Invalid min-max normalization value expected MIN-MAX \
+            {rankscore_normalization_min_max}"
+            )
+        variant_rankscore_normalization_bounds.append(rankscore_normalization_min_max)
+    return variant_rankscore_normalization_bounds
+
+
+def score_compound_batch(variants, models, threshold, penalty):
+    """Score the compounds of the variants in a batch
+
+    The rank scores and the compound annotations are set in the info_dict of
+    the variants, see set_vcf_info. Every variant is scored, also a record
+    with the same variant id as an earlier record of the batch.
+
+    Args:
+        variants (list): Variant dictionaries, with info_dict and variant_id,
+                         in the order of the batch
+        models (list): The models that are penalised, see get_compound_models
+        threshold (int): Threshold for the penalty if no compound has a
+                         passing score
+        penalty (int): Penalty applied together with threshold
+    """
+    # Inside the batch a variant is known by an integer handle, its position
+    # in the batch. The rank scores are lists indexed by handle and the
+    # compounds are looked up as the handle of the first variant with the
+    # compound id, the variant ids are only used to write the scored compounds.
+    handles = {}
+    for handle, variant in enumerate(variants):
+        handles.setdefault(variant["variant_id"], handle)
+
+    # This is a dictionary on the form {rank_score_type: [rank_score]}
+    rank_scores = {}
+    for rank_score_type in RANK_SCORE_TYPE_NAMES:
+        # Prepare rank_scores to contain raw RankScore and RankScoreNormalized compound scores
+        type_rank_scores = rank_scores[rank_score_type] = []
+
+        for variant in variants:
+            rank_score_entry = variant["info_dict"].get(f"{rank_score_type}", "")
+
+            # This entry looks like <family_id>:<rank_score>, <family_id>:<rank_score>
+            # TODO check if correct family id
+            # Right now we assume that there is only one family in the vcf
+            rank_score = float(rank_score_entry.split(",")[-1].split(":")[-1])
+            type_rank_scores.append(rank_score)
+
+    # Per variant, find rank score max min values used for normalization
+    variant_rankscore_normalization_bounds: List[Tuple] = get_rankscore_normalization_bounds(
+        variants
+    )
+
+    # We now have a list of rank scores per rank_score_type
+    for handle, variant in enumerate(variants):
+        # If the variants only follow AR_comp (and AD for single individual families)
+        # we want to pennalise the score if the compounds have low scores
+        raw_compounds = variant["info_dict"].get("Compounds", None)
+        if not raw_compounds:
+            continue
+
+        variant_id = variant["variant_id"]
+        logger.debug("Scoring compound for variant %s" % variant_id)
+        min_rank_score_value, max_rank_score_value = variant_rankscore_normalization_bounds[handle]
+        # Variable to see if we should correct the rank score
+        correct_score = True
+        # First we check if the rank score should be corrected:
+        for family in variant["info_dict"].get("GeneticModels", "").split(","):
+            for model in family.split(":")[-1].split("|"):
+                # If the variant follows any model more than the specified it should
+                # not be corrected
+                if model not in models:
+                    correct_score = False
+
+        logger.debug("Setting correct_score to {0}".format(correct_score))
+
+        # One entry per family, splitted on ','
+        # family_id and compounds splitted with ':'
+        # list of compounds splitted on '|'
+
+        # TODO Only checks first family now
+        family_compound_entry = raw_compounds.split(",")[0]
+        splitted_entry = family_compound_entry.split(":")
+        compound_family_id = splitted_entry[0]
+        compound_list = splitted_entry[-1].split("|")
+        compound_handles = [handles[compound_id] for compound_id in compound_list]
+
+        logger.debug("Checking compounds for family {0}".format(compound_family_id))
+
+        for rank_score_type in RANK_SCORE_TYPE_NAMES:
+            type_rank_scores = rank_scores[rank_score_type]
+            current_rank_score = type_rank_scores[handle]
+
+            logger.debug("Current rank score is {0}".format(current_rank_score))
+
+            # Check if the compounds are only low scored
+            low_rank_score = get_rank_score(
+                rank_score_type=rank_score_type,
+                threshold=threshold,
+                min_rank_score_value=min_rank_score_value,
+                max_rank_score_value=max_rank_score_value,
+            )
+            only_low = all(
+                type_rank_scores[compound_handle] <= low_rank_score
+                for compound_handle in compound_handles
+            )
+            logger.debug("Setting only_low to {0}".format(only_low))
+
+            if correct_score and only_low:
+                logger.debug("correcting rank score for {0}".format(variant_id))
+                current_rank_score -= get_rank_score_as_magnitude(
+                    rank_score_type=rank_score_type,
+                    rank_score=penalty,
+                    min_rank_score_value=min_rank_score_value,
+                    max_rank_score_value=max_rank_score_value,
+                )
+                # In case the current_rank_score falls outside normalization bounds after modification,
+                # cap it to within the MIN normalization bound.
+                current_rank_score = cap_rank_score_to_min_bound(
+                    rank_score_type=rank_score_type,
+                    rank_score=current_rank_score,
+                    min_rank_score_value=min_rank_score_value,
+                )
+
+            scored_compound_list = []
+            for compound_id, compound_handle in zip(compound_list, compound_handles):
+                # This is the combined score for current variant and
+                # its compound:
+                compound_score = current_rank_score + type_rank_scores[compound_handle]
+                # This is the new compound
+                new_compound = "{0}>{1}".format(compound_id, compound_score)
+                scored_compound_list.append(new_compound)
+
+            # Sort compound variants lexicographically
+            scored_compound_list.sort()
+            new_compound_string = "{0}:{1}".format(
+                compound_family_id, "|".join(scored_compound_list)
+            )
+
+            current_rank_score = float(current_rank_score)  # Export rank score as float type
+            new_rank_score_string = "{0}:{1}".format(compound_family_id, current_rank_score)
+
+            variant = set_vcf_info(
+                keyword=f"{rank_score_type}",
+                annotation=new_rank_score_string,
+                variant_dict=variant,
+            )
+
+            # CompoundsNormalized is not previously added to VCF, it is
+            # added at the end of the INFO field
+            keyword_compounds = f"Compounds{rank_score_type.strip('RankScore')}"
+            variant = set_vcf_info(
+                keyword=keyword_compounds,
+                annotation=new_compound_string,
+                variant_dict=variant,
+            )
+
+
 class CompoundScorer(Process):
     """
     Annotates variant in batches from the task queue and puts the result in
     the results queue.
     """
 
-    def __init__(self, task_queue, results_queue, individuals, threshold: int, penalty: int):
+    def __init__(
+        self,
+        task_queue,
+        results_queue,
+        individuals,
+        header_line,
+        threshold: int,
+        penalty: int,
+        batch_tracer=None,
+        vep=False,
+        vep_header=None,
+    ):
         """
-        Initialize the VariantAnnotator
+        Initialize the CompoundScorer
 
-        Consume variant batches from the task queue, annotate them with the
-        genetic inheritance patterns that they follow and put them in the
-        results queue.
+        Consume variant batches from the task queue, score the compounds of
+        the variants and put them in the results queue.
+
+        A task is made with make_task, a chunk of batches with one variant
+        is scored one variant at a time. The result is a tuple with the batch
+        number and a block with the new INFO fields, in the same order as the
+        variant lines.
 
         Arguments:
             task_queue (Queue)
             results_queue (Queue)
             individuals (list)
+            header_line (list): The header columns of the vcf
+            batch_tracer (BatchTracer): Keeps the slowest batches, None if
+                                        the batches are not traced
+            vep (bool): If the features of the traced batches are in the CSQ
+                        field
+            vep_header (list): The vep columns of the CSQ field
         """
         Process.__init__(self)
 
@@ -128,229 +349,84 @@ class CompoundScorer(Process):
 
         logger.debug("Setting up individuals")
         self.individuals = individuals
+        self.header_line = header_line
 
         self.threshold = threshold
         self.penalty = penalty
 
-        if len(self.individuals) == 1:
-            self.models = ["AR_comp", "AR_comp_dn", "AD", "AD_dn"]
-        else:
-            self.models = ["AR_comp", "AR_comp_dn"]
-
-    @staticmethod
-    def _get_rankscore_normalization_bounds(variant_batch: Dict[str, Dict]) -> Dict[str, Tuple]:
-        """
-        For all variants in a variant batch, find the rank score normalization
-        min-max bounds.
-
-        Returns:
-            A dict containing tuple min-max keyed on variant id
-        """
-        variant_rankscore_normalization_bounds: dict = {}
-        for variant_id in variant_batch:
-            entry_minmax: List[str] = variant_batch[variant_id]["info_dict"][
-                "RankScoreMinMax"
-            ].split(":")
-            rankscore_normalization_min_max: tuple = (
-                float(entry_minmax[1]),
-                float(entry_minmax[2]),
-            )
-            if not rankscore_normalization_min_max[0] <= rankscore_normalization_min_max[1]:
-                raise ValueError(
-                    f"Invalid min-max normalization value expected MIN-MAX \
-                {rankscore_normalization_min_max}"
-                )
-            if variant_id in variant_rankscore_normalization_bounds.keys():
-                raise KeyError(
-                    f"Cannot add variant ID to normalization data dict since it's already present \
-                               {variant_id}, {variant_rankscore_normalization_bounds}"
-                )
-            variant_rankscore_normalization_bounds.update(
-                {variant_id: rankscore_normalization_min_max}
-            )
-        return variant_rankscore_normalization_bounds
+        self.models = get_compound_models(self.individuals)
+        self.batch_tracer = batch_tracer
+        self.vep = vep
+        self.vep_header = vep_header
 
     def _run(self):
         """Run the consuming"""
         logger.info("%s: Starting!" % self.proc_name)
+        metrics = get_worker_metrics(self.name)
         # Check if there are any batches in the queue
         while True:
-            # A batch is a dictionary with varints on the form {variant_id:variant_dict}
             logger.debug("Getting task from task_queue")
-            variant_batch = self.task_queue.get()
+            with metrics.timer("task_wait"):
+                task = self.task_queue.get()
 
-            if variant_batch is None:
+            if task is None:
                 logger.info("No more batches")
                 self.task_queue.task_done()
+                metrics.dump()
+                if self.batch_tracer is not None:
+                    self.batch_tracer.send(self.name)
                 logger.info("{0}: Exiting".format(self.proc_name))
                 break
 
-            # We need to save the compound scores in a dict and group them by family
-            # This is a dictionary on the form {'variant_id: rank_score}
-            rank_scores = {}
-            # We are now going to score the compounds
-            for rank_score_type in RANK_SCORE_TYPE_NAMES:
-                # Prepare rank_scores dict to contain raw RankScore and RankScoreNormalized compound scores
-                rank_scores.update({rank_score_type: dict()})
-
-                for variant_id in variant_batch:
-                    # First we store the scores for each variant in a dictionary
-                    variant = variant_batch[variant_id]
-                    rank_score_entry = variant["info_dict"].get(f"{rank_score_type}", "")
-
-                    # We need to loop through the families
-                    # This entry looks like <family_id>:<rank_score>, <family_id>:<rank_score>
-                    for family_rank_score in rank_score_entry.split(","):
-                        family_rank_score = family_rank_score.split(":")
-
-                        # TODO check if correct family id
-                        # Right now we assume that there is only one family in the vcf
-                        rank_score = float(family_rank_score[-1])
-
-                        rank_scores[rank_score_type][variant_id] = rank_score
-
-            # Per variant, find rank score max min values used for normalization
-            variant_rankscore_normalization_bounds: Dict[str, Tuple] = (
-                self._get_rankscore_normalization_bounds(variant_batch)
-            )
-
-            # We now have a dictionary with variant ids and rank scores, per rank_score_type
-            for variant_id in variant_batch:
-                # If the variants only follow AR_comp (and AD for single individual families)
-                # we want to pennalise the score if the compounds have low scores
-                variant = variant_batch[variant_id]
-                raw_compounds = variant["info_dict"].get("Compounds", None)
-                for rank_score_type in RANK_SCORE_TYPE_NAMES:
-                    if raw_compounds:
-                        logger.debug("Scoring compound for variant %s" % variant_id)
-                        # Variable to see if we should correct the rank score
-                        correct_score = True
-                        # First we check if the rank score should be corrected:
-                        for family in variant["info_dict"].get("GeneticModels", "").split(","):
-                            for model in family.split(":")[-1].split("|"):
-                                # If the variant follows any model more than the specified it should
-                                # not be corrected
-                                if model not in self.models:
-                                    correct_score = False
-
-                        logger.debug("Setting correct_score to {0}".format(correct_score))
-
-                        current_rank_score = rank_scores[rank_score_type][variant_id]
-
-                        logger.debug("Current rank score is {0}".format(current_rank_score))
-
-                        scored_compound_list = []
-                        only_low = True
-
-                        # One entry per family, splitted on ','
-                        # family_id and compounds splitted with ':'
-                        # list of compounds splitted on '|'
-
-                        # TODO Only checks first family now
-                        family_compound_entry = raw_compounds.split(",")[0]
-                        splitted_entry = family_compound_entry.split(":")
-                        compound_family_id = splitted_entry[0]
-                        compound_list = splitted_entry[-1].split("|")
-
-                        logger.debug("Checking compounds for family {0}".format(compound_family_id))
-
-                        # Loop through compounds to check if they are only low scored
-                        for compound_id in compound_list:
-                            compound_rank_score = rank_scores[rank_score_type][compound_id]
-                            if compound_rank_score > get_rank_score(
-                                rank_score_type=rank_score_type,
-                                threshold=self.threshold,
-                                min_rank_score_value=variant_rankscore_normalization_bounds[
-                                    variant_id
-                                ][0],
-                                max_rank_score_value=variant_rankscore_normalization_bounds[
-                                    variant_id
-                                ][1],
-                            ):
-                                only_low = False
-                        logger.debug("Setting only_low to {0}".format(only_low))
-
-                        if correct_score and only_low:
-                            logger.debug("correcting rank score for {0}".format(variant_id))
-                            current_rank_score -= get_rank_score_as_magnitude(
-                                rank_score_type=rank_score_type,
-                                rank_score=self.penalty,
-                                min_rank_score_value=variant_rankscore_normalization_bounds[
-                                    variant_id
-                                ][0],
-                                max_rank_score_value=variant_rankscore_normalization_bounds[
-                                    variant_id
-                                ][1],
-                            )
-                            # In case the current_rank_score falls outside normalization bounds after modification,
-                            # cap it to within the MIN normalization bound.
-                            current_rank_score = cap_rank_score_to_min_bound(
-                                rank_score_type=rank_score_type,
-                                rank_score=current_rank_score,
-                                min_rank_score_value=variant_rankscore_normalization_bounds[
-                                    variant_id
-                                ][0],
-                            )
-
-                        for compound_id in compound_list:
-                            logger.debug("Checking compound {0}".format(compound_id))
-                            compound_rank_score = rank_scores[rank_score_type][compound_id]
-                            # This is the combined score for current variant and
-                            # its compound:
-                            compound_score = current_rank_score + compound_rank_score
-                            # This is the new compound
-                            new_compound = "{0}>{1}".format(compound_id, compound_score)
-                            scored_compound_list.append(new_compound)
-
-                        # Sort compound variants lexicographically
-                        scored_compound_list.sort()
-                        new_compound_string = "{0}:{1}".format(
-                            compound_family_id, "|".join(scored_compound_list)
+            batch_number, variant_lines, _, _, singletons = read_task(task)
+            metrics.add_batch(len(variant_lines))
+            start_time = time.perf_counter()
+            # Keep the variants in the order of the lines, the INFO fields are
+            # sent back in the same order
+            variants = []
+            with metrics.timer("parse"):
+                for variant_line in variant_lines:
+                    variant = get_variant_dict(variant_line, self.header_line)
+                    variant["info_dict"] = InfoView(variant["INFO"])
+                    variant["variant_id"] = get_variant_id(variant)
+                    variants.append(variant)
+
+            # Each singleton of a chunk is scored as its own batch
+            batches = [variants] if not singletons else [[variant] for variant in variants]
+            with metrics.timer("compound"):
+                for batch in batches:
+                    score_compound_batch(
+                        variants=batch,
+                        models=self.models,
+                        threshold=self.threshold,
+                        penalty=self.penalty,
+                    )
+
+            if self.batch_tracer is not None and not singletons:
+                seconds = time.perf_counter() - start_time
+                if self.batch_tracer.is_slow(seconds):
+                    self.batch_tracer.add_trace(
+                        get_scored_batch_trace(
+                            seconds,
+                            variant_lines,
+                            variants,
+                            vep=self.vep,
+                            vep_header=self.vep_header,
                         )
+                    )
 
-                        current_rank_score = float(
-                            current_rank_score
-                        )  # Export rank score as float type
-                        new_rank_score_string = "{0}:{1}".format(
-                            compound_family_id, current_rank_score
-                        )
-
-                        # variant['info_dict']['IndividualRankScore'] = current_rank_score_string
-                        variant["info_dict"][f"{rank_score_type}"] = new_rank_score_string
-                        variant["info_dict"][f"Compounds{rank_score_type.strip('RankScore')}"] = (
-                            new_compound_string
-                        )
-
-                        variant = replace_vcf_info(
-                            keyword=f"{rank_score_type}",
-                            annotation=new_rank_score_string,
-                            variant_dict=variant,
-                        )
-
-                        # CompoundsNormalized is not previously added to VCF.
-                        # For this case, perform an VCF INFO ADD operation, rather than a REPLACE
-                        keyword_compounds = f"Compounds{rank_score_type.strip('RankScore')}"
-                        fn_add_replace_vcf_info = replace_vcf_info
-                        if not (
-                            keyword_compounds in variant["INFO"]
-                            and keyword_compounds in variant["info_dict"]
-                        ):
-                            # In case INFO subfield is not previously added to VCF,
-                            # there's a need to do so now.
-                            fn_add_replace_vcf_info = add_vcf_info
-                        variant = fn_add_replace_vcf_info(
-                            keyword=keyword_compounds,
-                            annotation=new_compound_string,
-                            variant_dict=variant,
-                        )
-                logger.debug("Putting variant in results_queue")
-
-                self.results_queue.put(variant)
+            logger.debug("Putting batch {0} in results_queue".format(batch_number))
+            with metrics.timer("put_result"):
+                self.results_queue.put(
+                    (batch_number, pack_lines([update_vcf_info(variant) for variant in variants]))
+                )
 
             self.task_queue.task_done()
 
         return
 
+    @profiled
+    @memory_traced
     def run(self, *args, **kwargs):
         # Wrapper for catching errors in main method
         try:
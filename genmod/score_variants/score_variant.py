@@ -6,14 +6,53 @@ Score a variant line based on the score functions in config_parser
 import logging
 from typing import Any, List, Tuple
 
+from genmod.vcf_tools import set_vcf_info
+
 logger = logging.getLogger(__name__)
 
 MIN_SCORE_NORMALIZED: float = 0.0
 MAX_SCORE_NORMALIZED: float = 1.0
 
 
+def get_csq_plugin_value(plugin, variant, csq_columns):
+    """Return the value of a plugin that reads a column of the CSQ field
+
+    Only the column of the plugin is taken out of each CSQ annotation, with
+    csq_columns, and the plugin gets the value from a CSQ field with just
+    that column. This gives the same value as the whole CSQ field without
+    splitting every column of every annotation.
+
+    Args:
+        plugin (Plugin): A plugin with info_key CSQ
+        variant (dict): A variant dictionary
+        csq_columns (CsqColumns): The columns of the CSQ field
+    Returns:
+        value: The value of the plugin
+    """
+    csq_string = variant["info_dict"].get("CSQ")
+    if csq_string:
+        column = csq_columns.get_column(csq_string, plugin.csq_key)
+        csq_string = ",".join(value or "" for value in column)
+    return plugin.get_value(
+        variant_dict={"info_dict": {"CSQ": csq_string}}, csq_format=[plugin.csq_key]
+    )
+
+
+def use_csq_columns(plugin, csq_columns):
+    """Check if the value of a plugin can be read with csq_columns
+
+    Flags and string rules look at the whole CSQ field, so they are read by
+    the plugin as before.
+    """
+    if csq_columns is None or plugin.field != "INFO" or plugin.info_key != "CSQ":
+        return False
+    if plugin.csq_key not in csq_columns or plugin.dict_entry:
+        return False
+    return plugin.data_type != "flag" and not (plugin.record_rule and plugin.data_type == "string")
+
+
 def get_plugin_score(
-    variant, plugin_name, config_parser, csq_format=None
+    variant, plugin_name, config_parser, csq_format=None, csq_columns=None
 ) -> Tuple[Any, float, float]:
     """Return the score found for a plugin
 
@@ -21,6 +60,9 @@ def get_plugin_score(
         variant (dict): A variant dictionary
         plugin_name (str): A plugin name
         config_parser (ConfigParser): A config parser object with score functions
+        csq_format (list): The vep columns of the CSQ field
+        csq_columns (CsqColumns): The columns of the CSQ field, see
+                                  get_csq_plugin_value
     Returns:
         category_score (float): The rank score for this variant
 
@@ -31,7 +73,10 @@ def get_plugin_score(
     # This is the score function for this plugin
     score_function = config_parser.score_functions[plugin_name]
 
-    value = plugin.get_value(variant_dict=variant, csq_format=csq_format)
+    if use_csq_columns(plugin, csq_columns):
+        value = get_csq_plugin_value(plugin, variant, csq_columns)
+    else:
+        value = plugin.get_value(variant_dict=variant, csq_format=csq_format)
     logger.debug("Found value {0} for plugin {1}".format(value, plugin_name))
 
     # Score is allways a number
@@ -48,7 +93,7 @@ def get_plugin_score(
 
 
 def get_category_score(
-    variant, category, config_parser, csq_format=None
+    variant, category, config_parser, csq_format=None, csq_columns=None
 ) -> Tuple[int, float, float]:
     """Return the score for a given category.
 
@@ -60,6 +105,8 @@ def get_category_score(
          variant (dict): A variant dictionary
          category (str): A score category
          config_parser (ConfigParser): A config parser object with score functions
+         csq_format (list): The vep columns of the CSQ field
+         csq_columns (CsqColumns): The columns of the CSQ field
      Returns:
          category_score, sum of min and max scores for this category
     """
@@ -79,6 +126,7 @@ def get_category_score(
             plugin_name=plugin_name,
             config_parser=config_parser,
             csq_format=csq_format,
+            csq_columns=csq_columns,
         )
         category_scores.append(plugin_score)
         # Add the maximal and minimal score points that can be provided for this category
@@ -153,3 +201,78 @@ def as_normalized_max_min(score: float, min_score_value: float, max_score_value:
             score_normalized,
         )
     return score_normalized
+
+
+def add_rank_score(
+    variant,
+    config_parser,
+    score_categories,
+    family_id,
+    csq_format=None,
+    rank_results=False,
+    csq_columns=None,
+) -> dict:
+    """Score a variant and add the rank scores to it
+
+    The scores are set in the info_dict of the variant, see set_vcf_info, so
+    that the variant can be scored for compounds without being parsed again.
+    The INFO field is written with update_vcf_info.
+
+    Args:
+        variant (dict): A variant dictionary with info_dict
+        config_parser (ConfigParser): A config parser object with score functions
+        score_categories (list): The categories to score
+        family_id (str): The family id used in the annotations
+        csq_format (list): The vep columns of the CSQ field
+        rank_results (bool): If the category scores should be added as RankResult
+        csq_columns (CsqColumns): The columns of the CSQ field, the CSQ
+                                  plugins only read their own column with it
+    Returns:
+        variant (dict): The scored variant
+    """
+    rank_score = 0
+    # This is for printing results to vcf:
+    category_scores = []
+    # Keep track for per-category min max scores for normalization purposes
+    category_scores_max: float = 0.0
+    category_scores_min: float = 0.0
+    for category in score_categories:
+        category_score, category_score_min, category_score_max = get_category_score(
+            variant=variant,
+            category=category,
+            config_parser=config_parser,
+            csq_format=csq_format,
+            csq_columns=csq_columns,
+        )
+        logger.debug("Adding category score {0} to rank_score".format(category_score))
+        rank_score += category_score
+        logger.debug("Updating rank score to {0}".format(rank_score))
+        category_scores_min += category_score_min
+        category_scores_max += category_score_max
+
+        category_scores.append(str(category_score))
+
+    rank_score = float(rank_score)  # Export rank score as float type
+
+    # Normalize ranks score (across all categories)
+    rank_score_normalized: float = as_normalized_max_min(
+        score=float(rank_score),
+        min_score_value=category_scores_min,
+        max_score_value=category_scores_max,
+    )
+
+    annotations = [
+        ("RankScore", "{0}:{1}".format(family_id, rank_score)),
+        ("RankScoreNormalized", "{0}:{1}".format(family_id, rank_score_normalized)),
+        (
+            "RankScoreMinMax",
+            "{0}:{1}:{2}".format(family_id, category_scores_min, category_scores_max),
+        ),
+    ]
+    if rank_results:
+        annotations.append(("RankResult", "|".join(category_scores)))
+
+    for keyword, annotation in annotations:
+        variant = set_vcf_info(keyword=keyword, annotation=annotation, variant_dict=variant)
+
+    return variant
@@ -1,12 +1,42 @@
 # -*- coding: utf-8 -*-
 
+from .batch_tracer import (
+    BatchTracer,
+    format_batch_traces,
+    get_annotated_batch_trace,
+    get_scored_batch_trace,
+    merge_batch_traces,
+)
 from .check_individuals import check_individuals
-from .get_batches import get_batches
-from .get_features import INTERESTING_SO_TERMS, check_vep_annotation, get_annotation
+from .get_batches import generate_batches, get_batches, split_batch
+from .get_features import (
+    INTERESTING_SO_TERMS,
+    check_vep_annotation,
+    get_annotation,
+    get_line_annotation,
+    get_vep_annotation,
+)
 from .get_priority import get_chromosome_priority, get_rank_score
 from .is_number import is_number
+from .line_batches import (
+    SINGLETON_CHUNK_SIZE,
+    coalesce_batches,
+    get_result,
+    make_task,
+    pack_lines,
+    read_task,
+    splice_info,
+    unpack_lines,
+)
 from .pair_generator import generate_pairs
-from .variant_printer import VariantPrinter
+from .region_shards import (
+    check_indexed,
+    generate_shard_lines,
+    get_contig_lengths,
+    get_index_contigs,
+    get_shards,
+)
+from .variant_printer import MEMORY_BUDGET, BatchPrinter, ShardPrinter, VariantPrinter
 
 EXONIC_SO_TERMS = {
     "transcript_ablation",
@@ -30,14 +60,39 @@ EXONIC_SO_TERMS = {
 }
 
 __all__ = [
+    "BatchTracer",
+    "format_batch_traces",
+    "get_annotated_batch_trace",
+    "get_scored_batch_trace",
+    "merge_batch_traces",
     "check_individuals",
+    "generate_batches",
     "get_batches",
+    "split_batch",
     "check_vep_annotation",
     "get_annotation",
+    "get_line_annotation",
+    "get_vep_annotation",
     "get_chromosome_priority",
     "get_rank_score",
     "is_number",
+    "SINGLETON_CHUNK_SIZE",
+    "coalesce_batches",
+    "get_result",
+    "make_task",
+    "pack_lines",
+    "read_task",
+    "splice_info",
+    "unpack_lines",
     "generate_pairs",
+    "check_indexed",
+    "generate_shard_lines",
+    "get_contig_lengths",
+    "get_index_contigs",
+    "get_shards",
+    "MEMORY_BUDGET",
+    "BatchPrinter",
+    "ShardPrinter",
     "VariantPrinter",
     "INTERESTING_SO_TERMS",
     "EXONIC_SO_TERMS",
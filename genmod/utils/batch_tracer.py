@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+batch_tracer.py
+
+Find the slowest batches of a run.
+
+A batch holds all variants of one or several overlapping features, so a few
+genes with many variants can take most of the time of a whole genome run.
+With a BatchTracer each worker times its batches and keeps a trace of the
+slowest ones, with the features, the number of variants, the number of
+compound candidates, the number of candidate pairs that were checked and the
+number of compound pairs of the batch. When the worker is finished it sends
+its traces to the main process, that merges the traces of all workers and
+reports the slowest batches of the run.
+
+The chunks of batches with one variant, see coalesce_batches, are not traced
+since they do not belong to any feature.
+"""
+
+from __future__ import print_function
+
+import heapq
+import itertools
+import logging
+
+from genmod.vcf_tools import CsqColumns
+
+from .get_features import get_line_annotation
+
+logger = logging.getLogger(__name__)
+
+# The number of features that are shown for a batch in the report
+REPORT_FEATURES = 5
+
+
+class BatchTracer(object):
+    """
+    Keep the traces of the slowest batches of a worker.
+
+    The tracer is made by the main process and given to the workers, each
+    worker fills its own copy and sends it back with send.
+
+    Args:
+        nr_of_batches (int): How many of the slowest batches to keep, at
+                             least 1
+        trace_queue (Queue): The queue that the traces are sent back in
+
+    Raises:
+        ValueError: If nr_of_batches is smaller than 1
+    """
+
+    def __init__(self, nr_of_batches, trace_queue):
+        super(BatchTracer, self).__init__()
+        if nr_of_batches < 1:
+            raise ValueError(
+                "The number of slow batches has to be at least 1, not {0}".format(nr_of_batches)
+            )
+        self.nr_of_batches = nr_of_batches
+        self.trace_queue = trace_queue
+        # A min heap on the time, the fastest of the kept batches is first
+        self.traces = []
+        self.counter = itertools.count()
+
+    def is_slow(self, seconds):
+        """Check if a batch is slow enough to be kept"""
+        if len(self.traces) < self.nr_of_batches:
+            return True
+        return seconds > self.traces[0][0]
+
+    def add_trace(self, trace):
+        """Keep the trace of a batch if it is one of the slowest
+
+        Args:
+            trace (dict): The trace of a batch, with the time in 'seconds'
+        """
+        item = (trace["seconds"], next(self.counter), trace)
+        if len(self.traces) < self.nr_of_batches:
+            heapq.heappush(self.traces, item)
+        elif trace["seconds"] > self.traces[0][0]:
+            heapq.heapreplace(self.traces, item)
+
+    def get_traces(self):
+        """Get the kept traces, the slowest first"""
+        return [trace for _, _, trace in sorted(self.traces, reverse=True)]
+
+    def send(self, worker_name):
+        """Send the traces of a worker to the main process"""
+        traces = self.get_traces()
+        for trace in traces:
+            trace["worker"] = worker_name
+        self.trace_queue.put(traces)
+
+    def collect(self, nr_of_workers):
+        """Collect the traces that the workers sent and get the slowest
+
+        Args:
+            nr_of_workers (int): The number of workers that send traces
+
+        Returns:
+            traces (list): The traces of the slowest batches of all workers
+        """
+        worker_traces = [self.trace_queue.get() for _ in range(nr_of_workers)]
+        return merge_batch_traces(worker_traces, self.nr_of_batches)
+
+
+def merge_batch_traces(worker_traces, nr_of_batches):
+    """Merge the traces of the workers
+
+    Args:
+        worker_traces (list): A list of traces for each worker
+        nr_of_batches (int): How many of the slowest batches to keep
+
+    Returns:
+        traces (list): The slowest traces, the slowest first
+    """
+    traces = itertools.chain.from_iterable(worker_traces)
+    return heapq.nlargest(nr_of_batches, traces, key=lambda trace: trace["seconds"])
+
+
+def get_region(variant_lines):
+    """Get the region of the variant lines of a batch, like '1:100-200'"""
+    first = variant_lines[0].split("\t", 2)
+    last = variant_lines[-1].split("\t", 2)
+    return "{0}:{1}-{2}".format(first[0], first[1], last[1])
+
+
+def get_annotated_batch_trace(seconds, variant_lines, variants, compound_counts):
+    """Get the trace of a batch that the genetic models were checked for
+
+    The compound counts are from check_genetic_models, the candidates of each
+    family, the candidate pairs that were checked and the compound pairs. When
+    a split batch is traced they include the context of the sub batch, since
+    the context is checked together with it, while the variants and features
+    are those of the sub batch.
+
+    Args:
+        seconds (float): The time of the batch
+        variant_lines (list): The variant lines of the batch, without context
+        variants (list): The annotated variants of the variant lines
+        compound_counts (dict): The counts of the compound work
+
+    Returns:
+        trace (dict)
+    """
+    features = set()
+    for variant in variants:
+        features.update(variant.get("annotation", ()))
+
+    return {
+        "seconds": round(seconds, 4),
+        "region": get_region(variant_lines),
+        "features": sorted(features),
+        "variants": len(variant_lines),
+        "candidates": compound_counts["candidates"],
+        "checked": compound_counts["checked"],
+        "pairs": compound_counts["pairs"],
+    }
+
+
+def get_scored_batch_trace(
+    seconds, variant_lines, variants, annotation_keyword="Annotation", vep=False, vep_header=None
+):
+    """Get the trace of a batch that the compounds were scored for
+
+    The candidates are the variants with compounds, the pairs are the compound
+    pairs of all families. The checked pairs are not known when the compounds
+    are scored and are left out.
+
+    Args:
+        seconds (float): The time of the batch
+        variant_lines (list): The variant lines of the batch
+        variants (list): The scored variants of the batch
+        annotation_keyword (str): The INFO key that holds the features
+        vep (bool): If the features are in the vep CSQ field
+        vep_header (list): The vep columns of the CSQ field
+
+    Returns:
+        trace (dict)
+    """
+    features = set()
+    csq_columns = CsqColumns(vep_header)
+    for variant_line in variant_lines:
+        features.update(
+            get_line_annotation(
+                variant_line, annotation_key=annotation_keyword, vep=vep, csq_columns=csq_columns
+            )
+        )
+
+    nr_of_candidates = 0
+    nr_of_pairs = 0
+    for variant in variants:
+        raw_compounds = variant["info_dict"].get("Compounds")
+        if not raw_compounds:
+            continue
+        nr_of_candidates += 1
+        # One entry per family, like <family_id>:<variant_id>|<variant_id>
+        for family_compounds in raw_compounds.split(","):
+            nr_of_pairs += len(family_compounds.split(":", 1)[-1].split("|"))
+
+    return {
+        "seconds": round(seconds, 4),
+        "region": get_region(variant_lines),
+        "features": sorted(features),
+        "variants": len(variants),
+        "candidates": nr_of_candidates,
+        "pairs": nr_of_pairs // 2,
+    }
+
+
+def format_batch_traces(traces):
+    """Format the traces of the slowest batches as a table
+
+    Args:
+        traces (list): The traces, the slowest first
+
+    Returns:
+        lines (list): The lines of the table
+    """
+    lines = ["#seconds\tregion\tvariants\tcandidates\tchecked\tpairs\tworker\tfeatures"]
+    for trace in traces:
+        features = trace["features"][:REPORT_FEATURES]
+        if len(trace["features"]) > REPORT_FEATURES:
+            features.append("...({0} more)".format(len(trace["features"]) - REPORT_FEATURES))
+        lines.append(
+            "\t".join(
+                [
+                    "{0:.3f}".format(trace["seconds"]),
+                    trace["region"],
+                    str(trace["variants"]),
+                    str(trace["candidates"]),
+                    str(trace.get("checked", "-")),
+                    str(trace["pairs"]),
+                    trace.get("worker", "-"),
+                    ",".join(features) or "-",
+                ]
+            )
+        )
+    return lines
@@ -4,9 +4,9 @@ import logging
 from collections import OrderedDict
 from datetime import datetime
 
-from genmod.vcf_tools import get_info_dict, get_variant_dict, get_variant_id, get_vep_dict
+from genmod.vcf_tools import CsqColumns, InfoView, VariantRecord, get_sample_index, get_variant_id
 
-from .get_features import get_annotation
+from .get_features import get_annotation, get_line_annotation
 
 logger = logging.getLogger(__name__)
 
@@ -19,7 +19,7 @@ def get_batches(
     batch queue.
 
     Variant batches are are dictionaries with variant_id as key and
-    variant_dict as value.
+    VariantRecord as value.
 
     get_batches will then use the annotation to search for sequences of variants
     with overlapping annotations. These are collected into one batch and gets
@@ -38,16 +38,56 @@ def get_batches(
     Returns:
          Does not return but put the results in a queue
     """
+    chromosomes = []
+    for batch in generate_batches(
+        variants=variants,
+        header=header,
+        vep=vep,
+        annotation_keyword=annotation_keyword,
+        chromosomes=chromosomes,
+    ):
+        logger.debug("Adding batch in queue")
+        batch_queue.put(batch)
+
+    return chromosomes
+
+
+def generate_batches(
+    variants, header, vep=False, annotation_keyword="Annotation", chromosomes=None, raw=False
+):
+    """
+    Yield variant batches based on their annotation.
+
+    This is where the batching for get_batches is done. A batch is either a
+    dictionary with variant_id as key and a VariantRecord as value or, if raw, a
+    list with the variant lines as they were read.
+
+    If raw, only the chromosome and the features of a line are parsed, with a
+    cheap scan of the INFO column. The full parsing is left to the process
+    that receives the batch, see line_batches.py.
+
+    Arguments:
+         variants (Iterator): An iterator that returns vcf variant lines
+         header (HeaderParser): A HeaderParser object
+         vep (bool): If variant is annotated with vep
+         annotation_keyword (str): The INFO key that holds the features
+         chromosomes (list): If a list the chromosomes seen are added to it
+         raw (bool): If the batches should hold the raw variant lines
+
+    Yields:
+         batch (dict or list): A batch of variants
+    """
+    if chromosomes is None:
+        chromosomes = []
 
     logger.debug("Set beginning to True")
     beginning = True
     logger.debug("Create first empty batch")
     # A batch is a ordered dictionary with variants
-    batch = OrderedDict()
+    batch = [] if raw else OrderedDict()
     new_chrom = None
     current_chrom = None
     current_features = set()
-    chromosomes = []
 
     start_parsing_time = datetime.now()
     start_chrom_time = start_parsing_time
@@ -56,39 +96,49 @@ def get_batches(
     nr_of_variants = 0
     nr_of_batches = 0
 
-    header_line = header.header
-    vep_header = header.vep_columns
+    sample_index = get_sample_index(header.header)
+    csq_columns = CsqColumns(header.vep_columns)
     logger.info("Start parsing the variants")
 
     for line in variants:
         if not line.startswith("#"):
-            variant = get_variant_dict(line, header_line)
-            variant["info_dict"] = get_info_dict(variant["INFO"])
-            variant_id = get_variant_id(variant)
-            variant["variant_id"] = variant_id
-
-            if vep:
-                variant["vep_info"] = get_vep_dict(
-                    vep_string=variant["info_dict"]["CSQ"],
-                    vep_header=vep_header,
-                    allele=variant["ALT"].split(",")[0],
+            nr_of_variants += 1
+            if raw:
+                # Only the batch key is parsed here, the receiving process
+                # parses the full variant
+                variant = line.rstrip()
+                variant_id = None
+                new_chrom = variant[: variant.find("\t")]
+                new_features = get_line_annotation(
+                    variant_line=variant,
+                    annotation_key=annotation_keyword,
+                    vep=vep,
+                    csq_columns=csq_columns,
                 )
+            else:
+                variant = VariantRecord.from_line(line, sample_index)
+                variant["info_dict"] = InfoView(variant["INFO"])
+                variant_id = get_variant_id(variant)
+                variant["variant_id"] = variant_id
 
-            logger.debug("Checking variant {0}".format(variant_id))
+                logger.debug("Checking variant {0}".format(variant_id))
 
-            nr_of_variants += 1
-            new_chrom = variant["CHROM"]
-            if new_chrom.startswith("chr"):
-                new_chrom = new_chrom[3:]
+                new_chrom = variant["CHROM"]
 
-            logger.debug("Update new chrom to {0}".format(new_chrom))
+                new_features = get_annotation(
+                    variant=variant,
+                    vep=vep,
+                    annotation_key=annotation_keyword,
+                    csq_columns=csq_columns,
+                )
+                logger.debug(
+                    "Adding {0} to variant {1}".format(", ".join(new_features), variant_id)
+                )
 
-            new_features = get_annotation(
-                variant=variant, vep=vep, annotation_key=annotation_keyword
-            )
-            logger.debug("Adding {0} to variant {1}".format(", ".join(new_features), variant_id))
+                variant["annotation"] = new_features
 
-            variant["annotation"] = new_features
+            if new_chrom.startswith("chr"):
+                new_chrom = new_chrom[3:]
 
             if nr_of_variants % 20000 == 0:
                 logger.info("{0} variants parsed".format(nr_of_variants))
@@ -101,8 +151,10 @@ def get_batches(
                 logger.debug("First variant.")
                 current_features = new_features
 
-                logger.debug("Adding %s to variant batch" % variant_id)
-                batch[variant_id] = variant
+                if raw:
+                    batch.append(variant)
+                else:
+                    batch[variant_id] = variant
 
                 logger.debug("Updating current chrom to {0}".format(new_chrom))
                 current_chrom = new_chrom
@@ -142,18 +194,20 @@ def get_batches(
                 if send:
                     # Put the job in the queue
                     if len(batch) > 0:
-                        logger.debug("Adding batch in queue")
-                        batch_queue.put(batch)
                         nr_of_batches += 1
+                        yield batch
                     # Reset the variables
                     current_features = new_features
                     logger.debug("Initializing empty batch")
-                    batch = {}
+                    batch = [] if raw else {}
                 else:
                     current_features = current_features.union(new_features)
 
                 # Add variant to batch
-                batch[variant_id] = variant
+                if raw:
+                    batch.append(variant)
+                else:
+                    batch[variant_id] = variant
 
     if current_chrom not in chromosomes:
         logger.debug("Adding chr {0} to chromosomes".format(current_chrom))
@@ -167,8 +221,7 @@ def get_batches(
 
     if len(batch) > 0:
         nr_of_batches += 1
-        batch_queue.put(batch)
-        logger.debug("Adding batch to queue")
+        yield batch
 
     logger.info(
         "Variants parsed. Time to parse variants: {0}".format(
@@ -179,4 +232,67 @@ def get_batches(
     logger.info("Number of variants in variant file: {0}".format(nr_of_variants))
     logger.info("Number of batches created: {0}".format(nr_of_batches))
 
-    return chromosomes
+
+def split_batch(batch, max_batch_size, annotation_keyword="Annotation", vep=False, vep_header=None):
+    """
+    Split a batch of raw variant lines in sub batches of at most max_batch_size lines.
+
+    Overlapping features can chain into very large batches. Such a batch is
+    split in consecutive sub batches, and each sub batch gets the other
+    variants of the features of its own variants as context. Compound pairs
+    are only made within a feature, so the variants of a sub batch get the
+    same compounds as in the whole batch. The context is found with an index
+    of the positions of the variants of each feature.
+
+    The context lines are split in the lines before and after the sub batch,
+    so that the lines keep the order of the batch.
+
+    Arguments:
+         batch (list): Raw variant lines from generate_batches
+         max_batch_size (int): The largest number of variants in a sub batch
+         annotation_keyword (str): The INFO key that holds the features
+         vep (bool): If variant is annotated with vep
+         vep_header (list): The vep columns of the CSQ field
+
+    Yields:
+         sub_batch (tuple): The variant lines, the context lines before and
+                            the context lines after them
+
+    Raises:
+         ValueError: If max_batch_size is smaller than 1
+    """
+    if max_batch_size is not None and max_batch_size < 1:
+        raise ValueError("max_batch_size has to be at least 1, not {0}".format(max_batch_size))
+    if max_batch_size is None or len(batch) <= max_batch_size:
+        yield batch, [], []
+        return
+
+    logger.debug("Split a batch with {0} variants".format(len(batch)))
+    csq_columns = CsqColumns(vep_header)
+    line_features = [
+        get_line_annotation(
+            variant_line=variant_line,
+            annotation_key=annotation_keyword,
+            vep=vep,
+            csq_columns=csq_columns,
+        )
+        for variant_line in batch
+    ]
+    # The positions of the variants of each feature
+    feature_index = {}
+    for position, features in enumerate(line_features):
+        for feature in features:
+            feature_index.setdefault(feature, []).append(position)
+
+    for start in range(0, len(batch), max_batch_size):
+        end = min(start + max_batch_size, len(batch))
+        context = set()
+        for features in line_features[start:end]:
+            for feature in features:
+                context.update(feature_index[feature])
+        context = sorted(context)
+        yield (
+            batch[start:end],
+            [batch[position] for position in context if position < start],
+            [batch[position] for position in context if position >= end],
+        )
@@ -2,6 +2,8 @@ from __future__ import print_function
 
 import logging
 
+from genmod.vcf_tools import CsqColumns, get_info_value
+
 INTERESTING_SO_TERMS = {
     "transcript_ablation",
     "splice_donor_variant",
@@ -35,24 +37,56 @@ INTERESTING_SO_TERMS = {
 }
 
 
-def check_vep_annotation(variant):
+def get_vep_annotation(vep_string, csq_columns):
+    """
+    Return a set with the genes that vep has annotated a CSQ field with.
+
+    Only the Consequence and Gene columns of each annotation are read.
+
+    Arguments:
+        vep_string (str): The raw CSQ field
+        csq_columns (CsqColumns): The columns of the CSQ field
+
+    Returns:
+        annotation (set): A set with genes
+    """
+    annotation = set()
+    if not vep_string:
+        return annotation
+
+    for consequences, gene in csq_columns.get_columns(vep_string, ("Consequence", "Gene")):
+        if consequences is None:
+            continue
+        for consequence in consequences.split("&"):
+            # These are the SO terms that indicate that the variant
+            # belongs to a gene
+            if consequence in INTERESTING_SO_TERMS:
+                annotation.add(gene or "")
+    return annotation
+
+
+def check_vep_annotation(variant, csq_columns=None):
     """
     Return a set with the genes that vep has annotated this variant with.
 
     Vep annotates all variants but we are only interested in the exonic ones.
     The terms are specified in INTERESTING_SO_TERMS
 
+    With csq_columns the genes are read from the CSQ field of the info_dict,
+    otherwise from the vep_info of the variant, see get_vep_dict.
+
     Arguments:
         variant (dict): A variant dictionary
+        csq_columns (CsqColumns): The columns of the CSQ field
 
     Returns:
         annotation (set): A set with genes
     """
+    if csq_columns is not None:
+        return get_vep_annotation(variant.get("info_dict", {}).get("CSQ"), csq_columns)
 
     annotation = set()
     # vep_info is a dictionary with genes as key and annotation as values
-    ##TODO use extract_vcf to get the annotation here
-
     vep_info = variant.get("vep_info", {})
 
     for allele in vep_info:
@@ -65,7 +99,7 @@ def check_vep_annotation(variant):
     return annotation
 
 
-def get_annotation(variant, annotation_key="Annotation", vep=False):
+def get_annotation(variant, annotation_key="Annotation", vep=False, csq_columns=None):
     """
     Return the features that a variant belongs to.
 
@@ -73,6 +107,8 @@ def get_annotation(variant, annotation_key="Annotation", vep=False):
         variant (dict): A variant dictionary
         annotation_key (str): The name of the info field to search
         vep (bool): If variants are annotated with vep
+        csq_columns (CsqColumns): The columns of the CSQ field, see
+                                  check_vep_annotation
 
     Returns:
         annotations (set): A set with annotated features
@@ -87,7 +123,7 @@ def get_annotation(variant, annotation_key="Annotation", vep=False):
     # check again
     if vep:
         logger.debug("Using vep annotation.")
-        annotation = check_vep_annotation(variant)
+        annotation = check_vep_annotation(variant, csq_columns=csq_columns)
 
     else:
         info_dict = variant.get("info_dict", {})
@@ -96,3 +132,38 @@ def get_annotation(variant, annotation_key="Annotation", vep=False):
 
     logger.debug("Annotations found for {0}: {1}".format(variant_id, ",".join(annotation)))
     return annotation
+
+
+def get_line_annotation(
+    variant_line, annotation_key="Annotation", vep=False, vep_header=None, csq_columns=None
+):
+    """
+    Return the features that a raw variant line belongs to.
+
+    This is a cheap version of get_annotation that only looks at the INFO
+    column of the line. The rest of the variant is not parsed.
+
+    Arguments:
+        variant_line (str): A vcf variant line
+        annotation_key (str): The name of the info field to search
+        vep (bool): If variants are annotated with vep
+        vep_header (list): The vep columns of the CSQ field
+        csq_columns (CsqColumns): The columns of the CSQ field, made from
+                                  vep_header if not given
+
+    Returns:
+        annotations (set): A set with annotated features
+    """
+    annotation = set()
+    info_line = variant_line.split("\t", 8)[7]
+
+    if vep:
+        if csq_columns is None:
+            csq_columns = CsqColumns(vep_header)
+        annotation = get_vep_annotation(get_info_value(info_line, "CSQ"), csq_columns)
+    else:
+        annotation_string = get_info_value(info_line, annotation_key)
+        if annotation_string:
+            annotation = set(annotation_string.split(","))
+
+    return annotation
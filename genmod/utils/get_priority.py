@@ -1,4 +1,4 @@
-from genmod.score_variants import RANK_SCORE_TYPE_NAMES
+from genmod.score_variants.rank_score_variant_definitions import RANK_SCORE_TYPE_NAMES
 
 
 def get_chromosome_priority(chrom, chrom_dict={}):
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+line_batches.py
+
+Ship variant batches between processes as raw vcf lines.
+
+A batch is sent as one utf-8 encoded block where the lines are separated by
+newlines. A vcf record or an INFO field can never hold a newline so that is
+all the framing that is needed. A bytes block goes over the pipe of a
+multiprocessing queue as one piece, without pickling any variant dictionaries.
+
+The workers send back one block per batch with the new INFO fields, in the
+same order as the lines they received. The process that sent the batch keeps
+the original lines and puts the new INFO fields in place before printing.
+
+Most variants of a genome are outside of any feature and are batches of one
+variant. Those batches are packed in chunks of singletons, so that one task
+carries many of them, and the workers annotate each variant of a chunk on its
+own. See coalesce_batches and make_task.
+"""
+
+from __future__ import print_function
+
+import logging
+from queue import Empty
+
+logger = logging.getLogger(__name__)
+
+# The number of batches with one variant that are sent as one task
+SINGLETON_CHUNK_SIZE = 500
+
+
+def pack_lines(lines):
+    """Pack a list of lines into one block
+
+    Args:
+        lines (list): A list of strings without newlines
+
+    Returns:
+        block (bytes): The lines as one utf-8 encoded block
+    """
+    return "\n".join(lines).encode("utf-8")
+
+
+def unpack_lines(block):
+    """Unpack a block into a list of lines
+
+    Args:
+        block (bytes): A block made with pack_lines
+
+    Returns:
+        lines (list): A list of strings
+    """
+    return block.decode("utf-8").split("\n")
+
+
+def coalesce_batches(batches, chunk_size=SINGLETON_CHUNK_SIZE):
+    """Pack consecutive batches with one variant in chunks
+
+    The batches keep their order, a larger batch ends the current chunk.
+
+    Args:
+        batches (iterator): Batches of raw variant lines, see generate_batches
+        chunk_size (int): The largest number of singletons in a chunk
+
+    Yields:
+        batch (tuple): The variant lines and if they are a chunk of singletons
+    """
+    chunk = []
+    for batch in batches:
+        if len(batch) == 1:
+            chunk.extend(batch)
+            if len(chunk) >= chunk_size:
+                yield chunk, True
+                chunk = []
+            continue
+        if chunk:
+            yield chunk, True
+            chunk = []
+        yield batch, False
+
+    if chunk:
+        yield chunk, True
+
+
+def make_task(batch_number, lines, context_before=None, context_after=None, singletons=False):
+    """Make a task for the workers
+
+    Args:
+        batch_number (int): The number of the batch
+        lines (list): The variant lines of the batch
+        context_before (list): Context lines before the batch, see split_batch
+        context_after (list): Context lines after the batch
+        singletons (bool): If the lines are a chunk of batches with one variant
+
+    Returns:
+        task (tuple): The batch number, the blocks and if the lines are singletons
+    """
+    return (
+        batch_number,
+        pack_lines(lines),
+        pack_lines(context_before) if context_before else None,
+        pack_lines(context_after) if context_after else None,
+        singletons,
+    )
+
+
+def read_task(task):
+    """Read a task made with make_task
+
+    Args:
+        task (tuple): A task from make_task
+
+    Returns:
+        task (tuple): The batch number, the variant lines, the context lines
+                      before and after them and if the lines are singletons
+    """
+    batch_number, block, before_block, after_block, singletons = task
+    return (
+        batch_number,
+        unpack_lines(block),
+        unpack_lines(before_block) if before_block else [],
+        unpack_lines(after_block) if after_block else [],
+        singletons,
+    )
+
+
+def splice_info(variant_line, info):
+    """Replace the INFO column of a vcf variant line
+
+    Args:
+        variant_line (str): A vcf variant line without newline
+        info (str): The new INFO column
+
+    Returns:
+        variant_line (str): The variant line with the new INFO column
+    """
+    splitted_line = variant_line.split("\t", 8)
+    splitted_line[7] = info
+    return "\t".join(splitted_line)
+
+
+def get_result(results_queue, workers, timeout=1):
+    """Wait for the next result from a results queue
+
+    Checks that the workers are still alive while waiting, so that the main
+    process does not hang if a worker fails.
+
+    Args:
+        results_queue (Queue): The queue that the workers put results in
+        workers (list): The worker processes
+        timeout (int): Seconds to wait between checking the workers
+
+    Returns:
+        result: The next object from the results queue
+    """
+    while True:
+        try:
+            return results_queue.get(timeout=timeout)
+        except Empty:
+            for worker in workers:
+                if not worker.is_alive() and worker.exitcode != 0:
+                    raise RuntimeError("Worker {0} failed".format(worker.name))
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+region_shards.py
+
+Split a bgzipped and tabix indexed vcf into regions that can be annotated
+independently of each other.
+
+A region shard is a slice of one contig. The batches, see get_batches.py,
+never span two contigs, so whole contigs are always safe to annotate
+separately. To split a large contig the shards must not cut through the
+features of a batch. A variant without any features always ends the batch
+before it and starts a batch of its own, so the only safe place to cut a
+contig is at such a variant.
+
+A shard is described by a nominal window on a contig. The shard starts at
+the first variant without features at or after the start of its window and
+ends before the first variant without features at or after the start of the
+next window. Both neighbouring shards can find the same cut point by reading
+forward from the window start, so each worker can read its own shard
+straight from the indexed file without knowing about the other shards.
+
+If there is no cut point in a window the shard of the window is empty and
+the shard before it continues to the next cut point.
+"""
+
+from __future__ import print_function
+
+import gzip
+import logging
+import os
+import re
+import struct
+
+from tabix import TabixError
+
+from genmod.vcf_tools import CsqColumns
+
+from .get_features import get_line_annotation
+
+logger = logging.getLogger(__name__)
+
+# The largest position that can be held in a tabix index
+MAX_POSITION = 2**29
+# Default size of the window of one shard
+SHARD_SIZE = 10000000
+
+CONTIG_LENGTH_PATTERN = re.compile(r"[<,]length=(\d+)[,>]")
+
+
+def get_index_contigs(index_file):
+    """Get the names of the contigs in a tabix index
+
+    The contigs are returned in the order that they are stored in the index,
+    which is the order that they appear in the indexed file.
+
+    Args:
+        index_file (str): Path to a .tbi file
+
+    Returns:
+        contigs (list): The contig names
+    """
+    with gzip.open(index_file, "rb") as index:
+        magic = index.read(4)
+        if magic != b"TBI\x01":
+            raise TabixError("{0} is not a tabix index".format(index_file))
+        # n_ref, format, col_seq, col_beg, col_end, meta, skip and l_nm
+        values = struct.unpack("<8i", index.read(32))
+        names = index.read(values[7])
+
+    return [name.decode("utf-8") for name in names.split(b"\x00") if name]
+
+
+def get_contig_lengths(head):
+    """Get the contig lengths from the ##contig lines of a vcf header
+
+    Args:
+        head (HeaderParser): A HeaderParser object
+
+    Returns:
+        contig_lengths (dict): Contig names as keys and lengths as values
+    """
+    contig_lengths = {}
+    for contig_id, contig_line in head.contig_dict.items():
+        match = CONTIG_LENGTH_PATTERN.search(contig_line)
+        if match:
+            contig_lengths[contig_id] = int(match.group(1))
+    return contig_lengths
+
+
+def check_indexed(path):
+    """Check if a file is bgzipped with a tabix index
+
+    Args:
+        path (str): Path to the variant file
+
+    Returns:
+        bool: If the file can be read in region shards
+    """
+    return path.endswith(".gz") and os.path.isfile(path + ".tbi")
+
+
+def get_shards(contigs, contig_lengths=None, shard_size=SHARD_SIZE):
+    """Split contigs into shard windows
+
+    Contigs with a known length are split into windows of shard_size bases,
+    all other contigs are one shard.
+
+    Args:
+        contigs (list): Contig names in file order
+        contig_lengths (dict): Contig names as keys and lengths as values
+        shard_size (int): The size of the window of one shard
+
+    Returns:
+        shards (list): Tuples with (contig, start, end). The start and end
+                       are 1-based and the end is None for the last window
+                       of a contig
+    """
+    contig_lengths = contig_lengths or {}
+    shards = []
+    for contig in contigs:
+        length = contig_lengths.get(contig)
+        start = 1
+        if length and shard_size:
+            while start + shard_size <= length:
+                shards.append((contig, start, start + shard_size))
+                start += shard_size
+        shards.append((contig, start, None))
+
+    logger.debug("Split {0} contigs into {1} shards".format(len(contigs), len(shards)))
+    return shards
+
+
+def generate_shard_lines(
+    tabix_handle, contig, start, end, annotation_keyword="Annotation", vep=False, vep_header=None
+):
+    """Yield the variant lines of a shard
+
+    Args:
+        tabix_handle (tabix.open): A handle to the indexed variant file
+        contig (str): The contig of the shard
+        start (int): The 1-based start of the shard window
+        end (int): The 1-based start of the next window, None if the window
+                   ends with the contig
+        annotation_keyword (str): The INFO key that holds the features
+        vep (bool): If variants are annotated with vep
+        vep_header (list): The vep columns of the CSQ field
+
+    Yields:
+        variant_line (str): A vcf variant line without newline
+    """
+
+    csq_columns = CsqColumns(vep_header)
+
+    def is_cut_point(variant_line):
+        return not get_line_annotation(
+            variant_line=variant_line,
+            annotation_key=annotation_keyword,
+            vep=vep,
+            csq_columns=csq_columns,
+        )
+
+    try:
+        records = tabix_handle.query(contig, start - 1, MAX_POSITION)
+    except TabixError:
+        logger.warning("Contig {0} could not be found in the index".format(contig))
+        return
+
+    # The first window of a contig starts at the contig start
+    started = start == 1
+    for record in records:
+        position = int(record[1])
+        # Tabix returns records that overlap the window, skip the ones that
+        # start before it
+        if position < start:
+            continue
+        variant_line = "\t".join(record)
+        if not started:
+            # A cut point after the window belongs to a later shard
+            if end is not None and position >= end:
+                break
+            # The variants before the first cut point belong to the shard before
+            if not is_cut_point(variant_line):
+                continue
+            started = True
+        elif end is not None and position >= end and is_cut_point(variant_line):
+            break
+
+        yield variant_line
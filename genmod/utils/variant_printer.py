@@ -5,6 +5,12 @@ variant_printer.py
 
 Print the variants of a results queue to a file.
 
+VariantPrinter prints variant records or dictionaries from a queue in a
+separate process.
+BatchPrinter prints batches of annotated variant lines in the order that they
+were read, without any intermediate file. ShardPrinter does the same for the
+region shards of an indexed vcf.
+
 Created by Måns Magnusson on 2013-01-17.
 Copyright (c) 2013 __MyCompanyName__. All rights reserved.
 """
@@ -15,11 +21,18 @@ import logging
 from codecs import open
 from multiprocessing import Process
 
+from genmod.memory_report import memory_traced
+from genmod.profiling import profiled
 from genmod.utils import get_chromosome_priority, get_rank_score
-from genmod.vcf_tools import print_variant
+from genmod.vcf_tools import VariantRecord, print_variant
+
+from .line_batches import splice_info, unpack_lines
 
 logger = logging.getLogger(__name__)
 
+# The default number of MB of variant lines and results that may be in flight
+MEMORY_BUDGET = 1024
+
 
 class VariantPrinter(Process):
     """
@@ -54,6 +67,8 @@ class VariantPrinter(Process):
         self.mode = mode
         self.silent = silent
 
+    @profiled
+    @memory_traced
     def run(self):
         """Starts the printing"""
         # Print the results to a temporary file:
@@ -65,7 +80,7 @@ class VariantPrinter(Process):
                 self.outfile = open(self.outfile, "a", encoding="utf-8")
 
         while True:
-            # A task is a variant dictionary
+            # A task is a variant record or a variant dictionary
             self.logger.debug(("{0} fetching next variant".format(proc_name)))
             variant = self.task_queue.get()
 
@@ -88,12 +103,181 @@ class VariantPrinter(Process):
             elif self.mode == "score":
                 priority = get_rank_score(variant_dict=variant)
 
-            print_variant(
-                variant_dict=variant,
-                header_line=self.header,
-                priority=priority,
-                outfile=self.outfile,
-                silent=self.silent,
-            )
+            if isinstance(variant, VariantRecord):
+                print_variant(
+                    variant_line=variant.to_line(),
+                    priority=priority,
+                    outfile=self.outfile,
+                    silent=self.silent,
+                )
+            else:
+                print_variant(
+                    variant_dict=variant,
+                    header_line=self.header,
+                    priority=priority,
+                    outfile=self.outfile,
+                    silent=self.silent,
+                )
 
         return
+
+
+class BatchPrinter(object):
+    """
+    Print batches of variant lines in the order they were read.
+
+    The variant lines of a batch are kept here while the batch is annotated
+    by a worker. The workers return the new INFO fields of a batch as a block,
+    see line_batches.py. Batches can be finished in any order so finished
+    batches are held in a reorder buffer until all batches before them are
+    printed. The variants are printed straight to the outfile.
+
+    The printer counts the bytes of the batches that are not printed, the
+    variant lines and the blocks of the finished batches. When they are over
+    the memory budget the printer is full, and the process that sends the
+    batches should wait for results before it sends more. That way the
+    memory stays bounded even if one slow batch holds back all later batches
+    or the outfile is slow, and the workers wait for batches instead of
+    piling up results.
+
+    Args:
+        outfile : An opened file handle, if None the variants are printed to stdout
+        silent : If the variants should not be printed to stdout
+        memory_budget : The number of MB of batches that may be in flight,
+                        None for no limit
+    """
+
+    def __init__(self, outfile=None, silent=False, memory_budget=None):
+        super(BatchPrinter, self).__init__()
+        self.logger = logger
+        self.outfile = outfile
+        self.silent = silent
+        self.memory_budget = None
+        if memory_budget:
+            self.memory_budget = memory_budget * 1024 * 1024
+        # The approximate bytes of the batches that are not printed
+        self.nr_of_bytes = 0
+        # The variant lines for each batch number that is not printed
+        self.pending = {}
+        # The INFO blocks of finished batches that wait for earlier batches
+        self.finished = {}
+        self.nr_of_batches = 0
+        self.next_batch = 0
+        self.nr_printed = 0
+
+    def add_batch(self, variant_lines):
+        """Store the variant lines of a batch
+
+        Args:
+            variant_lines (list): The variant lines of a batch
+
+        Returns:
+            batch_number (int): The number of the batch
+        """
+        batch_number = self.nr_of_batches
+        self.pending[batch_number] = variant_lines
+        self.nr_of_batches += 1
+        self.nr_of_bytes += sum(map(len, variant_lines))
+        return batch_number
+
+    def add_result(self, batch_number, block, priorities=None):
+        """Add the INFO block of a finished batch and print what is in order
+
+        Args:
+            batch_number (int): The number of the batch
+            block (bytes): The new INFO fields of the batch
+            priorities (bytes): The sort priorities of the variants, printed
+                                in the first column when the output is sorted
+        """
+        self.finished[batch_number] = (block, priorities)
+        self.nr_of_bytes += len(block) + len(priorities or b"")
+        while self.next_batch in self.finished:
+            block, priorities = self.finished.pop(self.next_batch)
+            variant_lines = self.pending.pop(self.next_batch)
+            self.nr_of_bytes -= len(block) + len(priorities or b"")
+            self.nr_of_bytes -= sum(map(len, variant_lines))
+            info_fields = unpack_lines(block)
+            if priorities is None:
+                priorities = [None] * len(info_fields)
+            else:
+                priorities = unpack_lines(priorities)
+            for variant_line, info, priority in zip(variant_lines, info_fields, priorities):
+                print_variant(
+                    variant_line=splice_info(variant_line, info),
+                    priority=priority,
+                    outfile=self.outfile,
+                    silent=self.silent,
+                )
+            self.nr_printed += len(variant_lines)
+            self.next_batch += 1
+
+        if self.finished:
+            self.logger.debug(
+                "{0} batches waiting for batch {1}".format(len(self.finished), self.next_batch)
+            )
+
+    @property
+    def nr_waiting(self):
+        """The number of batches that are not printed"""
+        return len(self.pending)
+
+    @property
+    def is_full(self):
+        """If the batches that are not printed are over the memory budget"""
+        return self.memory_budget is not None and self.nr_of_bytes > self.memory_budget
+
+
+class ShardPrinter(object):
+    """
+    Print the annotated variant lines of region shards in shard order.
+
+    Each shard is annotated by one worker that sends its variant lines in
+    blocks, in order, see region_shards.py. The blocks of the shard that is
+    next in line are printed straight away, blocks of later shards are held
+    until all shards before them are finished.
+
+    Args:
+        nr_of_shards : The number of shards that will be annotated
+        outfile : An opened file handle, if None the variants are printed to stdout
+        silent : If the variants should not be printed to stdout
+    """
+
+    def __init__(self, nr_of_shards, outfile=None, silent=False):
+        super(ShardPrinter, self).__init__()
+        self.logger = logger
+        self.nr_of_shards = nr_of_shards
+        self.outfile = outfile
+        self.silent = silent
+        # The blocks of shards that wait for earlier shards
+        self.blocks = {}
+        self.finished = set()
+        self.next_shard = 0
+
+    def add_result(self, shard_number, block, finished):
+        """Add a block of annotated variant lines and print what is in order
+
+        Args:
+            shard_number (int): The number of the shard
+            block (bytes): Annotated variant lines, None if there are none
+            finished (bool): If this is the last block of the shard
+        """
+        if block is not None:
+            self.blocks.setdefault(shard_number, []).append(block)
+        if finished:
+            self.finished.add(shard_number)
+
+        while self.next_shard < self.nr_of_shards:
+            for block in self.blocks.pop(self.next_shard, []):
+                for variant_line in unpack_lines(block):
+                    print_variant(
+                        variant_line=variant_line, outfile=self.outfile, silent=self.silent
+                    )
+            if self.next_shard not in self.finished:
+                break
+            self.finished.remove(self.next_shard)
+            self.next_shard += 1
+
+    @property
+    def nr_waiting(self):
+        """The number of shards that are not finished"""
+        return self.nr_of_shards - self.next_shard
@@ -9,15 +9,32 @@ from .add_metadata import (
     add_model_score_header,
     add_version_header,
 )
-from .add_variant_information import add_vcf_info, replace_vcf_info
+from .add_variant_information import (
+    add_vcf_info,
+    replace_vcf_info,
+    set_vcf_info,
+    update_vcf_info,
+)
+from .bgzf_reader import BgzfReader, is_bgzf
+from .bgzf_writer import BgzfWriter
 from .check_info_header import check_info
+from .csq import CsqColumns
 from .genotype import Genotype
-from .get_genotypes import get_genotypes
+from .get_genotypes import get_format_indexes, get_genotypes
 from .header_parser import HeaderParser
-from .parse_variant import get_info_dict, get_variant_dict, get_variant_id, get_vep_dict
+from .info_view import InfoView
+from .parse_variant import (
+    get_info_dict,
+    get_info_value,
+    get_variant_dict,
+    get_variant_id,
+    get_vep_dict,
+)
 from .print_headers import print_headers
 from .print_variants import print_variant, print_variant_dict, print_variant_for_sorting
 from .sort_variants import sort_variants
+from .variant_record import VariantRecord, get_sample_index
+from .vcf_index import VcfIndex
 
 __all__ = [
     "add_annotation_header",
@@ -29,11 +46,20 @@ __all__ = [
     "add_version_header",
     "add_vcf_info",
     "replace_vcf_info",
+    "set_vcf_info",
+    "update_vcf_info",
+    "BgzfReader",
+    "is_bgzf",
+    "BgzfWriter",
     "check_info",
+    "CsqColumns",
     "Genotype",
+    "get_format_indexes",
     "get_genotypes",
     "HeaderParser",
+    "InfoView",
     "get_info_dict",
+    "get_info_value",
     "get_variant_dict",
     "get_variant_id",
     "get_vep_dict",
@@ -42,4 +68,7 @@ __all__ = [
     "print_variant_dict",
     "print_variant_for_sorting",
     "sort_variants",
+    "VariantRecord",
+    "get_sample_index",
+    "VcfIndex",
 ]
@@ -13,6 +13,8 @@ from __future__ import print_function
 
 import logging
 
+from .info_view import InfoView
+
 
 def replace_vcf_info(keyword, annotation, variant_line=None, variant_dict=None):
     """Replace the information of a info field of a vcf variant line.
@@ -126,3 +128,44 @@ def add_vcf_info(keyword, variant_line=None, variant_dict=None, annotation=None)
         fixed_variant = variant_dict
 
     return fixed_variant
+
+
+def set_vcf_info(keyword, annotation, variant_dict):
+    """Set an INFO key of a variant dictionary
+
+    If the info_dict of the variant is an InfoView the annotation is only
+    recorded as an edit, and the INFO field is written once for all edits
+    with update_vcf_info. With a plain info dictionary the INFO field is
+    changed at once, the key is replaced if it exists and added otherwise.
+
+    Arguments:
+        keyword (str): The info field key
+        annotation (str): The value of the key
+        variant_dict (dict): A variant dictionary with info_dict
+
+    Returns:
+        variant_dict (dict): The variant
+    """
+    info_dict = variant_dict["info_dict"]
+    if not isinstance(info_dict, InfoView):
+        if keyword in info_dict:
+            replace_vcf_info(keyword=keyword, annotation=annotation, variant_dict=variant_dict)
+        else:
+            add_vcf_info(keyword=keyword, annotation=annotation, variant_dict=variant_dict)
+    info_dict[keyword] = annotation
+    return variant_dict
+
+
+def update_vcf_info(variant_dict):
+    """Write the edits of the info_dict of a variant to its INFO field
+
+    Arguments:
+        variant_dict (dict): A variant dictionary with info_dict
+
+    Returns:
+        info (str): The INFO field of the variant
+    """
+    info_dict = variant_dict.get("info_dict")
+    if isinstance(info_dict, InfoView) and info_dict.is_edited:
+        variant_dict["INFO"] = info_dict.commit()
+    return variant_dict["INFO"]
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+bgzf_reader.py
+
+Read block gzipped (BGZF) files with the blocks inflated in parallel.
+
+The header of every BGZF block holds the size of the block, so the blocks can
+be read from the file without inflating them. The blocks are inflated in a
+thread pool, a number of blocks ahead of the lines that are consumed, and the
+lines are yielded in the order of the file. See bgzf_writer.py for the format.
+
+Ordinary gzip files do not have the block sizes and have to be read with gzip.
+"""
+
+from __future__ import print_function
+
+import logging
+import struct
+import zlib
+from codecs import getincrementaldecoder
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .bgzf_writer import BGZF_THREADS
+
+logger = logging.getLogger(__name__)
+
+# Size of the gzip header of a BGZF block, including the BC extra field
+BGZF_HEADER_SIZE = 18
+
+
+def is_bgzf(path):
+    """Check if a file is block gzipped
+
+    Args:
+        path (str): Path to a file
+
+    Returns:
+        bool: If the file starts with a BGZF block
+    """
+    with open(path, "rb") as f:
+        header = f.read(BGZF_HEADER_SIZE)
+    return (
+        len(header) == BGZF_HEADER_SIZE
+        and header[:4] == b"\x1f\x8b\x08\x04"
+        and header[10:16] == b"\x06\x00BC\x02\x00"
+    )
+
+
+def inflate_block(block):
+    """Inflate the data of one BGZF block
+
+    Args:
+        block (bytes): A whole BGZF block
+
+    Returns:
+        data (bytes): The uncompressed data
+    """
+    data = zlib.decompress(block[BGZF_HEADER_SIZE:-8], -15)
+    if len(data) != struct.unpack("<I", block[-4:])[0]:
+        raise IOError("BGZF block has the wrong size")
+    return data
+
+
+class BgzfReader(object):
+    """
+    Iterate over the lines of a BGZF file.
+
+    The lines are decoded as utf-8 with errors replaced, the same as the
+    reader that get_file_handle uses for other files.
+
+    Args:
+        path (str): Path to a BGZF file
+        threads (int): Number of threads that inflate blocks
+        read_ahead (int): Number of blocks that are read ahead per thread
+    """
+
+    def __init__(self, path, threads=BGZF_THREADS, read_ahead=8):
+        super(BgzfReader, self).__init__()
+        self.name = path
+        self.handle = open(path, "rb")
+        self._executor = ThreadPoolExecutor(max_workers=threads)
+        self._max_pending = threads * read_ahead
+        self._pending = deque()
+        self._decoder = getincrementaldecoder("utf-8")(errors="replace")
+        self._lines = deque()
+        self._rest = ""
+        self._eof = False
+
+    def _read_block(self):
+        """Read the next whole block from the file, None at end of file"""
+        header = self.handle.read(BGZF_HEADER_SIZE)
+        if not header:
+            return None
+        if len(header) < BGZF_HEADER_SIZE or header[12:14] != b"BC":
+            raise IOError("{0} is not a valid BGZF file".format(self.name))
+        block_size = struct.unpack("<H", header[16:18])[0] + 1
+        return header + self.handle.read(block_size - BGZF_HEADER_SIZE)
+
+    def _fill(self):
+        """Keep the thread pool busy with the blocks ahead"""
+        while not self._eof and len(self._pending) < self._max_pending:
+            block = self._read_block()
+            if block is None:
+                self._eof = True
+                break
+            self._pending.append(self._executor.submit(inflate_block, block))
+
+    def _next_lines(self):
+        """Split the next inflated block in lines, False at end of file"""
+        self._fill()
+        if not self._pending:
+            if self._rest:
+                self._lines.append(self._rest)
+                self._rest = ""
+                return True
+            return False
+
+        text = self._rest + self._decoder.decode(self._pending.popleft().result())
+        # Only '\n' ends a line, so a '\r\n' that is split over two blocks
+        # stays in one line. The last line continues in the next block.
+        lines = text.split("\n")
+        self._rest = lines.pop()
+        self._lines.extend(line + "\n" for line in lines)
+        return True
+
+    def readline(self):
+        """Read the next line, an empty string at end of file"""
+        while not self._lines:
+            if not self._next_lines():
+                return ""
+        return self._lines.popleft()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def close(self):
+        """Close the file and stop the threads"""
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._executor.shutdown()
+        self.handle.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+bgzf_writer.py
+
+Write block gzipped (BGZF) files that can be indexed with tabix.
+
+A BGZF file is a series of gzip members, each holding at most 64 kb of
+uncompressed data, that ends with an empty member. Since every block is a
+complete gzip member the blocks can be compressed independently of each other,
+the compression is done in background threads while the caller continues to
+produce lines.
+
+All blocks except the last one hold exactly BGZF_BLOCK_SIZE bytes of
+uncompressed data. This makes it easy to translate a position in the
+uncompressed data to a virtual file offset when the index is written, see
+vcf_index.py.
+"""
+
+from __future__ import print_function
+
+import logging
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .vcf_index import VcfIndex
+
+logger = logging.getLogger(__name__)
+
+# The amount of uncompressed data in one block, the same as htslib uses
+BGZF_BLOCK_SIZE = 0xFF00
+# The empty block that marks the end of a BGZF file
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+# Default number of threads used for compression
+BGZF_THREADS = 2
+
+
+def compress_block(data, level=zlib.Z_DEFAULT_COMPRESSION):
+    """Compress data into one BGZF block
+
+    Args:
+        data (bytes): At most 64 kb of uncompressed data
+        level (int): The zlib compression level
+
+    Returns:
+        block (bytes): A complete gzip member with the BGZF extra field
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    compressed = compressor.compress(data) + compressor.flush()
+    # The BSIZE field holds the size of the whole block minus one
+    header = struct.pack(
+        "<4BI2BH2BHH", 31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(compressed) + 25
+    )
+    footer = struct.pack("<2I", zlib.crc32(data) & 0xFFFFFFFF, len(data))
+    return header + compressed + footer
+
+
+class BgzfWriter(object):
+    """
+    A file like object that writes BGZF compressed data.
+
+    Text is encoded as utf-8, so the writer can be used as outfile by
+    print_headers and print_variant. If an index format is given a tabix
+    (tbi) or csi index is built while the vcf lines are written and saved
+    next to the file when it is closed.
+
+    Args:
+        outfile (str or file): A path or a binary file handle
+        index_format (str): 'tbi', 'csi' or None
+        threads (int): Number of compression threads, 0 compresses in the
+                       calling thread
+        level (int): The zlib compression level
+    """
+
+    def __init__(
+        self, outfile, index_format=None, threads=BGZF_THREADS, level=zlib.Z_DEFAULT_COMPRESSION
+    ):
+        super(BgzfWriter, self).__init__()
+        if isinstance(outfile, str):
+            self.name = outfile
+            self.handle = open(outfile, "wb")
+            self.own_handle = True
+        else:
+            self.name = getattr(outfile, "name", None)
+            self.handle = outfile
+            self.own_handle = False
+
+        self.index = None
+        if index_format:
+            if self.own_handle:
+                self.index = VcfIndex(index_format=index_format)
+            else:
+                logger.warning("Can not write an index when the output is not a file")
+
+        self.level = level
+        self.closed = False
+        # Number of uncompressed bytes written
+        self.offset = 0
+        # The compressed offset of each block that is written
+        self.block_offsets = []
+        self.compressed_offset = 0
+
+        self._buffer = bytearray()
+        # The start of the line that is not finished, and what is seen of it
+        self._line_offset = 0
+        self._line = b""
+
+        self._executor = ThreadPoolExecutor(max_workers=threads) if threads else None
+        self._pending = deque()
+        self._max_pending = 4 * threads
+
+    def write(self, data):
+        """Write text or bytes"""
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        if self.index is not None:
+            self._index_lines(data)
+        self.offset += len(data)
+        self._buffer += data
+        while len(self._buffer) >= BGZF_BLOCK_SIZE:
+            self._add_block(bytes(self._buffer[:BGZF_BLOCK_SIZE]))
+            del self._buffer[:BGZF_BLOCK_SIZE]
+
+    def _index_lines(self, data):
+        """Add the lines that are finished in data to the index"""
+        start = 0
+        newline = data.find(b"\n")
+        while newline != -1:
+            line = self._line + data[start:newline]
+            line_end = self.offset + newline + 1
+            self.index.add_line(line, self._line_offset, line_end)
+            self._line = b""
+            self._line_offset = line_end
+            start = newline + 1
+            newline = data.find(b"\n", start)
+        if start < len(data):
+            self._line += data[start:]
+
+        if not self.index.is_sorted:
+            logger.warning("Variants are not sorted by position, no index will be written")
+            self.index = None
+
+    def _add_block(self, data):
+        """Compress a block, in the background if there are threads"""
+        if self._executor is None:
+            self._write_block(compress_block(data, self.level))
+            return
+
+        self._pending.append(self._executor.submit(compress_block, data, self.level))
+        # Write the blocks that are done, in order
+        while self._pending and (self._pending[0].done() or len(self._pending) > self._max_pending):
+            self._write_block(self._pending.popleft().result())
+
+    def _write_block(self, block):
+        self.block_offsets.append(self.compressed_offset)
+        self.handle.write(block)
+        self.compressed_offset += len(block)
+
+    def flush(self):
+        """Write the blocks that are compressed"""
+        while self._pending and self._pending[0].done():
+            self._write_block(self._pending.popleft().result())
+        self.handle.flush()
+
+    def close(self):
+        """Write the last block, the end of file marker and the index"""
+        if self.closed:
+            return
+        self.closed = True
+
+        if self._buffer:
+            self._add_block(bytes(self._buffer))
+            self._buffer = bytearray()
+        while self._pending:
+            self._write_block(self._pending.popleft().result())
+        if self._executor is not None:
+            self._executor.shutdown()
+
+        # The end of file block is where an offset at the end of the data points
+        self.block_offsets.append(self.compressed_offset)
+        self.handle.write(BGZF_EOF)
+        if self.own_handle:
+            self.handle.close()
+        else:
+            self.handle.flush()
+
+        if self.index is not None:
+            if self._line:
+                self.index.add_line(self._line, self._line_offset, self.offset)
+            index_file = "{0}.{1}".format(self.name, self.index.index_format)
+            logger.info("Writing index to {0}".format(index_file))
+            index_writer = BgzfWriter(index_file, threads=0)
+            index_writer.write(self.index.to_bytes(self.get_virtual_offset))
+            index_writer.close()
+
+    def get_virtual_offset(self, offset):
+        """Translate an offset in the uncompressed data to a virtual file offset
+
+        Args:
+            offset (int): A position in the uncompressed data
+
+        Returns:
+            virtual_offset (int): The compressed offset of the block shifted
+                                  16 bits with the offset in the block
+        """
+        block_number, block_offset = divmod(offset, BGZF_BLOCK_SIZE)
+        return (self.block_offsets[block_number] << 16) | block_offset
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
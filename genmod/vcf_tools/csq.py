@@ -0,0 +1,74 @@
+"""Get columns from the vep CSQ field of a variant"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CsqColumns(object):
+    """The columns of the CSQ field, with their indices resolved once
+
+    The CSQ field has one annotation per transcript, separated by ',', and
+    each annotation has the vep columns of the header separated by '|'. The
+    field can have more than 80 columns and many transcripts, while only a
+    few columns are used. Instead of making a dictionary of every annotation,
+    like get_vep_dict, each annotation is only split up to the last column
+    that is asked for.
+
+    Args:
+        vep_header (list): The vep columns of the CSQ field, see
+                           HeaderParser.vep_columns
+    """
+
+    def __init__(self, vep_header):
+        super(CsqColumns, self).__init__()
+        self.vep_header = list(vep_header or [])
+        self.indices = {}
+        for index, column in enumerate(self.vep_header):
+            self.indices.setdefault(column, index)
+
+    def __contains__(self, column):
+        return column in self.indices
+
+    def get_columns(self, csq_string, columns):
+        """Get some columns of each annotation of a CSQ field
+
+        Args:
+            csq_string (str): The raw CSQ field
+            columns (list): The names of the columns
+
+        Returns:
+            values (list): A tuple with the values of the columns for each
+                           annotation, a value is None if the column is not
+                           in the header or the annotation is too short
+        """
+        indices = [self.indices.get(column) for column in columns]
+        found = [index for index in indices if index is not None]
+        if not csq_string:
+            return []
+        if not found:
+            return [tuple(None for _ in indices) for _ in csq_string.split(",")]
+
+        maxsplit = max(found) + 1
+        values = []
+        for annotation in csq_string.split(","):
+            fields = annotation.split("|", maxsplit)
+            values.append(
+                tuple(
+                    fields[index] if index is not None and index < len(fields) else None
+                    for index in indices
+                )
+            )
+        return values
+
+    def get_column(self, csq_string, column):
+        """Get one column of each annotation of a CSQ field
+
+        Args:
+            csq_string (str): The raw CSQ field
+            column (str): The name of the column
+
+        Returns:
+            values (list): The value of the column for each annotation
+        """
+        return [values[0] for values in self.get_columns(csq_string, [column])]
@@ -44,11 +44,8 @@ Copyright (c) 2013 __MyCompanyName__. All rights reserved.
 class Genotype(object):
     """Holds information about a genotype"""
 
-    def __init__(self, GT="./.", AD=".,.", DP="0", GQ="0", **kwargs):
+    def __init__(self, GT="./.", AD=None, DP=None, GQ=None, **kwargs):
         GT = GT or "./."
-        AD = AD or ".,."
-        DP = DP or "0"
-        GQ = GQ or "0"
 
         self.phased = "|" in GT
         self.separator = "|" if self.phased else "/"
@@ -88,30 +85,35 @@ class Genotype(object):
 
         self.has_variant = self.homo_alt or self.heterozygote
 
-        # Parse allele depth
+        # The fields that are missing, or not projected by get_genotypes,
+        # keep the default values and are not converted
         self.ref_depth = 0
         self.alt_depth = 0
-        try:
-            allele_depths = [int(depth) if depth.isdigit() else 0 for depth in AD.split(",")]
-            self.ref_depth = allele_depths[0] if len(allele_depths) > 0 else 0
-            self.alt_depth = sum(allele_depths[1:]) if len(allele_depths) > 1 else 0
-        except Exception:
-            self.ref_depth = 0
-            self.alt_depth = 0
+        if AD:
+            # Parse allele depth
+            try:
+                allele_depths = [int(depth) if depth.isdigit() else 0 for depth in AD.split(",")]
+                self.ref_depth = allele_depths[0] if len(allele_depths) > 0 else 0
+                self.alt_depth = sum(allele_depths[1:]) if len(allele_depths) > 1 else 0
+            except Exception:
+                self.ref_depth = 0
+                self.alt_depth = 0
 
         self.quality_depth = self.ref_depth + self.alt_depth
 
         # Check the depth of coverage:
-        try:
-            self.depth_of_coverage = int(DP)
-        except ValueError:
-            pass
+        if DP:
+            try:
+                self.depth_of_coverage = int(DP)
+            except ValueError:
+                pass
 
         # Check the genotype quality
-        try:
-            self.genotype_quality = float(GQ)
-        except ValueError:
-            pass
+        if GQ:
+            try:
+                self.genotype_quality = float(GQ)
+            except ValueError:
+                pass
 
     def __str__(self):
         """Specifies what will be printed when printing the object."""
@@ -1,27 +1,68 @@
 from genmod.vcf_tools import Genotype
 
+from .variant_record import VariantRecord
 
-def get_genotypes(variant, individuals):
+# The FORMAT keys that are used by the Genotype class
+GENOTYPE_KEYS = ("GT", "AD", "DP", "GQ")
+
+# The positions of the projected keys for each FORMAT string that is seen
+FORMAT_INDEXES = {}
+
+
+def get_format_indexes(gt_format, format_keys):
+    """Get the positions of FORMAT keys in a FORMAT string
+
+    The positions are looked up once for each FORMAT string and set of keys.
+
+    Args:
+        gt_format (str): A FORMAT string, like GT:AD:DP:GQ:PL
+        format_keys (tuple): The FORMAT keys that should be projected
+
+    Returns:
+        indexes (tuple): (key, position) pairs for the keys that exist in the
+                         FORMAT string
+    """
+    indexes = FORMAT_INDEXES.get((gt_format, format_keys))
+    if indexes is None:
+        fields = gt_format.split(":")
+        indexes = tuple((key, fields.index(key)) for key in format_keys if key in fields)
+        FORMAT_INDEXES[(gt_format, format_keys)] = indexes
+    return indexes
+
+
+def get_genotypes(variant, individuals, format_keys=GENOTYPE_KEYS):
     """Create genotype objects
 
     Create Genotype objects for all individuals and return them in a
     dictionary
 
+    Only the FORMAT keys in format_keys are sliced out of the sample columns,
+    the keys that are not projected get the defaults of the Genotype class.
+
     Args:
-        variant (dict): A variant dict
+        variant (VariantRecord or dict): A variant
         individuals (list): A list with strings that are individual id:s
+        format_keys (tuple): The FORMAT keys that should be parsed
 
     Returns:
         genotype_dict (dict): A dictionary with individual id:s as strings
         and Genptype objects as keys
     """
-    gt_format = variant.get("FORMAT", "").split(":")
+    indexes = get_format_indexes(variant.get("FORMAT", ""), tuple(format_keys))
+    # The sample columns are only split up to the last projected key
+    max_split = max([position for _, position in indexes], default=0) + 1
 
     genotype_dict = {}
 
-    for individual in individuals:
-        gt_info = variant[individual].split(":")
-        gt_call = dict(zip(gt_format, gt_info))
+    if isinstance(variant, VariantRecord):
+        # The sample columns of a record are split once for all individuals
+        sample_columns = variant.get_samples(individuals)
+    else:
+        sample_columns = [variant[individual] for individual in individuals]
+
+    for individual, sample_column in zip(individuals, sample_columns):
+        gt_info = sample_column.split(":", max_split)
+        gt_call = {key: gt_info[position] for key, position in indexes if position < len(gt_info)}
 
         # Create a genotype object for this individual
         genotype_dict[individual] = Genotype(**gt_call)
@@ -0,0 +1,151 @@
+"""A lazy view of the INFO field of a variant"""
+
+import logging
+from collections.abc import MutableMapping
+
+from .parse_variant import get_info_value
+
+logger = logging.getLogger(__name__)
+
+
+def format_info(key, value):
+    """Format an INFO entry, a flag if the value is an empty list"""
+    if isinstance(value, list) or value is None:
+        return key
+    return "{0}={1}".format(key, value)
+
+
+class InfoView(MutableMapping):
+    """A mapping of the INFO keys of a variant to their raw values
+
+    The INFO field is not split up front. A key is searched for in the raw
+    string when it is first looked up, see get_info_value, and the value is
+    remembered. The INFO field of an annotated vcf can be tens of kilobytes
+    with the CSQ field, and most commands only need a few keys of it.
+
+    Keys that are set are recorded in edits and keys that are deleted in
+    deleted, the raw string is not changed until the edits are committed.
+    Flags have an empty list as value, like with get_info_dict.
+
+    The edits are written to an INFO field with render, that splits the raw
+    string once no matter how many keys were edited. An edited key keeps its
+    place in the field and new keys are added at the end, in the order they
+    were set.
+
+    Args:
+        info_line (str): The info field of a vcf variant
+    """
+
+    def __init__(self, info_line):
+        self.raw = info_line
+        self.edits = {}
+        self.deleted = set()
+        # The values that were looked up in the raw string, None if missing
+        self._values = {}
+
+    def _lookup(self, key):
+        """Get the value of a key, None if it is not in the view"""
+        if key in self.edits:
+            return self.edits[key]
+        if key in self.deleted:
+            return None
+        try:
+            return self._values[key]
+        except KeyError:
+            value = self._values[key] = get_info_value(self.raw, key)
+            return value
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        if value is None:
+            return default
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not None
+
+    def __setitem__(self, key, value):
+        self.deleted.discard(key)
+        self.edits[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self.edits.pop(key, None)
+        self.deleted.add(key)
+
+    @property
+    def is_edited(self):
+        """If any key was set or deleted since the view was made"""
+        return bool(self.edits or self.deleted)
+
+    def render(self):
+        """Get the INFO field with the edits
+
+        Returns:
+            info_line (str): The INFO field, '.' if it is empty
+        """
+        if not self.is_edited:
+            return self.raw
+        entries = []
+        rendered = set()
+        if self.raw and self.raw != ".":
+            for raw_info in self.raw.split(";"):
+                key = raw_info.split("=", 1)[0]
+                if key in self.edits:
+                    entries.append(format_info(key, self.edits[key]))
+                    rendered.add(key)
+                elif key not in self.deleted:
+                    entries.append(raw_info)
+        for key, value in self.edits.items():
+            if key not in rendered:
+                entries.append(format_info(key, value))
+        return ";".join(entries) or "."
+
+    def commit(self):
+        """Render the edits and make the result the raw string of the view
+
+        Returns:
+            info_line (str): The INFO field with the edits
+        """
+        info_line = self.render()
+        for key in self.deleted:
+            self._values[key] = None
+        self._values.update(self.edits)
+        self.raw = info_line
+        self.edits = {}
+        self.deleted = set()
+        return info_line
+
+    def raw_keys(self):
+        """Get the keys of the raw string in order, without the edits"""
+        keys = []
+        if self.raw:
+            for raw_info in self.raw.split(";"):
+                key = raw_info.split("=", 1)[0]
+                if key not in keys:
+                    keys.append(key)
+        return keys
+
+    def __iter__(self):
+        raw_keys = self.raw_keys()
+        for key in raw_keys:
+            if key not in self.deleted:
+                yield key
+        for key in self.edits:
+            if key not in raw_keys:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return "InfoView({0!r}, edits={1!r}, deleted={2!r})".format(
+            self.raw, self.edits, self.deleted
+        )
@@ -44,6 +44,35 @@ def get_info_dict(info_line):
     return variant_info
 
 
+def get_info_value(info_line, key):
+    """Get the raw value of one key from the info field of a variant
+
+    Searches for the key without splitting the whole info field, this is
+    cheaper than get_info_dict when only one value is needed.
+
+    Args:
+        info_line (str): The info field of a vcf variant
+        key (str): The info key to look for
+    Returns:
+        value (str): The raw value, an empty list if the key is a flag or
+                     None if the key is not in the info field
+    """
+    start = info_line.find(key)
+    while start != -1:
+        end = start + len(key)
+        if start == 0 or info_line[start - 1] == ";":
+            if end == len(info_line) or info_line[end] == ";":
+                return []
+            if info_line[end] == "=":
+                value_end = info_line.find(";", end)
+                if value_end == -1:
+                    return info_line[end + 1 :]
+                return info_line[end + 1 : value_end]
+        start = info_line.find(key, start + 1)
+
+    return None
+
+
 def get_variant_id(variant_dict):
     """Build a variant id
 
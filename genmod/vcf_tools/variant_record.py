@@ -0,0 +1,184 @@
+"""A compact record of a parsed variant line"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# The fixed columns of a vcf variant line
+VCF_COLUMNS = ("CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT")
+
+# The annotations that are added to a variant while it is annotated
+ANNOTATION_FIELDS = (
+    "info_dict",
+    "variant_id",
+    "annotation",
+    "vep_info",
+    "genotypes",
+    "compound_candidate",
+    "reduced_penetrance",
+    "compounds",
+    "inheritance_models",
+)
+
+# The keys of a record that are not samples
+RECORD_FIELDS = frozenset(VCF_COLUMNS + ANNOTATION_FIELDS)
+
+
+def get_sample_index(header_line):
+    """Get the position of each sample among the sample columns
+
+    Args:
+        header_line (list): A list with the header columns
+
+    Returns:
+        sample_index (dict): The sample ids as keys and their positions as
+                             values
+    """
+    samples = header_line[len(VCF_COLUMNS) :]
+    return {sample_id: position for position, sample_id in enumerate(samples)}
+
+
+def get_sample_offsets(samples):
+    """Get the offset of each sample column in the raw sample string
+
+    Args:
+        samples (str): The tab separated sample columns
+
+    Returns:
+        offsets (tuple): The offset where each sample column starts
+    """
+    offsets = [0]
+    position = samples.find("\t")
+    while position != -1:
+        offsets.append(position + 1)
+        position = samples.find("\t", position + 1)
+    return tuple(offsets)
+
+
+class VariantRecord(object):
+    """A variant with its fields in slots instead of a dictionary
+
+    The fixed vcf columns and the annotations of a variant are slots, and the
+    sample columns are kept as one raw string. The position of each sample
+    column is found the first time a sample is looked up, so the samples that
+    are never used are never split.
+
+    A record is used like a variant dictionary, variant['POS'] and
+    variant['<sample_id>'] give the raw column, and the annotations are set
+    and read with the same keys as before. Keys that are not vcf columns,
+    samples or annotations can not be set. A record is printed with to_line.
+
+    Args:
+        sample_index (dict): The positions of the sample columns, see
+                             get_sample_index. Shared by all records of a file.
+    """
+
+    __slots__ = VCF_COLUMNS + ANNOTATION_FIELDS + ("samples", "sample_index", "sample_offsets")
+
+    def __init__(self, sample_index=None):
+        self.samples = None
+        self.sample_index = sample_index or {}
+        self.sample_offsets = None
+
+    @classmethod
+    def from_line(cls, variant_line, sample_index):
+        """Parse a vcf variant line into a record
+
+        Args:
+            variant_line (str): A vcf variant line
+            sample_index (dict): The positions of the sample columns
+
+        Returns:
+            variant (VariantRecord)
+        """
+        record = cls(sample_index)
+        fields = variant_line.rstrip().split("\t", len(VCF_COLUMNS))
+        for column, value in zip(VCF_COLUMNS, fields):
+            setattr(record, column, value)
+        if len(fields) > len(VCF_COLUMNS):
+            record.samples = fields[-1]
+        return record
+
+    def get_sample(self, sample_id):
+        """Get the raw column of a sample, None if there is no such column"""
+        position = self.sample_index.get(sample_id)
+        if position is None or self.samples is None:
+            return None
+        offsets = self.sample_offsets
+        if offsets is None:
+            offsets = self.sample_offsets = get_sample_offsets(self.samples)
+        if position >= len(offsets):
+            return None
+        if position + 1 < len(offsets):
+            return self.samples[offsets[position] : offsets[position + 1] - 1]
+        return self.samples[offsets[position] :]
+
+    def get_samples(self, sample_ids):
+        """Get the raw columns of some samples
+
+        Args:
+            sample_ids (list): The sample ids
+
+        Returns:
+            columns (list): The raw column of each sample
+
+        Raises:
+            KeyError: If a sample has no column
+        """
+        columns = self.samples.split("\t") if self.samples is not None else []
+        try:
+            return [columns[self.sample_index[sample_id]] for sample_id in sample_ids]
+        except (KeyError, IndexError):
+            missing = [sample_id for sample_id in sample_ids if self.get_sample(sample_id) is None]
+            raise KeyError(missing[0])
+
+    def to_line(self):
+        """Get the record as a vcf variant line, without newline"""
+        fields = []
+        for column in VCF_COLUMNS:
+            value = getattr(self, column, None)
+            if value is None:
+                break
+            fields.append(value)
+        if self.samples is not None:
+            fields.append(self.samples)
+        return "\t".join(fields)
+
+    def __getitem__(self, key):
+        if key in RECORD_FIELDS:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        sample = self.get_sample(key)
+        if sample is None:
+            raise KeyError(key)
+        return sample
+
+    def __setitem__(self, key, value):
+        if key not in RECORD_FIELDS:
+            raise KeyError("{0} is not a field of a variant record".format(key))
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        if key in RECORD_FIELDS:
+            return hasattr(self, key)
+        return self.get_sample(key) is not None
+
+    def get(self, key, default=None):
+        if key in RECORD_FIELDS:
+            return getattr(self, key, default)
+        sample = self.get_sample(key)
+        if sample is None:
+            return default
+        return sample
+
+    def setdefault(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            self[key] = default
+            return default
+
+    def __repr__(self):
+        return "VariantRecord({0!r})".format(self.to_line())
@@ -0,0 +1,231 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+vcf_index.py
+
+Build a tabix (tbi) or csi index for a vcf while it is written.
+
+The index is built from the lines in the order they are written together
+with their offsets in the uncompressed data. The offsets are translated to
+virtual file offsets when the index is saved, when the sizes of the
+compressed blocks are known. See the SAMv1 specification for the formats.
+
+A record covers POS to POS + len(REF) - 1, or to END if the END key is in
+INFO, the same as tabix uses for vcf files.
+"""
+
+from __future__ import print_function
+
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+# Size of the smallest bin and of the windows of the linear index
+MIN_SHIFT = 14
+# The tabix header for a vcf: format, col_seq, col_beg, col_end, meta and skip
+TABIX_VCF_CONFIG = (2, 1, 2, 0, ord("#"), 0)
+
+
+def reg2bin(beg, end, min_shift=MIN_SHIFT, depth=5):
+    """Get the smallest bin that holds a 0-based, half open region"""
+    level = depth
+    shift = min_shift
+    first = ((1 << (depth * 3)) - 1) // 7
+    end -= 1
+    while level > 0:
+        if beg >> shift == end >> shift:
+            return first + (beg >> shift)
+        level -= 1
+        shift += 3
+        first -= 1 << (level * 3)
+    return 0
+
+
+def get_bin_start(bin_number, depth):
+    """Get the first window of the linear index that a bin covers"""
+    level = 0
+    parent = bin_number
+    while parent:
+        parent = (parent - 1) >> 3
+        level += 1
+    first = ((1 << (level * 3)) - 1) // 7
+    return (bin_number - first) << ((depth - level) * 3)
+
+
+def get_record_region(line):
+    """Get the 0-based, half open region of a vcf line
+
+    Args:
+        line (bytes): A vcf variant line without newline
+
+    Returns:
+        chrom (bytes), beg (int), end (int)
+    """
+    fields = line.split(b"\t", 8)
+    beg = int(fields[1]) - 1
+    end = beg + len(fields[3])
+    info = fields[7]
+    end_start = info.find(b"END=")
+    while end_start > 0 and info[end_start - 1 : end_start] != b";":
+        end_start = info.find(b"END=", end_start + 1)
+    if end_start != -1:
+        end_stop = info.find(b";", end_start)
+        try:
+            info_end = int(info[end_start + 4 : end_stop if end_stop != -1 else None])
+        except ValueError:
+            info_end = end
+        if info_end > beg:
+            end = info_end
+    return fields[0], beg, max(end, beg + 1)
+
+
+class Reference(object):
+    """The index of one contig"""
+
+    def __init__(self):
+        # Bins with lists of chunks, [start, end] in uncompressed offsets
+        self.bins = {}
+        self.linear = []
+        self.offset_start = None
+        self.offset_end = None
+        self.nr_records = 0
+
+
+class VcfIndex(object):
+    """
+    Collect the index of a vcf that is being written.
+
+    Args:
+        index_format (str): 'tbi' or 'csi'
+        min_shift (int): Size of the smallest bin
+    """
+
+    def __init__(self, index_format="tbi", min_shift=MIN_SHIFT):
+        super(VcfIndex, self).__init__()
+        if index_format not in ("tbi", "csi"):
+            raise ValueError("Unknown index format {0}".format(index_format))
+        self.index_format = index_format
+        self.min_shift = min_shift
+        # The tbi format has a fixed depth, a csi index can hold longer contigs
+        self.depth = 5 if index_format == "tbi" else 6
+        self.contigs = []
+        self.references = []
+        self.is_sorted = True
+        self._last_beg = -1
+
+    def add_line(self, line, start, end):
+        """Add a line of the vcf to the index
+
+        Args:
+            line (bytes): A line without newline
+            start (int): The offset of the line in the uncompressed data
+            end (int): The offset after the line in the uncompressed data
+        """
+        if not line or line.startswith(b"#"):
+            return
+
+        chrom, beg, record_end = get_record_region(line)
+        chrom = chrom.decode("utf-8")
+        if not self.contigs or chrom != self.contigs[-1]:
+            if chrom in self.contigs:
+                self.is_sorted = False
+                return
+            self.contigs.append(chrom)
+            self.references.append(Reference())
+            self._last_beg = -1
+        if beg < self._last_beg:
+            self.is_sorted = False
+            return
+        self._last_beg = beg
+
+        reference = self.references[-1]
+        if reference.offset_start is None:
+            reference.offset_start = start
+        reference.offset_end = end
+        reference.nr_records += 1
+
+        chunks = reference.bins.setdefault(reg2bin(beg, record_end, self.min_shift, self.depth), [])
+        if chunks and chunks[-1][1] == start:
+            chunks[-1][1] = end
+        else:
+            chunks.append([start, end])
+
+        linear = reference.linear
+        last_window = (record_end - 1) >> self.min_shift
+        if last_window >= len(linear):
+            linear.extend([None] * (last_window + 1 - len(linear)))
+        for window in range(beg >> self.min_shift, last_window + 1):
+            if linear[window] is None:
+                linear[window] = start
+
+    def _get_linear_index(self, reference, get_virtual_offset):
+        """Fill the empty windows and translate the linear index"""
+        linear = []
+        offset = reference.offset_start
+        for window_offset in reference.linear:
+            if window_offset is not None:
+                offset = window_offset
+            linear.append(get_virtual_offset(offset))
+        return linear
+
+    def to_bytes(self, get_virtual_offset):
+        """Serialise the index
+
+        Args:
+            get_virtual_offset (function): Translates an uncompressed offset
+                                           to a virtual file offset
+
+        Returns:
+            index (bytes): The uncompressed index
+        """
+        names = b"".join(contig.encode("utf-8") + b"\x00" for contig in self.contigs)
+        tabix_config = struct.pack("<7i", *(TABIX_VCF_CONFIG + (len(names),))) + names
+
+        if self.index_format == "tbi":
+            parts = [b"TBI\x01", struct.pack("<i", len(self.contigs)), tabix_config]
+        else:
+            parts = [
+                b"CSI\x01",
+                struct.pack("<3i", self.min_shift, self.depth, len(tabix_config)),
+                tabix_config,
+                struct.pack("<i", len(self.contigs)),
+            ]
+
+        # The pseudo bin holds the offsets and the number of records of a contig
+        meta_bin = ((1 << ((self.depth + 1) * 3)) - 1) // 7 + 1
+        for reference in self.references:
+            linear = self._get_linear_index(reference, get_virtual_offset)
+            bins = sorted(reference.bins.items())
+            parts.append(struct.pack("<i", len(bins) + 1))
+            for bin_number, chunks in bins:
+                if self.index_format == "tbi":
+                    parts.append(struct.pack("<Ii", bin_number, len(chunks)))
+                else:
+                    window = get_bin_start(bin_number, self.depth)
+                    bin_offset = linear[window] if window < len(linear) else 0
+                    parts.append(struct.pack("<IQi", bin_number, bin_offset, len(chunks)))
+                for chunk_start, chunk_end in chunks:
+                    parts.append(
+                        struct.pack(
+                            "<2Q", get_virtual_offset(chunk_start), get_virtual_offset(chunk_end)
+                        )
+                    )
+
+            meta_chunks = struct.pack(
+                "<4Q",
+                get_virtual_offset(reference.offset_start),
+                get_virtual_offset(reference.offset_end),
+                reference.nr_records,
+                0,
+            )
+            if self.index_format == "tbi":
+                parts.append(struct.pack("<Ii", meta_bin, 2) + meta_chunks)
+                parts.append(struct.pack("<i", len(linear)))
+                parts.append(struct.pack("<{0}Q".format(len(linear)), *linear))
+            else:
+                parts.append(struct.pack("<IQi", meta_bin, 0, 2) + meta_chunks)
+
+        # Number of records without coordinates
+        parts.append(struct.pack("<Q", 0))
+        return b"".join(parts)
@@ -0,0 +1,83 @@
+from click.testing import CliRunner
+from genmod.benchmark import compare_results, run_benchmark
+from genmod.benchmark.__main__ import cli
+from genmod.benchmark.harness import get_command_arguments
+
+
+def get_result(command, wall_time, peak_rss_mb, processes=None, exit_code=0):
+    return {
+        "command": command,
+        "nr_variants": 1000,
+        "processes": processes,
+        "wall_time": wall_time,
+        "peak_rss_mb": peak_rss_mb,
+        "exit_code": exit_code,
+    }
+
+
+def test_get_command_arguments():
+    """The commands get the files and options they need"""
+    assert get_command_arguments("models", "in.vcf", "in.ped", vep=True) == [
+        "models",
+        "in.vcf",
+        "-f",
+        "in.ped",
+        "--vep",
+    ]
+    assert get_command_arguments("sort", "in.vcf", "in.ped") == ["sort", "in.vcf"]
+
+
+def test_compare_results():
+    """Runs that are in both results are compared, failed runs are skipped"""
+    old_results = {
+        "results": [
+            get_result("models", 2.0, 100.0, processes=1),
+            get_result("models", 2.0, 100.0, processes=4),
+            get_result("sort", 1.0, 50.0),
+        ]
+    }
+    new_results = {
+        "results": [
+            get_result("models", 1.0, 110.0, processes=1),
+            get_result("models", 1.0, 110.0, processes=2),
+            get_result("sort", 1.0, 50.0, exit_code=1),
+        ]
+    }
+
+    comparisons = compare_results(old_results, new_results)
+
+    assert comparisons == [
+        {
+            "command": "models",
+            "nr_variants": 1000,
+            "processes": 1,
+            "time_ratio": 0.5,
+            "memory_ratio": 1.1,
+        }
+    ]
+
+
+def test_run_benchmark(tmpdir):
+    """Each command is timed for each size"""
+    results = run_benchmark(str(tmpdir), sizes=[200], commands=["models", "sort"])
+
+    assert [(result["command"], result["exit_code"]) for result in results["results"]] == [
+        ("models", 0),
+        ("sort", 0),
+    ]
+    assert results["results"][0]["processes"] == 1
+    assert results["results"][0]["peak_rss_mb"] > 0
+    assert tmpdir.join("sort_200.vcf").check()
+
+
+def test_run_command_keeps_workdir(tmpdir):
+    """The synthetic files and the outputs are kept in the workdir"""
+    outfile = str(tmpdir.join("results.json"))
+    result = CliRunner().invoke(
+        cli,
+        ["run", "--sizes", "200", "-p", "1", "-c", "sort", "-w", str(tmpdir), "-o", outfile],
+    )
+
+    assert result.exit_code == 0
+    assert tmpdir.join("synthetic_200.vcf").check()
+    assert tmpdir.join("sort_200.vcf").check()
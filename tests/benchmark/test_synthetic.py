@@ -0,0 +1,89 @@
+from click.testing import CliRunner
+from genmod.benchmark import generate_variant_lines, get_ped_lines, write_synthetic_files
+from genmod.commands import models_command
+from genmod.vcf_tools import HeaderParser
+
+
+def test_get_ped_lines():
+    """Each family type gets its members, with ids that are unique in the cohort"""
+    ped_lines = get_ped_lines(["trio", "singleton", "duo"])
+
+    assert ped_lines[1:] == [
+        "1\tproband_1\tfather_1\tmother_1\t1\t2",
+        "1\tmother_1\t0\t0\t2\t1",
+        "1\tfather_1\t0\t0\t1\t1",
+        "2\tproband_2\t0\t0\t1\t2",
+        "3\tproband_3\t0\tmother_3\t2\t2",
+        "3\tmother_3\t0\t0\t2\t1",
+    ]
+
+
+def test_generate_variant_lines_seeded():
+    """The same seed gives the same variants"""
+    lines = list(generate_variant_lines(500, ["trio"], seed=3))
+
+    assert len(lines) == 500
+    assert lines == list(generate_variant_lines(500, ["trio"], seed=3))
+    assert lines != list(generate_variant_lines(500, ["trio"], seed=4))
+
+
+def test_generate_variant_lines_sorted():
+    """The variants are sorted on position within each chromosome"""
+    positions = {}
+    for line in generate_variant_lines(2000, ["quartet"], sv_fraction=0.1):
+        columns = line.split("\t")
+        positions.setdefault(columns[0], []).append(int(columns[1]))
+        assert len(columns) == 9 + 4
+
+    for chrom_positions in positions.values():
+        assert chrom_positions == sorted(chrom_positions)
+    assert "X" in positions
+
+
+def test_generate_variant_lines_inherited():
+    """The alleles of a child come from the parents, apart from a few de novo calls"""
+    nr_not_inherited = 0
+    for line in generate_variant_lines(1000, ["trio"], seed=2):
+        proband, mother, father = [column.split(":")[0] for column in line.split("\t")[9:]]
+        if "." in proband + mother + father:
+            continue
+        first, second = proband.split("/")
+        if not (first in father and second in mother or first in mother and second in father):
+            nr_not_inherited += 1
+
+    assert nr_not_inherited < 10
+
+
+def test_generate_variant_lines_vep():
+    """With vep every variant gets a CSQ field with one entry per transcript of each gene"""
+    lines = list(generate_variant_lines(300, ["singleton"], vep=True, nr_transcripts=2))
+
+    for line in lines:
+        info = dict(
+            entry.split("=", 1) if "=" in entry else (entry, True)
+            for entry in line.split("\t")[7].split(";")
+        )
+        genes = info["Annotation"].split(",") if "Annotation" in info else []
+        assert len(info["CSQ"].split(",")) == max(1, 2 * len(genes))
+
+
+def test_synthetic_files_annotate_models(tmpdir):
+    """The synthetic files can be annotated by genmod"""
+    vcf_path = str(tmpdir.join("synthetic.vcf"))
+    ped_path = str(tmpdir.join("synthetic.ped"))
+    write_synthetic_files(vcf_path, ped_path, 1000, ["trio", "duo"], vep=True)
+
+    head = HeaderParser()
+    with open(vcf_path) as vcf_file:
+        for line in vcf_file:
+            if line.startswith("##"):
+                head.parse_meta_data(line.rstrip())
+            elif line.startswith("#"):
+                head.parse_header_line(line.rstrip())
+    assert "Consequence" in head.vep_columns
+    assert len(head.individuals) == 5
+
+    result = CliRunner().invoke(models_command, [vcf_path, "-f", ped_path, "--vep"])
+
+    assert result.exit_code == 0
+    assert "GeneticModels=" in result.output
@@ -1,9 +1,13 @@
+import os
 from tempfile import NamedTemporaryFile
 
+import pytest
+import tabix
 from click.testing import CliRunner
 from genmod import logger
 from genmod.commands import models_command
 from genmod.log import init_log
+from genmod.utils import coalesce_batches
 from test_utils import generate_variants_from_file
 
 ANNOTATED_VCF_FILE = "tests/fixtures/test_vcf_annotated.vcf"
@@ -11,8 +15,10 @@ VCF_FILE = "tests/fixtures/test_vcf_regions.vcf"
 VCF_FILE_WITH_CHR = "tests/fixtures/test_vcf_regions_with_chr.vcf"
 FAMILY_FILE = "tests/fixtures/recessive_trio.ped"
 BAD_FAMILY_FILE = "tests/fixtures/annotate_models/one_ind.ped"
+TWO_TRIOS_FILE = "tests/fixtures/annotate_models/two_trios.ped"
 EMPTY_VCF_FILE = "tests/fixtures/empty.vcf"
 SV_SAME_POS_VCF_FILE = "tests/fixtures/test_vcf_sv_same_pos.vcf"
+INDEXED_VCF_FILE = "tests/fixtures/annotate_models/test_vcf_regions_indexed.vcf.gz"
 
 init_log(logger, loglevel="INFO")
 
@@ -131,3 +137,235 @@ def test_annotate_models_same_pos_sv_keeps_distinct_end_variants():
 
     assert len(output_variants) == 2
     assert {variant["info_dict"].get("END") for variant in output_variants} == {"1001", "101"}
+
+
+def _get_variant_lines(output):
+    """Return the variant lines of an output with the compound pairs sorted."""
+    variant_lines = []
+    for line in output.splitlines():
+        if line.startswith("#"):
+            continue
+        info = []
+        for entry in line.split("\t")[7].split(";"):
+            if entry.startswith("Compounds="):
+                family_id, compounds = entry.split(":", 1)
+                entry = family_id + ":" + "|".join(sorted(compounds.split("|")))
+            info.append(entry)
+        variant_lines.append(line.split("\t")[:7] + info)
+    return variant_lines
+
+
+def test_annotate_models_region_shards():
+    """Test that region shards give the same annotations as the whole file"""
+    runner = CliRunner()
+    result = runner.invoke(models_command, [INDEXED_VCF_FILE, "-f", FAMILY_FILE])
+    assert result.exit_code == 0
+    expected = _get_variant_lines(result.output)
+
+    for procs in ["1", "2"]:
+        # A shard window starts inside the NOC2L batch
+        result = runner.invoke(
+            models_command,
+            [
+                INDEXED_VCF_FILE,
+                "-f",
+                FAMILY_FILE,
+                "--processes",
+                procs,
+                "--region-shards",
+                "--shard-size",
+                "440000",
+            ],
+        )
+        assert result.exit_code == 0
+        assert _get_variant_lines(result.output) == expected
+
+
+def test_annotate_models_region_shards_not_indexed():
+    """Test that region shards can not be used without an index"""
+    runner = CliRunner()
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE, "--region-shards"])
+
+    assert result.exit_code == 1
+
+
+def test_annotate_models_bgzf_outfile():
+    """Test that models can write a bgzipped vcf with a tabix index"""
+    runner = CliRunner()
+    with NamedTemporaryFile(suffix=".vcf.gz") as temp_file:
+        result = runner.invoke(
+            models_command,
+            [
+                VCF_FILE,
+                "-f",
+                FAMILY_FILE,
+                "--outfile",
+                temp_file.name,
+                "--output-format",
+                "vcf.gz",
+                "--index",
+                "tbi",
+            ],
+        )
+        assert result.exit_code == 0
+        records = list(tabix.open(temp_file.name).query("10", 0, 100000000))
+        os.remove(temp_file.name + ".tbi")
+
+    assert len(records) == 4
+    assert "GeneticModels=" in records[0][7]
+
+
+def test_annotate_models_numpy_engine(monkeypatch):
+    """Test that the numpy engine gives the same annotations as the python engine"""
+    pytest.importorskip("numpy")
+    # Check the small batches of the test file with arrays as well
+    monkeypatch.setattr("genmod.annotate_models.genotype_matrix.MIN_MATRIX_BATCH_SIZE", 1)
+    runner = CliRunner()
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE])
+    assert result.exit_code == 0
+    expected = _get_variant_lines(result.output)
+
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE, "--engine", "numpy"])
+
+    assert result.exit_code == 0
+    assert _get_variant_lines(result.output) == expected
+
+
+def test_annotate_models_max_batch_size():
+    """Test that split batches give the same annotations as whole batches"""
+    runner = CliRunner()
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE])
+    assert result.exit_code == 0
+    expected = _get_variant_lines(result.output)
+
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE, "--max-batch-size", "1"])
+
+    assert result.exit_code == 0
+    assert _get_variant_lines(result.output) == expected
+
+
+def test_annotate_models_max_batch_size_below_one():
+    """Test that a max batch size below one is rejected"""
+    runner = CliRunner()
+    for max_batch_size in ["0", "-1"]:
+        result = runner.invoke(
+            models_command, [VCF_FILE, "-f", FAMILY_FILE, "--max-batch-size", max_batch_size]
+        )
+
+        assert result.exit_code == 2
+        assert "--max-batch-size" in result.output
+
+
+def test_annotate_models_singleton_chunks(monkeypatch):
+    """Test that chunks of singletons give the same annotations as one batch per singleton"""
+    runner = CliRunner()
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE])
+    assert result.exit_code == 0
+    expected = _get_variant_lines(result.output)
+
+    monkeypatch.setattr(
+        "genmod.commands.annotate_models.coalesce_batches",
+        lambda batches: coalesce_batches(batches, chunk_size=1),
+    )
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE])
+
+    assert result.exit_code == 0
+    assert _get_variant_lines(result.output) == expected
+
+
+def test_annotate_models_duplicated_variant():
+    """Test that both copies of a duplicated variant in a gene batch are annotated"""
+    with open(VCF_FILE) as vcf_file:
+        lines = vcf_file.readlines()
+    duplicated = [line for line in lines if line.startswith("10\t76154073\t")]
+    with NamedTemporaryFile("w", suffix=".vcf", delete=False) as temp_file:
+        for line in lines:
+            temp_file.write(line)
+            if line in duplicated:
+                temp_file.write(line)
+
+    runner = CliRunner()
+    result = runner.invoke(models_command, [temp_file.name, "-f", FAMILY_FILE])
+    os.remove(temp_file.name)
+
+    assert result.exit_code == 0
+    copies = [line for line in _get_variant_lines(result.output) if line[1] == "76154073"]
+    assert len(copies) == 2
+    assert copies[0] == copies[1]
+    assert "GeneticModels=1:AD_dn|AR_comp_dn" in copies[0]
+    assert "Compounds=1:10_76154051_A_G|10_76154074_C_G|10_76154076_G_C" in copies[0]
+
+
+def test_annotate_models_family_shards():
+    """Test that family shards give the same annotations as all families in one process"""
+    runner = CliRunner()
+    result = runner.invoke(models_command, [VCF_FILE, "-f", TWO_TRIOS_FILE])
+    assert result.exit_code == 0
+    expected = _get_variant_lines(result.output)
+    assert "GeneticModels=1:" in str(expected)
+
+    result = runner.invoke(
+        models_command, [VCF_FILE, "-f", TWO_TRIOS_FILE, "--family-shards", "-p", "2"]
+    )
+
+    assert result.exit_code == 0
+    assert _get_variant_lines(result.output) == expected
+
+
+def test_annotate_models_slow_batches():
+    """Test that the slowest batches are reported without changing the output"""
+    runner = CliRunner()
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE])
+    assert result.exit_code == 0
+    expected = _get_variant_lines(result.stdout)
+
+    result = runner.invoke(
+        models_command, [VCF_FILE, "-f", FAMILY_FILE, "--slow-batches", "2", "-p", "2"]
+    )
+
+    assert result.exit_code == 0
+    assert _get_variant_lines(result.stdout) == expected
+    report = result.stderr.splitlines()
+    assert report[0].startswith("#seconds")
+    assert len(report) == 3
+
+
+def test_annotate_models_slow_batches_negative():
+    """Test that a negative number of slow batches is rejected"""
+    runner = CliRunner()
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE, "--slow-batches", "-1"])
+
+    assert result.exit_code == 2
+    assert "--slow-batches" in result.output
+
+
+def test_annotate_models_slow_batches_split():
+    """Test that a split batch is reported with its own variants, not the context"""
+    runner = CliRunner()
+    result = runner.invoke(
+        models_command,
+        [VCF_FILE, "-f", FAMILY_FILE, "--slow-batches", "100", "--max-batch-size", "1"],
+    )
+
+    assert result.exit_code == 0
+    report = result.stderr.splitlines()
+    assert report[0].split("\t")[2:6] == ["variants", "candidates", "checked", "pairs"]
+    assert [line.split("\t")[2] for line in report[1:]] == ["1"] * (len(report) - 1)
+
+
+def test_annotate_models_memory_budget(monkeypatch):
+    """Test that waiting for the results when the printer is full gives the same output"""
+    runner = CliRunner()
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE, "--memory-budget", "0"])
+    assert result.exit_code == 0
+    expected = _get_variant_lines(result.output)
+
+    # The printer is full as soon as one batch is not printed
+    monkeypatch.setattr(
+        "genmod.utils.variant_printer.BatchPrinter.is_full",
+        property(lambda batch_printer: batch_printer.nr_waiting > 0),
+    )
+    result = runner.invoke(models_command, [VCF_FILE, "-f", FAMILY_FILE, "-p", "2"])
+
+    assert result.exit_code == 0
+    assert _get_variant_lines(result.output) == expected
@@ -0,0 +1,81 @@
+import json
+import os
+import tracemalloc
+
+from click.testing import CliRunner
+from genmod.commands.base import cli
+from genmod.memory_report import (
+    MEMORY_DIR_VARIABLE,
+    MEMORY_RUN_VARIABLE,
+    get_top_sites,
+    write_memory_summary,
+)
+
+VCF_FILE = "tests/fixtures/test_vcf_regions.vcf"
+FAMILY_FILE = "tests/fixtures/recessive_trio.ped"
+
+
+def test_memory_report_models(tmpdir):
+    """Test that the main process and each worker write a memory report"""
+    memory_dir = str(tmpdir.join("memory"))
+    runner = CliRunner()
+
+    result = runner.invoke(
+        cli, ["--memory-report", memory_dir, "models", VCF_FILE, "-f", FAMILY_FILE, "-p", "2"]
+    )
+
+    assert result.exit_code == 0
+    reports = sorted(os.listdir(memory_dir))
+    assert len([name for name in reports if name.startswith("VariantAnnotator-")]) == 2
+    main_report = [name for name in reports if name.startswith("main-")]
+    assert len(main_report) == 1
+    assert "memory_summary.txt" in reports
+
+    with open(os.path.join(memory_dir, main_report[0])) as memory_file:
+        checkpoints = json.load(memory_file)["checkpoints"]
+    assert [checkpoint["stage"] for checkpoint in checkpoints] == [
+        "resources",
+        "header",
+        "batching",
+        "printing",
+        "end",
+    ]
+    assert MEMORY_DIR_VARIABLE not in os.environ
+    assert not tracemalloc.is_tracing()
+
+
+def test_get_top_sites():
+    """Test that the largest allocation sites are found"""
+    tracemalloc.start()
+    try:
+        data = [bytearray(1024 * 1024)]
+        sites = get_top_sites(tracemalloc.take_snapshot(), nr_of_sites=1)
+    finally:
+        tracemalloc.stop()
+
+    assert len(data) == 1
+    assert sites[0]["site"].startswith(__file__)
+    assert sites[0]["size_kb"] >= 1024
+
+
+def test_write_memory_summary_no_reports(tmpdir):
+    assert write_memory_summary(str(tmpdir)) is None
+
+
+def test_memory_report_reused_directory(tmpdir):
+    """Test that the summary only sums up the reports of the last run"""
+    memory_dir = str(tmpdir.join("memory"))
+    runner = CliRunner()
+
+    for _ in range(2):
+        result = runner.invoke(
+            cli, ["--memory-report", memory_dir, "models", VCF_FILE, "-f", FAMILY_FILE, "-p", "2"]
+        )
+        assert result.exit_code == 0
+
+    reports = [name for name in os.listdir(memory_dir) if name.startswith("main-")]
+    assert len(reports) == 2
+    with open(os.path.join(memory_dir, "memory_summary.txt")) as summary:
+        processes = summary.read().split("\n\n")[0].splitlines()[1:]
+    assert len(processes) == 3
+    assert MEMORY_RUN_VARIABLE not in os.environ
@@ -0,0 +1,85 @@
+import json
+import os
+
+from click.testing import CliRunner
+from genmod.commands.base import cli
+from genmod.metrics import METRICS_DIR_VARIABLE, Metrics, get_batch_bin, get_summary
+
+VCF_FILE = "tests/fixtures/test_vcf_regions.vcf"
+FAMILY_FILE = "tests/fixtures/recessive_trio.ped"
+
+
+def test_get_batch_bin():
+    """Test that the batch sizes are binned by powers of two"""
+    assert get_batch_bin(1) == "1"
+    assert get_batch_bin(2) == "2-3"
+    assert get_batch_bin(3) == "2-3"
+    assert get_batch_bin(4) == "4-7"
+    assert get_batch_bin(500) == "256-511"
+
+
+def test_metrics():
+    """Test that the stages, batches and samples are recorded"""
+    metrics = Metrics("test")
+
+    with metrics.timer("parse"):
+        pass
+    with metrics.timer("parse"):
+        pass
+    assert list(metrics.iterate("read", [1, 2])) == [1, 2]
+    metrics.add_batch(1)
+    metrics.add_batch(5)
+    metrics.sample(nr_printed=6)
+    # Samples that come too close are skipped
+    metrics.sample(nr_printed=6)
+
+    result = metrics.to_dict()
+
+    assert result["stages"]["parse"]["calls"] == 2
+    # The end of the iteration is timed as well
+    assert result["stages"]["read"]["calls"] == 3
+    assert result["nr_of_variants"] == 6
+    assert result["batch_sizes"] == {"1": 1, "4-7": 1}
+    assert len(result["samples"]) == 1
+    assert result["samples"][0]["variants_printed"] == 6
+
+
+def test_get_summary_bound():
+    """Test that a run where the workers wait is bound by the main process"""
+    main_metrics = {"elapsed": 10, "nr_of_variants": 1000, "stages": {}}
+    workers = [{"utilisation": 0.2}, {"utilisation": 0.4}]
+
+    summary = get_summary(main_metrics, workers)
+
+    assert summary["variants_per_second"] == 100
+    assert summary["worker_utilisation"] == 0.3
+    assert summary["bound"] == "main process"
+
+    main_metrics["stages"]["put_wait"] = {"seconds": 8, "calls": 10}
+    summary = get_summary(main_metrics, [{"utilisation": 0.9}])
+
+    assert summary["bound"] == "workers"
+
+
+def test_metrics_json_models(tmpdir):
+    """Test that the metrics of the main process and the workers are written"""
+    metrics_path = str(tmpdir.join("metrics.json"))
+    runner = CliRunner()
+
+    result = runner.invoke(
+        cli, ["--metrics-json", metrics_path, "models", VCF_FILE, "-f", FAMILY_FILE, "-p", "2"]
+    )
+
+    assert result.exit_code == 0
+    with open(metrics_path) as metrics_file:
+        metrics = json.load(metrics_file)
+    assert metrics["command"] == "models"
+    assert metrics["summary"]["nr_of_workers"] == 2
+    assert metrics["main"]["nr_of_variants"] == sum(
+        worker["nr_of_variants"] for worker in metrics["workers"]
+    )
+    assert "put_wait" in metrics["main"]["stages"]
+    for worker in metrics["workers"]:
+        assert worker["name"].startswith("VariantAnnotator-")
+        assert "models" in worker["stages"]
+    assert METRICS_DIR_VARIABLE not in os.environ
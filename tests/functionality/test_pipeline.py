@@ -0,0 +1,144 @@
+import pytest
+from click.testing import CliRunner
+from genmod import logger
+from genmod.commands import (
+    annotate_variant_command,
+    models_command,
+    pipeline_command,
+    score_command,
+    score_compounds_command,
+    sort_command,
+)
+from genmod.commands.pipeline import read_pipeline_config
+from genmod.log import init_log
+from validate import ValidateError
+
+VCF_FILE = "tests/fixtures/test_vcf_regions.vcf"
+EMPTY_VCF_FILE = "tests/fixtures/empty.vcf"
+FAMILY_FILE = "tests/fixtures/recessive_trio.ped"
+SCORE_CONFIG = "tests/fixtures/score_variants/genmod_example.ini"
+
+PIPELINE_CONFIG = """
+[annotate]
+  regions = True
+[models]
+  family_file = {0}
+[score]
+  score_config = {1}
+  skip_plugin_check = True
+[compound]
+[sort]
+""".format(FAMILY_FILE, SCORE_CONFIG)
+
+init_log(logger, loglevel="INFO")
+
+
+def _write_config(tmp_path, content):
+    config_file = tmp_path / "pipeline.ini"
+    config_file.write_text(content)
+    return str(config_file)
+
+
+def _get_lines(path):
+    """Get the lines of a vcf without the lines that hold the date"""
+    with open(path) as f:
+        return [line for line in f if not line.startswith(("##genmod", "##Software"))]
+
+
+def test_pipeline_same_as_commands(tmp_path):
+    """The pipeline should give the same result as running the commands in sequence"""
+    runner = CliRunner()
+    outfiles = [str(tmp_path / "{0}.vcf".format(i)) for i in range(5)]
+    commands = [
+        (annotate_variant_command, [VCF_FILE, "--regions"]),
+        (models_command, [outfiles[0], "-f", FAMILY_FILE]),
+        (
+            score_command,
+            [outfiles[1], "-c", SCORE_CONFIG, "-f", FAMILY_FILE, "--skip_plugin_check"],
+        ),
+        (score_compounds_command, [outfiles[2]]),
+        (sort_command, [outfiles[3]]),
+    ]
+    for (command, arguments), command_outfile in zip(commands, outfiles):
+        result = runner.invoke(command, arguments + ["-o", command_outfile])
+        assert result.exit_code == 0
+
+    pipeline_outfile = str(tmp_path / "pipeline.vcf")
+    result = runner.invoke(
+        pipeline_command,
+        [
+            VCF_FILE,
+            "-c",
+            _write_config(tmp_path, PIPELINE_CONFIG),
+            "-o",
+            pipeline_outfile,
+        ],
+    )
+
+    assert result.exit_code == 0
+    assert _get_lines(pipeline_outfile) == _get_lines(outfiles[4])
+
+
+def test_pipeline_empty_vcf(tmp_path):
+    """An empty vcf gives the headers of all stages"""
+    runner = CliRunner()
+    result = runner.invoke(
+        pipeline_command, [EMPTY_VCF_FILE, "-c", _write_config(tmp_path, PIPELINE_CONFIG)]
+    )
+
+    assert result.exit_code == 0
+    assert "ID=CompoundsNormalized" in result.output
+
+
+def test_pipeline_removes_temp_file_on_error(tmp_path, monkeypatch):
+    """The temp file of the sorted variants is removed when the run fails"""
+    temp_dir = tmp_path / "temp"
+    temp_dir.mkdir()
+
+    def fail_sort(infile, mode):
+        raise IOError("sort failed")
+
+    monkeypatch.setattr("genmod.commands.pipeline.sort_variants", fail_sort)
+    runner = CliRunner()
+    result = runner.invoke(
+        pipeline_command,
+        [
+            VCF_FILE,
+            "-c",
+            _write_config(tmp_path, PIPELINE_CONFIG),
+            "--temp_dir",
+            str(temp_dir),
+        ],
+    )
+
+    assert result.exit_code != 0
+    assert list(temp_dir.iterdir()) == []
+
+
+def test_pipeline_unknown_stage(tmp_path):
+    """Stages that do not exist are not accepted"""
+    runner = CliRunner()
+    result = runner.invoke(
+        pipeline_command, [VCF_FILE, "-c", _write_config(tmp_path, "[filter]\n")]
+    )
+
+    assert result.exit_code == 1
+
+
+def test_read_pipeline_config_compound_needs_score(tmp_path):
+    """The compound stage scores compounds on the rank scores"""
+    config_file = _write_config(tmp_path, "[compound]\n  threshold = 10\n")
+
+    with pytest.raises(ValidateError):
+        read_pipeline_config(config_file)
+
+
+def test_read_pipeline_config_stages(tmp_path):
+    """The stages are returned in the order they run"""
+    config_file = _write_config(tmp_path, "[sort]\n[annotate]\n  regions = True\n")
+
+    config, stages = read_pipeline_config(config_file)
+
+    assert stages == ["annotate", "sort"]
+    assert config["annotate"]["regions"] is True
+    assert config["sort"]["position"] is False
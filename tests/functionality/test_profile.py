@@ -0,0 +1,46 @@
+import os
+import pstats
+
+from click.testing import CliRunner
+from genmod.commands.base import cli
+from genmod.profiling import PROFILE_DIR_VARIABLE, PROFILE_RUN_VARIABLE
+
+VCF_FILE = "tests/fixtures/test_vcf_regions.vcf"
+FAMILY_FILE = "tests/fixtures/recessive_trio.ped"
+
+
+def test_profile_models(tmpdir):
+    """Test that the main process and each worker write a profile"""
+    profile_dir = str(tmpdir.join("profile"))
+    runner = CliRunner()
+
+    result = runner.invoke(
+        cli, ["--profile", profile_dir, "models", VCF_FILE, "-f", FAMILY_FILE, "-p", "2"]
+    )
+
+    assert result.exit_code == 0
+    profiles = sorted(os.listdir(profile_dir))
+    assert len([name for name in profiles if name.startswith("VariantAnnotator-")]) == 2
+    assert len([name for name in profiles if name.startswith("main-")]) == 1
+    assert "summary.txt" in profiles
+    assert pstats.Stats(os.path.join(profile_dir, "merged.pstats")).total_calls
+    assert PROFILE_DIR_VARIABLE not in os.environ
+
+
+def test_profile_reused_directory(tmpdir):
+    """Test that the summary only merges the profiles of the last run"""
+    profile_dir = str(tmpdir.join("profile"))
+    runner = CliRunner()
+
+    for _ in range(2):
+        result = runner.invoke(
+            cli, ["--profile", profile_dir, "models", VCF_FILE, "-f", FAMILY_FILE, "-p", "2"]
+        )
+        assert result.exit_code == 0
+
+    profiles = [name for name in os.listdir(profile_dir) if name.startswith("main-")]
+    assert len(profiles) == 2
+    with open(os.path.join(profile_dir, "summary.txt")) as summary:
+        processes = summary.read().split("\n\n")[0].splitlines()[1:]
+    assert len(processes) == 3
+    assert PROFILE_RUN_VARIABLE not in os.environ
@@ -1,10 +1,21 @@
+import copy
+import random
+
+import pytest
+from genmod.annotate_models.genetic_models import (
+    check_compound_candidate,
+    check_compound_pairs,
+    check_genetic_models,
+    check_parents,
+)
 from genmod.annotate_models.models.compound_model import (
     check_compounds,
     get_genotype,
     get_phase_set,
     variants_on_same_allele,
 )
-from genmod.vcf_tools import Genotype
+from genmod.utils import generate_pairs
+from genmod.vcf_tools import Genotype, get_genotypes
 from ped_parser import FamilyParser
 
 
@@ -252,3 +263,144 @@ def test_check_compounds_false_when_healthy_parent_has_both_variants():
     )
 
     assert check_compounds(variant_1, variant_2, family=family, phased=False) is False
+
+
+PAIR_FAMILIES = {
+    "trio_with_sister": [
+        "1\tchild\tfather\tmother\t1\t2\n",
+        "1\tsister\tfather\tmother\t2\t1\n",
+        "1\tfather\t0\t0\t1\t1\n",
+        "1\tmother\t0\t0\t2\t1\n",
+    ],
+    "affected_siblings": [
+        "1\tchild\tfather\tmother\t1\t2\n",
+        "1\tsister\tfather\tmother\t2\t2\n",
+        "1\tfather\t0\t0\t1\t1\n",
+        "1\tmother\t0\t0\t2\t0\n",
+    ],
+    "duo": [
+        "1\tchild\t0\tmother\t1\t2\n",
+        "1\tmother\t0\t0\t2\t1\n",
+    ],
+    "single": [
+        "1\tchild\t0\t0\t1\t2\n",
+    ],
+}
+
+
+def check_all_pairs(variant_batch, family, compound_candidates, phased, strict):
+    """Check every pair of candidates, the way genmod did before the pairs were bucketed"""
+    family_id = family.family_id
+    individuals = family.individuals
+    for id_1, id_2 in generate_pairs(compound_candidates):
+        variant_1 = variant_batch[id_1]
+        variant_2 = variant_batch[id_2]
+        if not variant_1["annotation"].intersection(variant_2["annotation"]):
+            continue
+        models_1 = variant_1["inheritance_models"][family_id]
+        models_2 = variant_2["inheritance_models"][family_id]
+        if len(individuals) == 1:
+            variant_1["compounds"][family_id].add(id_2)
+            variant_2["compounds"][family_id].add(id_1)
+            models_1["AR_comp"] = True
+            models_2["AR_comp"] = True
+        elif check_compounds(variant_1, variant_2, family, phased):
+            parents_found = False
+            for individual_id, individual in individuals.items():
+                if individual.has_parents:
+                    check_parents("compound", individual_id, family, variant_1, variant_2, strict)
+                    parents_found = True
+            if not parents_found:
+                models_1["AR_comp"] = True
+                models_2["AR_comp"] = True
+            if models_1["AR_comp"] or models_1["AR_comp_dn"]:
+                variant_1["compounds"][family_id].add(id_2)
+            if models_2["AR_comp"] or models_2["AR_comp_dn"]:
+                variant_2["compounds"][family_id].add(id_1)
+
+
+def get_candidate_batch(rng, family, strict, nr_variants=80):
+    """Build a batch of random variants and return it with the compound candidates"""
+    individuals = list(family.individuals)
+    variant_batch = {}
+    candidates = []
+    for position in range(1, nr_variants + 1):
+        variant = {
+            "CHROM": "1",
+            "variant_id": "1_{0}_A_G".format(position),
+            "FORMAT": "GT:PS",
+            "annotation": set(rng.sample(["GENE1", "GENE2", "GENE3"], rng.randint(1, 2))),
+            "compounds": {family.family_id: set()},
+            "inheritance_models": {family.family_id: {"AR_comp": False, "AR_comp_dn": False}},
+        }
+        for individual in individuals:
+            gt_call = rng.choice(["0/0", "0/1", "0/1", "./.", "0|1", "1|0"])
+            variant[individual] = "{0}:{1}".format(gt_call, rng.choice(["1", "2"]))
+        variant["genotypes"] = get_genotypes(variant, individuals)
+        variant_batch[variant["variant_id"]] = variant
+        if check_compound_candidate(variant, family, strict):
+            candidates.append(variant["variant_id"])
+    return variant_batch, candidates
+
+
+@pytest.mark.parametrize("family_name", sorted(PAIR_FAMILIES))
+@pytest.mark.parametrize("strict", [False, True])
+@pytest.mark.parametrize("phased", [False, True])
+def test_check_compound_pairs_same_as_all_pairs(family_name, strict, phased):
+    """Bucketing the candidates should give the same compounds as checking all pairs"""
+    header = ["#FamilyID\tSampleID\tFather\tMother\tSex\tPhenotype\n"]
+    family = FamilyParser(header + PAIR_FAMILIES[family_name]).families["1"]
+    rng = random.Random("{0}{1}{2}".format(family_name, strict, phased))
+
+    for _ in range(10):
+        variant_batch, candidates = get_candidate_batch(rng, family, strict)
+        expected_batch = copy.deepcopy(variant_batch)
+
+        check_compound_pairs(variant_batch, family, candidates, phased, strict)
+        check_all_pairs(expected_batch, family, candidates, phased, strict)
+
+        for variant_id, variant in variant_batch.items():
+            expected = expected_batch[variant_id]
+            assert variant["compounds"] == expected["compounds"]
+            assert variant["inheritance_models"] == expected["inheritance_models"]
+
+
+def test_check_genetic_models_compound_counts():
+    """Only the compound candidates of the family are counted"""
+    family_lines = [
+        "#FamilyID\tSampleID\tFather\tMother\tSex\tPhenotype\n",
+        "1\tchild\tfather\tmother\t1\t2\n",
+        "1\tfather\t0\t0\t1\t1\n",
+        "1\tmother\t0\t0\t2\t1\n",
+    ]
+    families = get_family(family_lines).families
+    individuals = ["child", "father", "mother"]
+    calls = [
+        # From the father and from the mother, a compound pair
+        ("0/1", "0/1", "0/0", {"GENE1"}),
+        ("0/1", "0/0", "0/1", {"GENE1"}),
+        # Not in a feature
+        ("0/1", "0/0", "0/1", set()),
+        # Not carried by the affected child
+        ("0/0", "0/1", "0/0", {"GENE1"}),
+    ]
+    variant_batch = {}
+    for position, (child, father, mother, annotation) in enumerate(calls, start=1):
+        variant = {
+            "CHROM": "1",
+            "POS": str(position),
+            "variant_id": "1_{0}_A_G".format(position),
+            "FORMAT": "GT",
+            "child": child,
+            "father": father,
+            "mother": mother,
+            "annotation": annotation,
+            "compound_candidate": bool(annotation),
+        }
+        variant["genotypes"] = get_genotypes(variant, individuals)
+        variant_batch[variant["variant_id"]] = variant
+
+    compound_counts = check_genetic_models(variant_batch, families)
+
+    assert compound_counts == {"candidates": 2, "checked": 1, "pairs": 1}
+    assert variant_batch["1_1_A_G"]["compounds"]["1"] == {"1_2_A_G"}
@@ -0,0 +1,106 @@
+from io import StringIO
+
+from genmod.annotate_models.family_shards import (
+    FamilyShardPrinter,
+    merge_family_annotations,
+    pack_family_annotations,
+    split_families,
+)
+from genmod.annotate_models.fix_variant import make_print_version
+from genmod.utils import BatchPrinter, pack_lines
+from ped_parser import FamilyParser
+
+FAMILY_LINES = [
+    "#FamilyID\tSampleID\tFather\tMother\tSex\tPhenotype\n",
+    "1\tproband\tfather\tmother\t2\t2\n",
+    "1\tmother\t0\t0\t2\t1\n",
+    "1\tfather\t0\t0\t1\t1\n",
+    "2\tsingle\t0\t0\t1\t2\n",
+    "3\tsingle_3\t0\t0\t1\t2\n",
+    "4\tproband_4\tfather_4\tmother_4\t2\t2\n",
+    "4\tmother_4\t0\t0\t2\t1\n",
+    "4\tfather_4\t0\t0\t1\t1\n",
+]
+
+VARIANT_LINE = "1\t879537\t.\tT\tC\t100\tPASS\tMQ=1\tGT\t0/1"
+
+
+def test_split_families():
+    """The shards follow the family order and hold about the same number of individuals"""
+    families = FamilyParser(FAMILY_LINES).families
+
+    shards = split_families(families, 2)
+
+    assert [list(shard) for shard in shards] == [["1", "2"], ["3", "4"]]
+
+
+def test_split_families_more_shards_than_families():
+    """Every shard gets at least one family"""
+    families = FamilyParser(FAMILY_LINES).families
+
+    shards = split_families(families, 10)
+
+    assert [list(shard) for shard in shards] == [["1"], ["2"], ["3"], ["4"]]
+
+
+def test_merge_family_annotations():
+    """The annotations of the shards are merged in shard order"""
+    shard_annotations = [
+        pack_family_annotations(["1:a|b"], ["1:AR_comp"], []),
+        pack_family_annotations([], [], []),
+        pack_family_annotations(["2:c"], ["2:AR_comp|AD"], ["2:12"]),
+    ]
+
+    info = merge_family_annotations("MQ=1", shard_annotations)
+
+    assert info == "MQ=1;Compounds=1:a|b,2:c;GeneticModels=1:AR_comp,2:AR_comp|AD;ModelScore=2:12"
+
+
+def test_make_print_version_compounds_of_families():
+    """The compounds of all families are added once"""
+    families = FamilyParser(FAMILY_LINES[:1] + FAMILY_LINES[4:6]).families
+    variant = {
+        "variant_id": "1_10_A_G",
+        "INFO": "MQ=1",
+        "info_dict": {"MQ": "1"},
+        "compounds": {"2": {"1_20_A_G"}, "3": {"1_30_A_G"}},
+        "inheritance_models": {"2": {"AR_comp": True}, "3": {"AR_comp": True}},
+        "genotypes": {},
+    }
+
+    make_print_version(variant, families)
+
+    assert variant["INFO"].split(";")[:2] == ["MQ=1", "Compounds=2:1_20_A_G,3:1_30_A_G"]
+
+
+def test_make_print_version_compound_handles():
+    """Compound handles are written as variant ids in the order of the batch"""
+    families = FamilyParser(FAMILY_LINES[:1] + FAMILY_LINES[4:5]).families
+    variant_ids = ["1_10_A_G", "1_20_A_G", "1_30_A_G"]
+    variant = {
+        "variant_id": "1_20_A_G",
+        "INFO": "MQ=1",
+        "info_dict": {"MQ": "1"},
+        "compounds": {"2": {2, 0}},
+        "inheritance_models": {"2": {"AR_comp": True}},
+        "genotypes": {},
+    }
+
+    make_print_version(variant, families, variant_ids)
+
+    assert variant["INFO"].split(";")[:2] == ["MQ=1", "Compounds=2:1_10_A_G|1_30_A_G"]
+
+
+def test_family_shard_printer():
+    """A batch is printed when all shards are finished"""
+    outfile = StringIO()
+    printer = FamilyShardPrinter(BatchPrinter(outfile=outfile), nr_of_shards=2)
+    batch_number = printer.add_batch([VARIANT_LINE])
+
+    printer.add_result(batch_number, pack_lines([pack_family_annotations([], ["2:AD"], [])]), 1)
+    assert printer.nr_waiting == 1
+    printer.add_result(batch_number, pack_lines([pack_family_annotations([], ["1:AD"], [])]), 0)
+
+    assert printer.nr_waiting == 0
+    assert outfile.getvalue().split("\t")[7] == "MQ=1;GeneticModels=1:AD,2:AD"
+    assert printer.batch_printer.nr_of_bytes == 0
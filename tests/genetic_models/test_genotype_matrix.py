@@ -0,0 +1,120 @@
+import copy
+import random
+
+import pytest
+from genmod.annotate_models.genetic_models import check_genetic_models
+from genmod.annotate_models.genotype_matrix import (
+    HETEROZYGOTE,
+    HOMO_ALT,
+    HOMO_REF,
+    MIN_MATRIX_BATCH_SIZE,
+    NO_CALL,
+    check_genetic_models_matrix,
+    get_genotype_code,
+)
+from genmod.vcf_tools import get_genotypes
+from ped_parser import FamilyParser
+
+pytest.importorskip("numpy")
+
+GT_CALLS = ["0/0", "0/1", "1/1", "./.", "1/2", "0|1", "1|0", "./1", "1/.", "0", "1", ".", ""]
+
+FAMILIES = {
+    "trio": [
+        "1\tproband\tfather\tmother\t1\t2\n",
+        "1\tmother\t0\t0\t2\t1\n",
+        "1\tfather\t0\t0\t1\t1\n",
+    ],
+    "daughter_affected_mother": [
+        "1\tproband\tfather\tmother\t2\t2\n",
+        "1\tmother\t0\t0\t2\t2\n",
+        "1\tfather\t0\t0\t1\t1\n",
+    ],
+    "duo": [
+        "1\tproband\t0\tmother\t1\t2\n",
+        "1\tmother\t0\t0\t2\t1\n",
+    ],
+    "father_duo": [
+        "1\tproband\tfather\t0\t2\t2\n",
+        "1\tfather\t0\t0\t1\t0\n",
+    ],
+    "single": [
+        "1\tproband\t0\t0\t1\t2\n",
+    ],
+    "quartet": [
+        "1\tproband\tfather\tmother\t2\t2\n",
+        "1\tsister\tfather\tmother\t2\t1\n",
+        "1\tmother\t0\t0\t2\t1\n",
+        "1\tfather\t0\t0\t1\t0\n",
+    ],
+}
+
+
+def get_families(family_lines):
+    header = ["#FamilyID\tSampleID\tFather\tMother\tSex\tPhenotype\n"]
+    return FamilyParser(header + family_lines).families
+
+
+def get_variant_batch(rng, individuals, nr_variants=MIN_MATRIX_BATCH_SIZE):
+    """Build a batch with random genotype calls"""
+    variant_batch = {}
+    for position in range(1, nr_variants + 1):
+        chrom = rng.choice(["1", "X", "chrX"])
+        variant = {
+            "CHROM": chrom,
+            "POS": str(position),
+            "variant_id": "{0}_{1}_A_G".format(chrom, position),
+            "FORMAT": "GT:PS",
+            "annotation": set(rng.sample(["GENE1", "GENE2"], rng.randint(0, 2))),
+        }
+        for individual in individuals:
+            variant[individual] = "{0}:{1}".format(rng.choice(GT_CALLS), rng.choice(["1", "2"]))
+        if rng.random() < 0.2:
+            variant["reduced_penetrance"] = True
+        if rng.random() < 0.8:
+            variant["compound_candidate"] = bool(variant["annotation"])
+        variant["genotypes"] = get_genotypes(variant, individuals)
+        variant_batch[variant["variant_id"]] = variant
+    return variant_batch
+
+
+def get_models(variant_batch):
+    return {
+        variant_id: (variant["inheritance_models"], variant["compounds"])
+        for variant_id, variant in variant_batch.items()
+    }
+
+
+@pytest.mark.parametrize("family_name", sorted(FAMILIES))
+@pytest.mark.parametrize("strict", [False, True])
+@pytest.mark.parametrize("phased", [False, True])
+def test_matrix_engine_same_as_python(family_name, strict, phased):
+    """The numpy engine should annotate the same models as check_genetic_models"""
+    families = get_families(FAMILIES[family_name])
+    individuals = list(families["1"].individuals)
+    rng = random.Random("{0}{1}{2}".format(family_name, strict, phased))
+
+    for _ in range(20):
+        variant_batch = get_variant_batch(rng, individuals)
+        matrix_batch = copy.deepcopy(variant_batch)
+
+        compound_counts = check_genetic_models(
+            variant_batch, families, phased=phased, strict=strict
+        )
+        matrix_counts = check_genetic_models_matrix(
+            matrix_batch, families, phased=phased, strict=strict
+        )
+
+        assert get_models(matrix_batch) == get_models(variant_batch)
+        assert matrix_counts == compound_counts
+
+
+def test_get_genotype_code():
+    """The codes follow the Genotype class"""
+    assert get_genotype_code("0/0") == HOMO_REF
+    assert get_genotype_code("0/1") == HETEROZYGOTE
+    assert get_genotype_code("1|1") == HOMO_ALT
+    assert get_genotype_code("./.") == NO_CALL
+    assert get_genotype_code("") == NO_CALL
+    # Haploid calls are heterozygote in the Genotype class
+    assert get_genotype_code("1") == HETEROZYGOTE
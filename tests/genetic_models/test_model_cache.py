@@ -0,0 +1,90 @@
+import copy
+import random
+
+import pytest
+from genmod.annotate_models.genetic_models import check_genetic_models
+from genmod.annotate_models.model_cache import ModelCache
+from genmod.vcf_tools import get_genotypes
+from ped_parser import FamilyParser
+
+GT_CALLS = ["0/0", "0/1", "1/1", "./.", "1/0", "0|1", "./1", "1"]
+
+FAMILY_LINES = [
+    "#FamilyID\tSampleID\tFather\tMother\tSex\tPhenotype\n",
+    "1\tproband\tfather\tmother\t2\t2\n",
+    "1\tsister\tfather\tmother\t2\t1\n",
+    "1\tmother\t0\t0\t2\t1\n",
+    "1\tfather\t0\t0\t1\t1\n",
+    "2\tsingle\t0\t0\t1\t2\n",
+]
+
+
+def get_variant_batch(rng, individuals, nr_variants=40):
+    """Build a batch with random genotype calls in one gene"""
+    variant_batch = {}
+    for position in range(1, nr_variants + 1):
+        chrom = rng.choice(["1", "X"])
+        variant = {
+            "CHROM": chrom,
+            "POS": str(position),
+            "variant_id": "{0}_{1}_A_G".format(chrom, position),
+            "FORMAT": "GT",
+            "annotation": {"GENE1"},
+            "compound_candidate": True,
+        }
+        for individual in individuals:
+            variant[individual] = rng.choice(GT_CALLS)
+        if rng.random() < 0.2:
+            variant["reduced_penetrance"] = True
+        variant["genotypes"] = get_genotypes(variant, individuals)
+        variant_batch[variant["variant_id"]] = variant
+    return variant_batch
+
+
+def get_models(variant_batch):
+    return {
+        variant_id: (variant["inheritance_models"], variant["compounds"])
+        for variant_id, variant in variant_batch.items()
+    }
+
+
+@pytest.mark.parametrize("strict", [False, True])
+@pytest.mark.parametrize("max_size", [8, 4096])
+def test_model_cache_same_models(strict, max_size):
+    """The cached models should be the same as the checked models"""
+    families = FamilyParser(FAMILY_LINES).families
+    individuals = [ind for family in families.values() for ind in family.individuals]
+    rng = random.Random(max_size)
+    model_cache = ModelCache(max_size)
+
+    for _ in range(20):
+        variant_batch = get_variant_batch(rng, individuals)
+        cached_batch = copy.deepcopy(variant_batch)
+
+        check_genetic_models(variant_batch, families, strict=strict)
+        check_genetic_models(cached_batch, families, strict=strict, model_cache=model_cache)
+
+        assert get_models(cached_batch) == get_models(variant_batch)
+
+    assert model_cache.hits
+    assert len(model_cache.patterns) <= max_size
+
+
+def test_model_cache_drops_least_recently_used():
+    """The least recently used pattern is dropped when the cache is full"""
+    families = FamilyParser(FAMILY_LINES[:1] + FAMILY_LINES[-1:]).families
+    model_cache = ModelCache(max_size=2)
+    variants = []
+    for gt_call in ["0/1", "1/1", "0/1", "0/0"]:
+        variant = {"CHROM": "1", "FORMAT": "GT", "single": gt_call}
+        variant["genotypes"] = get_genotypes(variant, ["single"])
+        variant["inheritance_models"] = {"2": {"AD": False, "AR_hom": False}}
+        variants.append(variant)
+
+    for variant in variants:
+        model_cache.check_variant(variant, families["2"])
+
+    patterns = [pattern[-1] for pattern in model_cache.patterns]
+    assert patterns == ["0/1", "0/0"]
+    assert model_cache.hits == 1
+    assert model_cache.misses == 3
@@ -0,0 +1,64 @@
+from genmod.score_variants import score_compound_batch
+from genmod.vcf_tools import InfoView, update_vcf_info
+
+
+def get_variant(variant_id, rank_score, compounds=None):
+    """Get a scored variant with an InfoView"""
+    info = "RankScore=1:{0};RankScoreNormalized=1:0.5;RankScoreMinMax=1:-25.0:29.0".format(
+        rank_score
+    )
+    if compounds:
+        info += ";GeneticModels=1:AR_comp;Compounds=1:{0}".format(compounds)
+    return {"variant_id": variant_id, "INFO": info, "info_dict": InfoView(info)}
+
+
+def test_score_compound_batch_only_low_compounds():
+    """A variant with only low scored compounds is penalised"""
+    variants = [
+        get_variant("1_10_A_G", 10.0, "1_30_A_G|1_20_A_G"),
+        get_variant("1_20_A_G", 2.0),
+        get_variant("1_30_A_G", 1.0),
+    ]
+
+    score_compound_batch(variants, models=["AR_comp"], threshold=9, penalty=6)
+
+    info_dict = variants[0]["info_dict"]
+    assert info_dict["RankScore"] == "1:4.0"
+    assert info_dict["Compounds"] == "1:1_20_A_G>6.0|1_30_A_G>5.0"
+    # The variants without compounds are not changed
+    assert not variants[1]["info_dict"].is_edited
+    # CompoundsNormalized is added at the end of the INFO field
+    info = update_vcf_info(variants[0])
+    assert [entry.split("=")[0] for entry in info.split(";")][-2:] == [
+        "Compounds",
+        "CompoundsNormalized",
+    ]
+
+
+def test_score_compound_batch_high_compound():
+    """A variant with a compound above the threshold keeps its score"""
+    variants = [
+        get_variant("1_10_A_G", 10.0, "1_20_A_G"),
+        get_variant("1_20_A_G", 12.0),
+    ]
+
+    score_compound_batch(variants, models=["AR_comp"], threshold=9, penalty=6)
+
+    info_dict = variants[0]["info_dict"]
+    assert info_dict["RankScore"] == "1:10.0"
+    assert info_dict["Compounds"] == "1:1_20_A_G>22.0"
+
+
+def test_score_compound_batch_duplicated_variant():
+    """Every copy of a duplicated variant is scored"""
+    variants = [
+        get_variant("1_10_A_G", 10.0, "1_20_A_G"),
+        get_variant("1_20_A_G", 2.0),
+        get_variant("1_10_A_G", 10.0, "1_20_A_G"),
+    ]
+
+    score_compound_batch(variants, models=["AR_comp"], threshold=9, penalty=6)
+
+    for variant in (variants[0], variants[2]):
+        assert variant["info_dict"]["RankScore"] == "1:4.0"
+        assert variant["info_dict"]["Compounds"] == "1:1_20_A_G>6.0"
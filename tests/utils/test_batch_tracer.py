@@ -0,0 +1,102 @@
+from queue import Queue
+
+import pytest
+from genmod.utils import (
+    BatchTracer,
+    format_batch_traces,
+    get_annotated_batch_trace,
+    get_scored_batch_trace,
+    merge_batch_traces,
+)
+
+LINES = [
+    "1\t100\t.\tA\tT\t100\tPASS\tAnnotation=GENE1",
+    "1\t200\t.\tA\tT\t100\tPASS\tAnnotation=GENE1,GENE2",
+]
+
+
+def get_trace(seconds):
+    return {"seconds": seconds, "region": "1:1-2", "features": [], "variants": 1}
+
+
+def test_batch_tracer_keeps_slowest():
+    """Test that the tracer keeps the slowest batches, the slowest first"""
+    batch_tracer = BatchTracer(2, Queue())
+    for seconds in [0.3, 0.1, 0.5, 0.2]:
+        if batch_tracer.is_slow(seconds):
+            batch_tracer.add_trace(get_trace(seconds))
+
+    assert [trace["seconds"] for trace in batch_tracer.get_traces()] == [0.5, 0.3]
+    assert not batch_tracer.is_slow(0.2)
+
+
+def test_batch_tracer_no_batches():
+    """Test that a tracer that keeps no batches is not made"""
+    for nr_of_batches in [0, -1]:
+        with pytest.raises(ValueError):
+            BatchTracer(nr_of_batches, Queue())
+
+
+def test_batch_tracer_collect():
+    """Test that the traces of the workers are merged"""
+    batch_tracer = BatchTracer(2, Queue())
+    batch_tracer.add_trace(get_trace(0.1))
+    batch_tracer.send("worker-1")
+    batch_tracer.trace_queue.put([get_trace(0.4), get_trace(0.05)])
+
+    traces = batch_tracer.collect(2)
+
+    assert [trace["seconds"] for trace in traces] == [0.4, 0.1]
+    assert traces[1]["worker"] == "worker-1"
+
+
+def test_merge_batch_traces():
+    traces = merge_batch_traces([[get_trace(0.2)], [], [get_trace(0.3), get_trace(0.1)]], 5)
+
+    assert [trace["seconds"] for trace in traces] == [0.3, 0.2, 0.1]
+
+
+def test_get_annotated_batch_trace():
+    """Test that the features and the compound counts of a batch are traced"""
+    variants = [
+        {"annotation": {"GENE1"}, "compound_candidate": True},
+        {"annotation": {"GENE1", "GENE2"}, "compound_candidate": True},
+    ]
+    compound_counts = {"candidates": 1, "checked": 0, "pairs": 0}
+
+    trace = get_annotated_batch_trace(0.5, LINES, variants, compound_counts)
+
+    assert trace["region"] == "1:100-200"
+    assert trace["features"] == ["GENE1", "GENE2"]
+    assert trace["variants"] == 2
+    assert trace["candidates"] == 1
+    assert trace["checked"] == 0
+    assert trace["pairs"] == 0
+
+
+def test_get_scored_batch_trace():
+    """Test that the compounds of the scored variants are counted"""
+    variants = [
+        {"info_dict": {"Compounds": "1:1_200_A_T>9"}},
+        {"info_dict": {"Compounds": "1:1_100_A_T>9"}},
+        {"info_dict": {}},
+    ]
+
+    trace = get_scored_batch_trace(0.5, LINES, variants)
+
+    assert trace["features"] == ["GENE1", "GENE2"]
+    assert trace["candidates"] == 2
+    assert trace["pairs"] == 1
+
+
+def test_format_batch_traces():
+    trace = get_trace(0.25)
+    trace.update({"features": ["GENE{0}".format(i) for i in range(7)], "candidates": 0, "pairs": 0})
+
+    lines = format_batch_traces([trace])
+
+    assert len(lines) == 2
+    assert lines[1].split("\t")[0] == "0.250"
+    # The checked pairs are only known for annotated batches
+    assert lines[1].split("\t")[4] == "-"
+    assert lines[1].endswith("GENE4,...(2 more)")
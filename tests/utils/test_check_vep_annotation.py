@@ -1,4 +1,5 @@
 from genmod.utils import check_vep_annotation
+from genmod.vcf_tools import CsqColumns
 
 
 def test_get_none():
@@ -25,3 +26,15 @@ def test_get_annotation():
 
     # The result should be empty since the terms do not exist
     assert check_vep_annotation(vep_variant) == set(["ADK"])
+
+
+def test_get_annotation_csq_columns():
+    """
+    Test to get the annotation from the CSQ field with the column indices
+    """
+    csq_columns = CsqColumns(["Allele", "Consequence", "Gene"])
+    vep_variant = {
+        "info_dict": {"CSQ": "A|transcript_ablation&intron_variant|ADK,A|intergenic_variant|DDD"}
+    }
+
+    assert check_vep_annotation(vep_variant, csq_columns=csq_columns) == set(["ADK"])
@@ -1,4 +1,4 @@
-from genmod.utils import get_annotation
+from genmod.utils import get_annotation, get_line_annotation
 
 
 def get_variant(chrom="1", pos="1", ref="A", alt="G", annotation=["ADK"]):
@@ -57,3 +57,25 @@ def test_get_vep_region():
     """docstring for test_get_vep_region"""
     variant = get_vep_variant()
     assert get_annotation(variant, vep=True) == set(["ADK"])
+
+
+def test_line_annotation():
+    """Test to get the features from a raw variant line"""
+    variant_line = "1\t1\t.\tA\tG\t100\tPASS\tMQ=1;Annotation=ADK,DDD\tGT\t0/1"
+    assert get_line_annotation(variant_line) == set(["ADK", "DDD"])
+
+
+def test_line_annotation_empty():
+    """Test a raw variant line without features"""
+    variant_line = "1\t1\t.\tA\tG\t100\tPASS\tMQ=1\tGT\t0/1"
+    assert get_line_annotation(variant_line) == set()
+
+
+def test_line_annotation_vep():
+    """Test that the vep features of a line are the same as from get_annotation"""
+    vep_header = ["Allele", "Consequence", "Gene"]
+    variant_line = (
+        "1\t1\t.\tA\tG\t100\tPASS\t"
+        "MQ=1;CSQ=G|missense_variant&splice_region_variant|ADK,G|intergenic_variant|DDD"
+    )
+    assert get_line_annotation(variant_line, vep=True, vep_header=vep_header) == set(["ADK"])
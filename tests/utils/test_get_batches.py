@@ -1,4 +1,5 @@
-from genmod.utils import get_batches
+import pytest
+from genmod.utils import generate_batches, get_batches, split_batch
 from genmod.vcf_tools import HeaderParser
 
 try:
@@ -213,3 +214,59 @@ def test_get_batches_new_chromosome():
     assert chromosomes == ["1", "2"]
     assert len(batch_1) == 1
     assert len(batch_2) == 1
+
+
+def test_generate_batches_raw():
+    """
+    Test to get batches with raw variant lines
+    """
+    variants = [
+        get_variant_line(),
+        get_variant_line(pos="2"),
+        get_variant_line(pos="3", info="Annotation=DDD;Exonic"),
+        get_variant_line(chrom="chr2", pos="3", info="Annotation=DDD;Exonic"),
+    ]
+    header = HeaderParser()
+    header.parse_header_line("#{0}".format(HEADER))
+
+    chromosomes = []
+    batches = list(
+        generate_batches(variants=variants, header=header, chromosomes=chromosomes, raw=True)
+    )
+
+    assert chromosomes == ["1", "2"]
+    assert [len(batch) for batch in batches] == [2, 1, 1]
+    assert batches[0][0] == variants[0].rstrip()
+
+
+def test_split_batch_small_batch():
+    """A batch that is not larger than the max is not split"""
+    batch = [get_variant_line(pos=str(pos)) for pos in range(1, 4)]
+
+    assert list(split_batch(batch, max_batch_size=3)) == [(batch, [], [])]
+
+
+def test_split_batch_max_batch_size_below_one():
+    """A max batch size below one is an error, not an empty split"""
+    batch = [get_variant_line(pos=str(pos)) for pos in range(1, 4)]
+
+    for max_batch_size in [0, -1]:
+        with pytest.raises(ValueError):
+            list(split_batch(batch, max_batch_size=max_batch_size))
+
+
+def test_split_batch_context():
+    """The sub batches get the variants of their features as context"""
+    features = ["ADK", "ADK,POLR", "POLR", "POLR,TTN", "TTN", "TTN"]
+    batch = [
+        get_variant_line(pos=str(pos), info="Annotation={0}".format(feature))
+        for pos, feature in enumerate(features, start=1)
+    ]
+
+    sub_batches = list(split_batch(batch, max_batch_size=2))
+
+    assert sub_batches == [
+        (batch[0:2], [], [batch[2], batch[3]]),
+        (batch[2:4], [batch[1]], [batch[4], batch[5]]),
+        (batch[4:6], [batch[3]], []),
+    ]
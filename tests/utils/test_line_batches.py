@@ -0,0 +1,67 @@
+from genmod.utils import (
+    coalesce_batches,
+    make_task,
+    pack_lines,
+    read_task,
+    splice_info,
+    unpack_lines,
+)
+
+VARIANT_LINE = "1\t879537\t.\tT\tC\t100\tPASS\tMQ=1;Annotation=SAMD11\tGT:GQ\t0/1:60\t1/1:60"
+
+
+def test_pack_unpack_lines():
+    """Test that a batch of lines survive packing"""
+    lines = [VARIANT_LINE, VARIANT_LINE.replace("879537", "879538")]
+    block = pack_lines(lines)
+
+    assert isinstance(block, bytes)
+    assert unpack_lines(block) == lines
+
+
+def test_pack_unpack_non_ascii():
+    """Test that non ascii characters survive packing"""
+    lines = ["MQ=1;Note=Måns"]
+
+    assert unpack_lines(pack_lines(lines)) == lines
+
+
+def test_splice_info():
+    """Test that only the INFO column is replaced"""
+    new_line = splice_info(VARIANT_LINE, "MQ=1;GeneticModels=1:AR_hom")
+    splitted_line = new_line.split("\t")
+
+    assert splitted_line[7] == "MQ=1;GeneticModels=1:AR_hom"
+    assert splitted_line[:7] == VARIANT_LINE.split("\t")[:7]
+    assert splitted_line[8:] == VARIANT_LINE.split("\t")[8:]
+
+
+def test_splice_info_no_samples():
+    """Test to splice the INFO column of a sites only line"""
+    new_line = splice_info("1\t1\t.\tA\tG\t100\tPASS\tMQ=1", "MQ=2")
+
+    assert new_line == "1\t1\t.\tA\tG\t100\tPASS\tMQ=2"
+
+
+def test_coalesce_batches():
+    """Test that consecutive singletons are packed in chunks, in order"""
+    batches = [["a"], ["b"], ["c"], ["d", "e"], ["f"], ["g", "h"], ["i"], ["j"]]
+
+    chunks = list(coalesce_batches(batches, chunk_size=2))
+
+    assert chunks == [
+        (["a", "b"], True),
+        (["c"], True),
+        (["d", "e"], False),
+        (["f"], True),
+        (["g", "h"], False),
+        (["i", "j"], True),
+    ]
+
+
+def test_make_read_task():
+    """Test that a task survives packing"""
+    task = make_task(3, [VARIANT_LINE], ["before"], None, singletons=False)
+
+    assert read_task(task) == (3, [VARIANT_LINE], ["before"], [], False)
+    assert read_task(make_task(4, ["a", "b"], singletons=True)) == (4, ["a", "b"], [], [], True)
@@ -0,0 +1,58 @@
+import tabix
+from genmod.utils import (
+    generate_batches,
+    generate_shard_lines,
+    get_contig_lengths,
+    get_index_contigs,
+    get_shards,
+)
+from genmod.vcf_tools import HeaderParser
+
+INDEXED_VCF_FILE = "tests/fixtures/annotate_models/test_vcf_regions_indexed.vcf.gz"
+
+
+def test_get_index_contigs():
+    """Test that the contigs are read from the index in file order"""
+    assert get_index_contigs(INDEXED_VCF_FILE + ".tbi") == ["1", "10", "X", "MT"]
+
+
+def test_get_contig_lengths():
+    """Test that the contig lengths are read from the header"""
+    head = HeaderParser()
+    head.parse_meta_data("##contig=<ID=1,length=1000000>")
+    head.parse_meta_data("##contig=<ID=2,assembly=b37>")
+
+    assert get_contig_lengths(head) == {"1": 1000000}
+
+
+def test_get_shards():
+    """Test that contigs with a length are split in windows"""
+    shards = get_shards(["1", "2"], {"1": 25}, shard_size=10)
+
+    assert shards == [("1", 1, 11), ("1", 11, 21), ("1", 21, None), ("2", 1, None)]
+
+
+def test_generate_shard_lines_never_splits_features():
+    """Test that the shards hold the same batches as the whole file"""
+    tabix_handle = tabix.open(INDEXED_VCF_FILE)
+    head = HeaderParser()
+    head.header = ["#CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO"]
+    all_lines = [
+        line
+        for contig in get_index_contigs(INDEXED_VCF_FILE + ".tbi")
+        for line in generate_shard_lines(tabix_handle, contig, 1, None)
+    ]
+    # A window starts inside the NOC2L batch, the shard before has to finish it
+    shards = get_shards(["1"], {"1": 1000000}, shard_size=440000)
+    shard_lines = [list(generate_shard_lines(tabix_handle, *shard)) for shard in shards]
+
+    assert shard_lines[0] == []
+    assert [line.split("\t")[1] for line in shard_lines[2]] == ["880500"]
+    contig_lines = [line for line in all_lines if line.startswith("1\t")]
+    assert sum(shard_lines, []) == contig_lines
+
+    batches = list(generate_batches(contig_lines, head, raw=True))
+    shard_batches = [
+        batch for lines in shard_lines for batch in generate_batches(lines, head, raw=True)
+    ]
+    assert shard_batches == batches
@@ -2,7 +2,7 @@ from codecs import open
 from multiprocessing import Manager
 from tempfile import NamedTemporaryFile
 
-from genmod.utils import VariantPrinter
+from genmod.utils import BatchPrinter, VariantPrinter, pack_lines
 from genmod.vcf_tools import HeaderParser, get_info_dict, get_variant_dict, get_variant_id
 
 
@@ -76,3 +76,63 @@ def test_variant_printer():
 
     assert variants[0][0] == "1"
     assert variants[0][2] == "11900"
+
+
+def test_batch_printer_in_order():
+    """Test that batches are printed in the order they were added"""
+    outfile = NamedTemporaryFile(mode="w+t", delete=False, suffix=".vcf")
+
+    batch_printer = BatchPrinter(outfile=outfile)
+    first_batch = ["1\t11900\t.\tA\tT\t100\tPASS\tMQ=1", "1\t11901\t.\tA\tT\t100\tPASS\tMQ=1"]
+    second_batch = ["3\t879585\t.\tA\tT\t100\tPASS\tMQ=1"]
+    first_number = batch_printer.add_batch(first_batch)
+    second_number = batch_printer.add_batch(second_batch)
+
+    # The second batch is finished first and has to wait
+    batch_printer.add_result(second_number, pack_lines(["MQ=2"]))
+    assert batch_printer.nr_waiting == 2
+
+    batch_printer.add_result(first_number, pack_lines(["MQ=3", "MQ=4"]))
+    assert batch_printer.nr_waiting == 0
+    outfile.close()
+
+    with open(outfile.name, "r", "utf-8") as f:
+        variants = [line.rstrip().split("\t") for line in f]
+
+    assert [variant[1] for variant in variants] == ["11900", "11901", "879585"]
+    assert [variant[7] for variant in variants] == ["MQ=3", "MQ=4", "MQ=2"]
+
+
+def test_batch_printer_memory_budget():
+    """Test that the printer is full while the batches in flight are over the budget"""
+    outfile = NamedTemporaryFile(mode="w+t", delete=False, suffix=".vcf")
+
+    batch_printer = BatchPrinter(outfile=outfile, memory_budget=1)
+    # A small budget in bytes, the option is in MB
+    batch_printer.memory_budget = 50
+    first_batch = ["1\t11900\t.\tA\tT\t100\tPASS\tMQ=1"]
+    second_batch = ["1\t11901\t.\tA\tT\t100\tPASS\tMQ=1"]
+    first_number = batch_printer.add_batch(first_batch)
+    assert not batch_printer.is_full
+    second_number = batch_printer.add_batch(second_batch)
+    assert batch_printer.is_full
+
+    # A finished batch that waits for an earlier batch still counts
+    batch_printer.add_result(second_number, pack_lines(["MQ=2"]))
+    assert batch_printer.is_full
+
+    batch_printer.add_result(first_number, pack_lines(["MQ=3"]))
+    assert not batch_printer.is_full
+    assert batch_printer.nr_of_bytes == 0
+    outfile.close()
+
+
+def test_batch_printer_no_memory_budget():
+    """Test that the printer is never full without a budget"""
+    outfile = NamedTemporaryFile(mode="w+t", delete=False, suffix=".vcf")
+
+    batch_printer = BatchPrinter(outfile=outfile, memory_budget=0)
+    batch_printer.add_batch(["1\t11900\t.\tA\tT\t100\tPASS\tMQ=1"] * 1000)
+
+    assert not batch_printer.is_full
+    outfile.close()
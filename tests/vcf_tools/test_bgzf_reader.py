@@ -0,0 +1,66 @@
+import gzip
+from tempfile import NamedTemporaryFile
+
+from genmod.commands.utils import get_file_handle
+from genmod.vcf_tools import BgzfReader, BgzfWriter, is_bgzf
+from genmod.vcf_tools.bgzf_writer import BGZF_BLOCK_SIZE, BGZF_EOF, compress_block
+
+INDEXED_VCF_FILE = "tests/fixtures/annotate_models/test_vcf_regions_indexed.vcf.gz"
+VCF_FILE = "tests/fixtures/test_vcf_regions.vcf"
+
+
+def test_bgzf_reader_round_trip():
+    """Test that lines and multibyte characters over block borders are read back"""
+    lines = ["1\t{0}\t.\tA\tT\t100\tPASS\tGene=åäö\n".format(pos) for pos in range(9000)]
+    assert len("".join(lines).encode("utf-8")) > 2 * BGZF_BLOCK_SIZE
+    outfile = NamedTemporaryFile(delete=False, suffix=".vcf.gz")
+    outfile.close()
+    with BgzfWriter(outfile.name) as writer:
+        for line in lines:
+            writer.write(line)
+
+    assert is_bgzf(outfile.name)
+    with BgzfReader(outfile.name, threads=2, read_ahead=1) as reader:
+        assert list(reader) == lines
+
+
+def test_bgzf_reader_last_line_without_newline():
+    """Test that the last line is read when it does not end with a newline"""
+    outfile = NamedTemporaryFile(delete=False, suffix=".vcf.gz")
+    outfile.close()
+    with BgzfWriter(outfile.name) as writer:
+        writer.write("#CHROM\n1\t1")
+
+    assert list(BgzfReader(outfile.name)) == ["#CHROM\n", "1\t1"]
+
+
+def test_bgzf_reader_crlf_over_blocks():
+    """Test that a CRLF line ending split over two blocks ends one line"""
+    outfile = NamedTemporaryFile(delete=False, suffix=".vcf.gz")
+    with outfile as f:
+        f.write(compress_block(b"#CHROM\r\n1\t1\r"))
+        f.write(compress_block(b"\n1\t2\r\n"))
+        f.write(BGZF_EOF)
+
+    assert list(BgzfReader(outfile.name)) == ["#CHROM\r\n", "1\t1\r\n", "1\t2\r\n"]
+
+
+def test_is_bgzf_ordinary_gzip():
+    """Test that ordinary gzip and plain files are not taken for BGZF"""
+    outfile = NamedTemporaryFile(delete=False, suffix=".vcf.gz")
+    outfile.close()
+    with gzip.open(outfile.name, "wt") as f:
+        f.write("#CHROM\n")
+
+    assert not is_bgzf(outfile.name)
+    assert not is_bgzf(VCF_FILE)
+    assert [line for line in get_file_handle(outfile.name)] == ["#CHROM\n"]
+
+
+def test_get_file_handle_bgzf():
+    """Test that a bgzipped vcf is read in parallel"""
+    file_handle = get_file_handle(INDEXED_VCF_FILE)
+
+    assert isinstance(file_handle, BgzfReader)
+    with gzip.open(INDEXED_VCF_FILE, "rt") as f:
+        assert list(file_handle) == f.readlines()
@@ -0,0 +1,78 @@
+import gzip
+import os
+from tempfile import NamedTemporaryFile
+
+import tabix
+from genmod.utils import get_index_contigs
+from genmod.vcf_tools import BgzfWriter
+from genmod.vcf_tools.bgzf_writer import BGZF_BLOCK_SIZE, BGZF_EOF
+from genmod.vcf_tools.vcf_index import get_record_region, reg2bin
+
+VCF_FILE = "tests/fixtures/test_vcf_regions.vcf"
+
+
+def write_bgzf(lines, index_format=None, threads=2):
+    """Write lines with a BgzfWriter and return the file name"""
+    outfile = NamedTemporaryFile(delete=False, suffix=".vcf.gz")
+    outfile.close()
+    writer = BgzfWriter(outfile.name, index_format=index_format, threads=threads)
+    for line in lines:
+        writer.write(line)
+    writer.close()
+    return outfile.name
+
+
+def test_bgzf_writer_round_trip():
+    """Test that the compressed file can be read as gzip"""
+    lines = ["1\t{0}\t.\tA\tT\t100\tPASS\tMQ=1\n".format(pos) for pos in range(1, 20000)]
+    file_name = write_bgzf(lines)
+
+    with gzip.open(file_name, "rt") as f:
+        assert f.read() == "".join(lines)
+    # More than one block is written and the file ends with the EOF block
+    assert len("".join(lines)) > BGZF_BLOCK_SIZE
+    with open(file_name, "rb") as f:
+        assert f.read().endswith(BGZF_EOF)
+
+
+def test_bgzf_writer_tabix_index():
+    """Test that the tabix index can be queried"""
+    with open(VCF_FILE) as f:
+        lines = f.readlines()
+    file_name = write_bgzf(lines, index_format="tbi")
+
+    assert get_index_contigs(file_name + ".tbi") == ["1", "10", "X", "MT"]
+    tabix_handle = tabix.open(file_name)
+    assert [record[1] for record in tabix_handle.query("1", 879590, 880100)] == [
+        "879595",
+        "879676",
+        "879911",
+        "880012",
+        "880086",
+    ]
+    assert [record[1] for record in tabix_handle.query("X", 302253, 302300)] == ["302253"]
+
+
+def test_bgzf_writer_unsorted_no_index():
+    """Test that no index is written for unsorted variants"""
+    lines = ["1\t200\t.\tA\tT\t100\tPASS\tMQ=1\n", "1\t100\t.\tA\tT\t100\tPASS\tMQ=1\n"]
+    file_name = write_bgzf(lines, index_format="csi", threads=0)
+
+    with gzip.open(file_name, "rt") as f:
+        assert f.read() == "".join(lines)
+    assert not os.path.exists(file_name + ".csi")
+
+
+def test_get_record_region_end():
+    """Test that the END key is used as end of a record"""
+    line = b"1\t100\t.\tN\t<DEL>\t100\tPASS\tSVTYPE=DEL;END=500"
+    assert get_record_region(line) == (b"1", 99, 500)
+    line = b"1\t100\t.\tAT\tA\t100\tPASS\tBLEND=500"
+    assert get_record_region(line) == (b"1", 99, 101)
+
+
+def test_reg2bin():
+    """Test the bins of the binning scheme"""
+    assert reg2bin(0, 1) == 4681
+    assert reg2bin(0, 2**14 + 1) == 585
+    assert reg2bin(0, 2**29) == 0
@@ -0,0 +1,30 @@
+from genmod.vcf_tools import CsqColumns
+
+VEP_HEADER = ["Allele", "Consequence", "Gene", "SIFT"]
+CSQ = "G|missense_variant|ADK|deleterious,G|intron_variant|ADK|tolerated,G|intergenic_variant"
+
+
+def test_get_columns():
+    csq_columns = CsqColumns(VEP_HEADER)
+    assert csq_columns.get_columns(CSQ, ["Gene", "Consequence"]) == [
+        ("ADK", "missense_variant"),
+        ("ADK", "intron_variant"),
+        (None, "intergenic_variant"),
+    ]
+
+
+def test_get_column():
+    csq_columns = CsqColumns(VEP_HEADER)
+    assert csq_columns.get_column(CSQ, "SIFT") == ["deleterious", "tolerated", None]
+
+
+def test_get_column_not_in_header():
+    csq_columns = CsqColumns(VEP_HEADER)
+    assert "PolyPhen" not in csq_columns
+    assert csq_columns.get_column(CSQ, "PolyPhen") == [None, None, None]
+
+
+def test_get_columns_empty_field():
+    csq_columns = CsqColumns(VEP_HEADER)
+    assert csq_columns.get_columns("", ["Gene"]) == []
+    assert csq_columns.get_columns(None, ["Gene"]) == []
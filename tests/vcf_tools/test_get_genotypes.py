@@ -0,0 +1,54 @@
+from genmod.vcf_tools import get_format_indexes, get_genotypes
+
+
+def get_variant(gt_format, *samples):
+    variant = {"FORMAT": gt_format}
+    for number, sample in enumerate(samples):
+        variant["ind_{0}".format(number)] = sample
+    return variant
+
+
+def test_get_format_indexes():
+    """The positions of the keys that exist in the FORMAT string"""
+    indexes = get_format_indexes("GT:AD:DP:GQ:PL", ("GT", "GQ", "PS"))
+
+    assert indexes == (("GT", 0), ("GQ", 3))
+
+
+def test_get_genotypes():
+    """All the fields that the Genotype class uses are parsed by default"""
+    variant = get_variant("GT:AD:DP:GQ:PL", "0/1:10,12:22:60:0,30,300")
+
+    genotype = get_genotypes(variant, ["ind_0"])["ind_0"]
+
+    assert genotype.heterozygote
+    assert genotype.ref_depth == 10
+    assert genotype.alt_depth == 12
+    assert genotype.depth_of_coverage == 22
+    assert genotype.genotype_quality == 60.0
+
+
+def test_get_genotypes_projected():
+    """Keys that are not projected keep the defaults"""
+    variant = get_variant("PL:GQ:AD:GT:DP", "0,30,300:60:10,12:1/1:22", "0,0,0:.:.:./.:.")
+
+    genotypes = get_genotypes(variant, ["ind_0", "ind_1"], ("GT", "GQ"))
+
+    assert genotypes["ind_0"].homo_alt
+    assert genotypes["ind_0"].genotype_quality == 60.0
+    assert genotypes["ind_0"].depth_of_coverage == 0
+    assert genotypes["ind_0"].quality_depth == 0
+    assert not genotypes["ind_1"].genotyped
+    assert genotypes["ind_1"].genotype_quality == 0.0
+
+
+def test_get_genotypes_truncated_sample():
+    """Trailing fields may be dropped from a sample column"""
+    variant = get_variant("GT:AD:DP:GQ", "0/1:5,5", "./.")
+
+    genotypes = get_genotypes(variant, ["ind_0", "ind_1"])
+
+    assert genotypes["ind_0"].heterozygote
+    assert genotypes["ind_0"].alt_depth == 5
+    assert genotypes["ind_0"].genotype_quality == 0.0
+    assert not genotypes["ind_1"].genotyped
@@ -0,0 +1,97 @@
+import pytest
+from genmod.vcf_tools import InfoView, get_info_dict, set_vcf_info, update_vcf_info
+
+INFO = "MQ=1;Flag;Annotation=ADK,ADKL;CADD=0.5"
+
+
+def test_info_view_lookup():
+    info_view = InfoView(INFO)
+    assert info_view["MQ"] == "1"
+    assert info_view["Annotation"] == "ADK,ADKL"
+    assert info_view["Flag"] == []
+    assert info_view.get("CADD") == "0.5"
+
+
+def test_info_view_missing_key():
+    info_view = InfoView(INFO)
+    assert "M" not in info_view
+    assert info_view.get("M") is None
+    assert info_view.get("M", "default") == "default"
+    with pytest.raises(KeyError):
+        info_view["M"]
+
+
+def test_info_view_set_and_delete():
+    info_view = InfoView(INFO)
+    info_view["MQ"] = "2"
+    info_view["Compounds"] = "1:1_10_A_G"
+    del info_view["Flag"]
+
+    assert info_view["MQ"] == "2"
+    assert info_view["Compounds"] == "1:1_10_A_G"
+    assert "Flag" not in info_view
+    with pytest.raises(KeyError):
+        del info_view["Flag"]
+    # The raw info field is not changed
+    assert info_view.raw == INFO
+
+    info_view["Flag"] = []
+    assert info_view["Flag"] == []
+
+
+def test_info_view_iteration():
+    info_view = InfoView(INFO)
+    info_view["Compounds"] = "1:1_10_A_G"
+    del info_view["CADD"]
+
+    assert list(info_view) == ["MQ", "Flag", "Annotation", "Compounds"]
+    assert len(info_view) == 4
+
+
+def test_info_view_same_as_info_dict():
+    assert dict(InfoView(INFO)) == get_info_dict(INFO)
+
+
+def test_info_view_render():
+    info_view = InfoView(INFO)
+    assert info_view.render() == INFO
+
+    info_view["CADD"] = "0.7"
+    info_view["RankScore"] = "1:10"
+    info_view["Compounds"] = []
+    del info_view["Flag"]
+    assert info_view.render() == "MQ=1;Annotation=ADK,ADKL;CADD=0.7;RankScore=1:10;Compounds"
+
+
+def test_info_view_render_empty_info():
+    info_view = InfoView(".")
+    assert info_view.render() == "."
+    info_view["RankScore"] = "1:10"
+    assert info_view.render() == "RankScore=1:10"
+
+
+def test_info_view_commit():
+    info_view = InfoView(INFO)
+    info_view["MQ"] = "2"
+    assert info_view.commit() == "MQ=2;Flag;Annotation=ADK,ADKL;CADD=0.5"
+    assert not info_view.is_edited
+    assert info_view.raw == "MQ=2;Flag;Annotation=ADK,ADKL;CADD=0.5"
+    assert info_view["MQ"] == "2"
+
+
+def test_set_vcf_info():
+    variant = {"INFO": INFO, "info_dict": InfoView(INFO)}
+    set_vcf_info("MQ", "2", variant)
+    set_vcf_info("RankScore", "1:10", variant)
+    # The INFO field is only written when it is updated
+    assert variant["INFO"] == INFO
+    assert update_vcf_info(variant) == "MQ=2;Flag;Annotation=ADK,ADKL;CADD=0.5;RankScore=1:10"
+    assert variant["INFO"] == "MQ=2;Flag;Annotation=ADK,ADKL;CADD=0.5;RankScore=1:10"
+
+
+def test_set_vcf_info_info_dict():
+    variant = {"INFO": INFO, "info_dict": get_info_dict(INFO)}
+    set_vcf_info("MQ", "2", variant)
+    set_vcf_info("RankScore", "1:10", variant)
+    assert variant["INFO"] == "MQ=2;Flag;Annotation=ADK,ADKL;CADD=0.5;RankScore=1:10"
+    assert variant["info_dict"]["RankScore"] == "1:10"
@@ -1,4 +1,4 @@
-from genmod.vcf_tools import get_variant_id
+from genmod.vcf_tools import get_info_dict, get_info_value, get_variant_id
 
 
 class TestGetVariantId:
@@ -47,3 +47,29 @@ class TestGetVariantId:
     def test_get_variant_id_sv_bdn(self):
         variant = {"CHROM": "1", "POS": "10", "REF": "A", "ALT": "T[6:134717462["}
         assert get_variant_id(variant) == "1_10_A_T6134717462"
+
+
+class TestGetInfoValue:
+    def test_get_info_value(self):
+        assert get_info_value("MQ=1;Annotation=ADK,DDD;DP=10", "Annotation") == "ADK,DDD"
+
+    def test_get_info_value_first_and_last(self):
+        assert get_info_value("Annotation=ADK;DP=10", "Annotation") == "ADK"
+        assert get_info_value("MQ=1;Annotation=ADK", "Annotation") == "ADK"
+
+    def test_get_info_value_missing(self):
+        assert get_info_value("MQ=1;DP=10", "Annotation") is None
+
+    def test_get_info_value_flag(self):
+        assert get_info_value("MQ=1;Exonic;DP=10", "Exonic") == []
+        assert get_info_value("MQ=1;Exonic", "Exonic") == []
+
+    def test_get_info_value_key_is_substring(self):
+        info = "MyAnnotation=ADK;Annotation_2=DDD;Annotation=NOC2L"
+        assert get_info_value(info, "Annotation") == "NOC2L"
+
+    def test_get_info_value_same_as_info_dict(self):
+        info = "MQ=1;Exonic;Annotation=ADK;CSQ=G|ADK"
+        info_dict = get_info_dict(info)
+        for key in info_dict:
+            assert get_info_value(info, key) == info_dict[key]
@@ -0,0 +1,72 @@
+import pickle
+
+import pytest
+from genmod.vcf_tools import VariantRecord, get_genotypes, get_sample_index, get_variant_dict
+
+HEADER = ["CHROM", "POS", "ID", "REF", "ALT", "QUAL", "FILTER", "INFO", "FORMAT"]
+HEADER += ["father", "mother", "proband"]
+LINE = "1\t11900\t.\tA\tT\t100\tPASS\tMQ=1\tGT:GQ\t0/1:60\t0/0:50\t1/1:40\n"
+
+
+def get_record(line=LINE):
+    return VariantRecord.from_line(line, get_sample_index(HEADER))
+
+
+def test_record_columns():
+    variant = get_record()
+    variant_dict = get_variant_dict(LINE, HEADER)
+    for column in HEADER:
+        assert variant[column] == variant_dict[column]
+
+
+def test_record_samples():
+    variant = get_record()
+    assert variant.get_sample("mother") == "0/0:50"
+    assert variant.get_samples(["proband", "father"]) == ["1/1:40", "0/1:60"]
+    assert "proband" in variant
+    assert "sister" not in variant
+    with pytest.raises(KeyError):
+        variant["sister"]
+    with pytest.raises(KeyError):
+        variant.get_samples(["father", "sister"])
+
+
+def test_record_annotations():
+    variant = get_record()
+    assert variant.get("compounds") is None
+    assert "compounds" not in variant
+    variant.setdefault("compounds", {})["1"] = set()
+    variant["compound_candidate"] = True
+    assert variant["compounds"] == {"1": set()}
+    assert variant["compound_candidate"] is True
+    with pytest.raises(KeyError):
+        variant["not_a_field"] = 1
+
+
+def test_record_to_line():
+    variant = get_record()
+    assert variant.to_line() == LINE.rstrip()
+    variant["INFO"] = "MQ=1;GeneticModels=1:AR_hom"
+    assert variant.to_line().split("\t")[7] == "MQ=1;GeneticModels=1:AR_hom"
+
+
+def test_record_without_samples():
+    line = "1\t11900\t.\tA\tT\t100\tPASS\tMQ=1"
+    variant = VariantRecord.from_line(line, {})
+    assert "FORMAT" not in variant
+    assert variant.to_line() == line
+
+
+def test_record_genotypes():
+    variant = get_record()
+    genotypes = get_genotypes(variant, ["father", "proband"])
+    assert genotypes["father"].heterozygote
+    assert genotypes["proband"].homo_alt
+
+
+def test_record_pickle():
+    variant = get_record()
+    variant["variant_id"] = "1_11900_A_T"
+    unpickled = pickle.loads(pickle.dumps(variant))
+    assert unpickled.to_line() == variant.to_line()
+    assert unpickled["variant_id"] == "1_11900_A_T"